@@ -0,0 +1,15 @@
+# coding: utf-8
+"""
+Package benchmarks
+
+Performance benchmarks of the settrie containers on synthetic
+workloads, reported as JSON that can be compared between runs:
+
+    python -m benchmarks run --sets 100000 --output new.json
+    python -m benchmarks compare old.json new.json
+
+See README.md for more information.
+
+Licensed under the GNU LESSER GENERAL PUBLIC LICENSE, Version 3.
+See https://www.gnu.org/licenses/lgpl.html
+"""
@@ -0,0 +1,109 @@
+# coding: utf-8
+"""
+Command line interface of the benchmarks, see
+python -m benchmarks --help.
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks import orderings
+from benchmarks.suite import CONTAINERS, compare, run
+from benchmarks.workloads import Workload
+
+
+def addworkload(parser):
+    """Add the options of the Workload parameters to parser."""
+    parser.add_argument('--sets', type=int, default=100000,
+                        help='number of stored sets')
+    parser.add_argument('--size', type=int, default=8,
+                        help='mean number of elements of the sets')
+    parser.add_argument('--alphabet', type=int, default=1000,
+                        help='number of distinct elements')
+    parser.add_argument('--skew', type=float, default=1.0,
+                        help='Zipf exponent of the element frequencies')
+    parser.add_argument('--queries', type=int, default=1000,
+                        help='number of probes of each query')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='JSON report file (default: '
+                        'standard output)')
+
+
+def output(report, path):
+    """Write report as JSON to file path, or to the standard output if
+       path is None.
+    """
+    if path:
+        with open(path, 'w') as stream:
+            json.dump(report, stream, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmarks of the settrie containers.')
+    commands = parser.add_subparsers(dest='command')
+    runner = commands.add_parser('run', help='run the benchmarks')
+    addworkload(runner)
+    runner.add_argument('--repeat', type=int, default=1,
+                        help='runs of each container, the best is reported')
+    runner.add_argument('--containers', nargs='+', choices=list(CONTAINERS),
+                        help='containers to benchmark (default: all)')
+    comparer = commands.add_parser(
+        'compare', help='compare two reports; exit status 1 on regressions')
+    comparer.add_argument('old')
+    comparer.add_argument('new')
+    comparer.add_argument('--threshold', type=float, default=0.1,
+                          help='fraction of throughput lost counted as a '
+                          'regression')
+    orderer = commands.add_parser(
+        'orderings', help='compare the orders of the set elements')
+    addworkload(orderer)
+    orderer.add_argument('--input', help='file of the sets, one per line '
+                         '(default: a synthetic workload)')
+    orderer.add_argument('--sample', type=int, default=10000,
+                         help='number of sets the rankings are learnt from')
+    orderer.add_argument('--orders', nargs='+',
+                         choices=list(orderings.ORDERS),
+                         help='orders to compare (default: all)')
+    args = parser.parse_args(argv)
+    if args.command is None:  # required=True needs Python 3.7
+        parser.error('a command is required')
+    if args.command == 'run':
+        workload = Workload(args.sets, args.size, args.alphabet, args.skew,
+                            args.queries, args.seed)
+        output(run(workload, args.containers, args.repeat), args.output)
+        return 0
+    if args.command == 'orderings':
+        if args.input:
+            sets = orderings.readsets(args.input)
+            superprobes, subprobes = orderings.probes(sets, args.queries,
+                                                      args.seed)
+        else:
+            workload = Workload(args.sets, args.size, args.alphabet,
+                                args.skew, args.queries, args.seed)
+            sets = workload.sets
+            superprobes = workload.superprobes
+            subprobes = workload.subprobes
+        output(orderings.run(sets, superprobes, subprobes, args.sample,
+                             args.orders, args.seed), args.output)
+        return 0
+    with open(args.old) as stream:
+        old = json.load(stream)
+    with open(args.new) as stream:
+        new = json.load(stream)
+    regressed = False
+    for name, op, before, after, ratio, worse in compare(old, new,
+                                                         args.threshold):
+        print('{:16} {:12} {:14.1f} {:14.1f} {:7.2f}{}'.format(
+            name, op, before, after, ratio, '  REGRESSION' if worse else ''))
+        regressed = regressed or worse
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# coding: utf-8
+"""
+Module benchmarks.orderings
+
+Comparison of the orders of the set elements in a SetTrie: the size
+of the trie and the time of the queries with each order, on a
+synthetic Workload or on the sets of a file.
+"""
+
+import gc
+import random
+import time
+
+from settrie import Interner, SetTrie
+
+# the compared orders: the intern parameter of SetTrie for the sets
+ORDERS = {
+    'natural': lambda sample: False,  # sorted() order of the elements
+    'appearance': lambda sample: True,  # order of first appearance
+    'frequent': lambda sample: Interner.fromsample(sample, 'frequent'),
+    'rare': lambda sample: Interner.fromsample(sample, 'rare'),
+}
+
+
+def readsets(path):
+    """Return the list of the sets of file path: one set per line, made
+       of the whitespace-separated words of the line (as ints if they
+       all are).
+    """
+    with open(path) as stream:
+        sets = [line.split() for line in stream]
+    try:
+        return [set(map(int, words)) for words in sets]
+    except ValueError:
+        return [set(words) for words in sets]
+
+
+def probes(sets, queries, seed=1):
+    """Return the superset and subset probes drawn from the list sets:
+       one or two elements of a stored set, and the union of three
+       stored sets, queries of each.
+    """
+    rnd = random.Random(seed)
+    superprobes = []
+    for _ in range(queries):
+        elements = list(rnd.choice(sets))
+        superprobes.append(set(rnd.sample(elements, min(len(elements),
+                                                        rnd.randint(1, 2)))))
+    subprobes = [set().union(*rnd.sample(sets, min(len(sets), 3)))
+                 for _ in range(queries)]
+    return superprobes, subprobes
+
+
+def timequeries(func, probes):
+    """Return the seconds taken by calling func(probe) for each probe."""
+    start = time.perf_counter()
+    for probe in probes:
+        func(probe)
+    return time.perf_counter() - start
+
+
+def run(sets, superprobes, subprobes, sample=10000, orders=None, seed=1):
+    """Return the JSON-serializable report of the comparison of the orders
+       of names orders (default: all of ORDERS), learnt from sample
+       sets drawn from the list sets, on sets and the probes: for
+       each order, the nodes and estimated bytes of the trie (see
+       SetTrie.stats()), and the seconds taken by building it and by
+       the superset and subset queries of the probes.
+    """
+    rnd = random.Random(seed)
+    learnt = rnd.sample(sets, min(sample, len(sets)))
+    report = {}
+    for name in orders or ORDERS:
+        intern = ORDERS[name](learnt)
+        gc.collect()
+        start = time.perf_counter()
+        t = SetTrie(sets, intern=intern)
+        build = time.perf_counter() - start
+        stats = t.stats()
+        report[name] = {
+            'nodes': stats['nodes'],
+            'bytes': stats['bytes']['total'],
+            'build_seconds': build,
+            'supersets_seconds': timequeries(t.supersets, superprobes),
+            'hassuperset_seconds': timequeries(t.hassuperset, superprobes),
+            'subsets_seconds': timequeries(t.subsets, subprobes),
+            'hassubset_seconds': timequeries(t.hassubset, subprobes),
+        }
+        del t
+    return report
@@ -0,0 +1,146 @@
+# coding: utf-8
+"""
+Module benchmarks.suite
+
+Timing of the operations of the containers on a Workload, and
+comparison of the results of two runs.
+"""
+
+import gc
+import platform
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+from settrie import SetTrie, SetTrieMap, SetTrieMultiMap
+
+
+# the benchmarked containers: the methods that add a set and look it up
+CONTAINERS = {
+    'SetTrie': (SetTrie, lambda t, s, i: t.add(s), SetTrie.contains),
+    'SetTrieMap': (SetTrieMap, SetTrieMap.assign, SetTrieMap.get),
+    'SetTrieMultiMap': (SetTrieMultiMap, SetTrieMultiMap.assign,
+                        SetTrieMultiMap.get),
+}
+
+
+def timeops(func, args):
+    """Call func(arg) for each arg of args and return the statistics of
+       the calls: number of operations, total seconds, operations per
+       second and the 50th, 90th and 99th percentiles and maximum of
+       the latencies in microseconds.
+    """
+    clock = time.perf_counter
+    latencies = []
+    for arg in args:
+        start = clock()
+        func(arg)
+        latencies.append(clock() - start)
+    return stats(latencies)
+
+
+def stats(latencies):
+    """Return the statistics (see timeops()) of the list of latencies in
+       seconds.
+    """
+    total = sum(latencies)
+    latencies.sort()
+    n = len(latencies)
+
+    def percentile(p):
+        return latencies[min(n - 1, n * p // 100)] * 1e6 if n else 0.0
+
+    return {'ops': n,
+            'seconds': total,
+            'ops_per_sec': n / total if total else 0.0,
+            'p50_us': percentile(50),
+            'p90_us': percentile(90),
+            'p99_us': percentile(99),
+            'max_us': latencies[-1] * 1e6 if n else 0.0}
+
+
+def runcontainer(name, workload):
+    """Return the results of the benchmark of container name (a key of
+       CONTAINERS) on workload: the statistics of each operation, and
+       the peak memory (bytes allocated while building the container,
+       measured in a separate build).
+    """
+    cls, add, lookup = CONTAINERS[name]
+    sets = workload.sets
+    results = {}
+    t = cls()
+    results['add'] = timeops(lambda i: add(t, sets[i], i), range(len(sets)))
+    gc.collect()  # not in the timings of the queries
+    results['lookup'] = timeops(lambda s: lookup(t, s), workload.lookups)
+    results['hassuperset'] = timeops(t.hassuperset, workload.superprobes)
+    results['supersets'] = timeops(t.supersets, workload.superprobes)
+    results['hassubset'] = timeops(t.hassubset, workload.subprobes)
+    results['subsets'] = timeops(t.subsets, workload.subprobes)
+    start = time.perf_counter()
+    n = len(t.aslist())
+    results['iter'] = stats([time.perf_counter() - start])
+    seconds = results['iter']['seconds']
+    results['iter']['items_per_sec'] = n / seconds if seconds else 0.0
+    del t
+    gc.collect()
+    tracemalloc.start()
+    t = cls()
+    for i, s in enumerate(sets):
+        add(t, s, i)
+    results['memory'] = {'peak_bytes': tracemalloc.get_traced_memory()[1],
+                         'bytes_per_set': (tracemalloc.get_traced_memory()[0]
+                                           / max(len(sets), 1))}
+    tracemalloc.stop()
+    return results
+
+
+def run(workload, names=None, repeat=1):
+    """Return the JSON-serializable report of the benchmark of the
+       containers of names (default: all of CONTAINERS) on workload.
+       Each container is benchmarked repeat times, and the run with
+       the highest throughput is reported for each operation.
+    """
+    report = {'meta': {'python': sys.version.split()[0],
+                       'implementation': platform.python_implementation(),
+                       'machine': platform.machine(),
+                       'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'workload': workload.params},
+              'results': {}}
+    report['meta']['repeat'] = repeat
+    for name in names or CONTAINERS:
+        best = runcontainer(name, workload)
+        for _ in range(repeat - 1):
+            for op, result in runcontainer(name, workload).items():
+                if result.get('ops_per_sec', 0) > best[op].get('ops_per_sec',
+                                                              0):
+                    best[op] = result
+        report['results'][name] = best
+    if resource is not None:
+        report['meta']['maxrss_kb'] = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss
+    return report
+
+
+def compare(old, new, threshold=0.1):
+    """Compare the reports old and new: return the list of
+       (container, operation, old ops/s, new ops/s, ratio, regressed)
+       tuples of the operations in both, where regressed is True if
+       the throughput fell by more than the fraction threshold.
+    """
+    rows = []
+    for name, ops in new['results'].items():
+        for op, result in ops.items():
+            before = old['results'].get(name, {}).get(op)
+            if before is None or 'ops_per_sec' not in result:
+                continue
+            ratio = (result['ops_per_sec'] / before['ops_per_sec']
+                     if before['ops_per_sec'] else 0.0)
+            rows.append((name, op, before['ops_per_sec'],
+                         result['ops_per_sec'], ratio,
+                         ratio < 1 - threshold))
+    return rows
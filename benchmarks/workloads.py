@@ -0,0 +1,60 @@
+# coding: utf-8
+"""
+Module benchmarks.workloads
+
+Synthetic workloads: sets of ints drawn from an alphabet with a Zipf
+distribution, and the probe sets of the queries.
+"""
+
+import random
+from itertools import accumulate
+
+
+class Workload:
+    """The sets stored in the containers and the probes of the queries of
+       one benchmark run, generated from the parameters:
+
+       sets: number of sets to store
+       size: mean number of elements of the stored sets (the sizes are
+             uniform in 1..2*size-1)
+       alphabet: number of distinct elements (ints 0..alphabet-1)
+       skew: Zipf exponent of the frequencies of the elements (the
+             i-th element is drawn with weight 1/(i+1)**skew; 0 gives
+             uniform sets)
+       queries: number of probes of each query
+       seed: seed of the random generator, so that runs with the same
+             parameters use the same workload
+
+       The probes of superset queries have 1 to 3 elements, those of
+       subset queries 4*size elements, and half of the probes of the
+       point lookups are stored sets.
+    """
+
+    def __init__(self, sets=100000, size=8, alphabet=1000, skew=1.0,
+                 queries=1000, seed=1):
+        self.params = dict(sets=sets, size=size, alphabet=alphabet,
+                           skew=skew, queries=queries, seed=seed)
+        self.rnd = random.Random(seed)
+        self.cumweights = list(accumulate(1 / (i + 1) ** skew
+                                          for i in range(alphabet)))
+        self.alphabet = alphabet
+        self.sets = [self.makeset(self.rnd.randint(1, 2 * size - 1))
+                     for _ in range(sets)]
+        self.lookups = [self.rnd.choice(self.sets) if i % 2 else
+                        self.makeset(self.rnd.randint(1, 2 * size - 1))
+                        for i in range(queries)]
+        self.superprobes = [self.makeset(self.rnd.randint(1, 3))
+                            for _ in range(queries)]
+        self.subprobes = [self.makeset(4 * size) for _ in range(queries)]
+
+    def makeset(self, size):
+        """Return a set of min(size, alphabet) distinct elements drawn with
+           the Zipf weights.
+        """
+        size = min(size, self.alphabet)
+        result = set()
+        while len(result) < size:
+            result.update(self.rnd.choices(range(self.alphabet),
+                                           cum_weights=self.cumweights,
+                                           k=size - len(result)))
+        return result
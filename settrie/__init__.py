@@ -17,12 +17,450 @@ Licensed under the GNU LESSER GENERAL PUBLIC LICENSE, Version 3.
 See https://www.gnu.org/licenses/lgpl.html
 """
 
+import gc
+import pickle
 import sys
-import sortedcontainers
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from itertools import compress, islice, repeat
+from operator import itemgetter
 
 __version__ = "0.1.3"
 
 
+class Interner:
+    """Two-way mapping between set elements and dense integer ids, given
+       to the elements in the order of their first appearance
+       (0, 1, 2, ...).  A container created with intern=True (or with
+       an Interner, which can be shared by several containers) labels
+       its nodes with the ids of the set elements instead of the
+       elements themselves, so the searches compare small ints
+       instead of arbitrary objects (e.g. tuples of strings).
+
+       Usage:
+       ------
+       >>> from settrie import SetTrie
+       >>> t = SetTrie([['b', 'c'], ['a', 'b']], intern=True)
+       >>> t.interner.elements
+       ['b', 'c', 'a']
+       >>> t.supersets({'b'})
+       [{'b', 'c'}, {'a', 'b'}]
+
+       The order of the ids is the order of the elements in the sets,
+       on which the size of the trie and the cost of the searches
+       depend.  An Interner created with a ranking of the elements
+       (Interner(ranking)), or learnt from a sample of the sets by
+       fromsample(), sets that order:
+
+       >>> sample = [['b', 'c'], ['a', 'b'], ['b', 'd']]
+       >>> t = SetTrie(intern=Interner.fromsample(sample, 'frequent'))
+       >>> t.interner.elements
+       ['b', 'c', 'a', 'd']
+    """
+
+    def __init__(self, elements=()):
+        """Initialize this Interner, giving ids to the (hashable) items of
+           elements in order.
+        """
+        # element -> id
+        self.ids = {}
+        # id -> element
+        self.elements = []
+        for element in elements:
+            self.intern(element)
+
+    @classmethod
+    def fromsample(cls, sets, order='frequent'):
+        """Return a new Interner giving ids to the elements of the sets of
+           iterable sets (e.g. a sample of the sets to be stored) by
+           their frequency in them: the most frequent elements first if
+           order is 'frequent', the rarest first if it is 'rare' (equal
+           frequencies in the order of first appearance).  Elements
+           missing from the sample get the next ids when they are
+           added.
+
+           With 'frequent', the sets share longer prefixes, so the
+           trie has fewer nodes; with 'rare', the rare elements of the
+           probes are found near the root, which can make superset
+           searches faster.  See python -m benchmarks orderings for
+           measuring both on a data set.
+        """
+        counts = Counter()
+        for aset in sets:
+            counts.update(aset)
+        if order == 'frequent':
+            return cls(sorted(counts, key=counts.__getitem__, reverse=True))
+        if order == 'rare':
+            return cls(sorted(counts, key=counts.__getitem__))
+        raise ValueError("order must be 'frequent' or 'rare'")
+
+    def intern(self, element):
+        """Return the id of element, giving it the next id if it has none
+           yet.
+        """
+        ident = self.ids.get(element)
+        if ident is None:
+            ident = self.ids[element] = len(self.elements)
+            self.elements.append(element)
+        return ident
+
+    def encode(self, aset):
+        """Return the sorted list of the distinct ids of the elements of
+           aset, interning the new elements.  Used when sets are added.
+        """
+        get = self.ids.get
+        setarr = []
+        for element in aset:
+            ident = get(element)
+            if ident is None:
+                ident = self.intern(element)
+            setarr.append(ident)
+        if not isinstance(aset, (set, frozenset)):  # may repeat elements
+            setarr = list(set(setarr))
+        setarr.sort()
+        return setarr
+
+    def lookup(self, aset):
+        """Return the sorted list of the ids of the elements of aset,
+           without interning anything.  Elements without an id get -1,
+           which is never a node label, so a set containing them is
+           not found and has no supersets.
+        """
+        get = self.ids.get
+        setarr = [get(element, -1) for element in aset]
+        setarr.sort()
+        return setarr
+
+    def lookupknown(self, aset):
+        """Return the sorted list of the ids of the elements of aset that
+           have one.  Used by subset searches, which ignore the other
+           elements (no stored set contains them).
+        """
+        ids = self.ids
+        setarr = [ids[element] for element in aset if element in ids]
+        setarr.sort()
+        return setarr
+
+    def decode(self, labels):
+        """Return the set of the elements with the ids in labels."""
+        return set(map(self.elements.__getitem__, labels))
+
+    def element(self, label):
+        """Return the element with id label."""
+        return self.elements[label]
+
+
+class _Identity:
+    """Codec of the containers created without an Interner: the set
+       elements themselves are the node labels.
+    """
+
+    lookup = lookupknown = staticmethod(sorted)
+    decode = staticmethod(set)
+
+    @staticmethod
+    def encode(aset):
+        """Return the sorted list of the distinct elements of aset."""
+        if not isinstance(aset, (set, frozenset)):  # may repeat elements
+            aset = set(aset)
+        return sorted(aset)
+
+    @staticmethod
+    def element(label):
+        """Return label, which is the element itself."""
+        return label
+
+
+class QueryCache:
+    """Bounded cache of the results of the searches of a container created
+       with cache=maxsize, for workloads that repeat the same probes.
+       The results of the last maxsize distinct queries are kept, and
+       the least recently used one is dropped to make room for a new
+       one.  Every change to the container starts a new generation,
+       which makes all the results cached before it stale: they are
+       not used any more, and are dropped when they are looked up or
+       when they get least recently used.
+
+       Usage:
+       ------
+       >>> from settrie import SetTrie
+       >>> t = SetTrie([{1, 2}, {1, 3}], cache=100)
+       >>> t.supersets({1})
+       [{1, 2}, {1, 3}]
+       >>> t.supersets({1})
+       [{1, 2}, {1, 3}]
+       >>> t.cache.hits, t.cache.misses
+       (1, 1)
+    """
+
+    def __init__(self, maxsize):
+        """Initialize this QueryCache to keep up to maxsize results."""
+        self.maxsize = maxsize
+        # number of queries answered from / not found in the cache
+        self.hits = 0
+        self.misses = 0
+        # incremented by invalidate()
+        self.generation = 0
+        # key -> (generation, result), in least recently used order
+        self.entries = OrderedDict()
+
+    def query(self, key, func, *args):
+        """Return the cached result of the query identified by key if it is
+           from the current generation, else compute func(*args), cache
+           it under key and return it.
+        """
+        entries = self.entries
+        entry = entries.get(key)
+        if entry is not None:
+            if entry[0] == self.generation:
+                entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del entries[key]
+        self.misses += 1
+        result = func(*args)
+        entries[key] = (self.generation, result)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        return result
+
+    def invalidate(self):
+        """Make all the cached results stale: the container changed."""
+        self.generation += 1
+
+    def clear(self):
+        """Drop all the cached results and reset the counters."""
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+class QueryStats:
+    """Counters of the work done by the searches of a container created
+       with trace=QueryStats(...), to find out why a query is slow.
+       For each hassuperset(), supersets(), hassubset() and subsets()
+       query (and their iterator forms) it counts:
+
+       visited: the nodes reached by the search
+       scanned: the children of the visited nodes whose labels (or
+                summaries, see SetTrie.Node.summarize()) the search
+                looked at
+       pruned: the children of the visited nodes whose subtrees the
+               search skipped, by their labels (including the ones
+               skipped by bisection without being scanned) or by their
+               summaries
+       results: the sets found (at most 1 for the has*() queries)
+
+       The counts of each query are added to the attributes of the
+       same names (queries counts the queries), and if callback is
+       not None, callback(query, counts) is called at the end of each
+       query with the name of the query ('hassuperset', 'supersets',
+       'hassubset' or 'subsets') and a dict of its counts.  Iterator
+       queries end when they are exhausted or closed.
+
+       The containers only call the searches of this class (drop-in
+       replacements of the SetTrie traversal routines with the same
+       names, which count as they go) when they have a trace, so the
+       counting costs nothing when it is not enabled.  Queries
+       answered by a QueryCache are not counted.
+
+       Usage:
+       ------
+       >>> from settrie import SetTrie, QueryStats
+       >>> t = SetTrie([{1, 2}, {1, 3}, {2, 3}], trace=QueryStats())
+       >>> t.supersets({3})
+       [{1, 3}, {2, 3}]
+       >>> t.trace.queries, t.trace.visited, t.trace.results
+       (1, 5, 2)
+    """
+
+    def __init__(self, callback=None):
+        """Initialize the counters of this QueryStats to 0."""
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        """Reset the counters to 0."""
+        self.queries = 0
+        self.visited = 0
+        self.scanned = 0
+        self.pruned = 0
+        self.results = 0
+
+    def _record(self, query, counts):
+        """Add the list counts of the visited, scanned, pruned nodes and
+           results of query to the counters, and pass them to the
+           callback.
+        """
+        visited, scanned, pruned, results = counts
+        self.queries += 1
+        self.visited += visited
+        self.scanned += scanned
+        self.pruned += pruned
+        self.results += results
+        if self.callback is not None:
+            self.callback(query, {'visited': visited, 'scanned': scanned,
+                                  'pruned': pruned, 'results': results})
+
+    def _hassuperset(self, node, setarr):
+        """Counting version of SetTrie._hassuperset()."""
+        counts = [0, 0, 0, 0]
+        try:
+            last = len(setarr)
+            if last == 0:
+                counts[0] = 1
+                counts[3] = int(node.count > 0)
+                return node.count > 0
+            top = setarr[-1]
+            needs = SetTrie._needs(setarr)
+            stack = [(node, 0)]
+            while stack:
+                node, idx = stack.pop()
+                counts[0] += 1
+                data = setarr[idx]
+                labels = node.labels
+                children = node.children
+                c = bisect_left(labels, data)
+                if c < len(labels) and labels[c] == data:
+                    counts[1] += 1
+                    counts[2] += len(labels) - c - 1
+                    if idx + 1 == last:
+                        counts[3] = 1
+                        return True
+                    child = children[c]
+                    need = needs[idx + 1]
+                    if child.height >= last - idx - 1 and \
+                       child.signature & need == need and \
+                       child.maxdata >= top:
+                        stack.append((child, idx + 1))
+                    else:
+                        counts[2] += 1
+                else:
+                    counts[2] += len(labels) - c
+                need = needs[idx]
+                for c in range(c - 1, -1, -1):
+                    counts[1] += 1
+                    child = children[c]
+                    if child.height >= last - idx and \
+                       child.signature & need == need and \
+                       child.maxdata >= top:
+                        stack.append((child, idx))
+                    else:
+                        counts[2] += 1
+            return False
+        finally:
+            self._record('hassuperset', counts)
+
+    def _itersupersets(self, node, setarr, path):
+        """Counting version of SetTrie._itersupersets()."""
+        counts = [1, 0, 0, 0]
+        try:
+            last = len(setarr)
+            if node.flag_last and last == 0:
+                counts[3] += 1
+                yield node
+            top = setarr[-1] if setarr else None
+            needs = SetTrie._needs(setarr)
+            stack = [(enumerate(node.children), len(node.children), 0)]
+            while stack:
+                children, n, idx = stack[-1]
+                for c, child in children:
+                    counts[1] += 1
+                    data = child.data
+                    if idx < last:
+                        if data > setarr[idx]:
+                            counts[2] += n - c
+                            stack.pop()
+                            if stack:
+                                path.pop()
+                            break
+                        nidx = idx + 1 if data == setarr[idx] else idx
+                        if nidx < last and (
+                                child.height < last - nidx or
+                                child.signature & needs[nidx] !=
+                                needs[nidx] or
+                                child.maxdata < top):
+                            counts[2] += 1
+                            continue
+                    else:
+                        nidx = idx
+                    counts[0] += 1
+                    path.append(data)
+                    if child.flag_last and nidx == last:
+                        counts[3] += 1
+                        yield child
+                    if child.children:
+                        stack.append((enumerate(child.children),
+                                      len(child.children), nidx))
+                        break
+                    path.pop()
+                else:
+                    stack.pop()
+                    if stack:
+                        path.pop()
+        finally:
+            self._record('supersets', counts)
+
+    @staticmethod
+    def _subsetchildren(node, setarr, idx, counts):
+        """Return SetTrie._subsetchildren(node, setarr, idx) and count the
+           children of node in counts: the items of the shorter side of
+           the join are scanned, and the children that do not match
+           are pruned.
+        """
+        n = len(node.labels)
+        if idx == len(setarr):
+            counts[2] += n
+            return []
+        matches = SetTrie._subsetchildren(node, setarr, idx)
+        counts[1] += min(n, len(setarr) - idx)
+        counts[2] += n - len(matches)
+        return matches
+
+    def _hassubset(self, node, setarr):
+        """Counting version of SetTrie._hassubset()."""
+        counts = [0, 0, 0, 0]
+        try:
+            stack = [(node, 0)]
+            while stack:
+                node, idx = stack.pop()
+                counts[0] += 1
+                if node.flag_last:
+                    counts[3] = 1
+                    return True
+                stack.extend(self._subsetchildren(node, setarr, idx, counts))
+            return False
+        finally:
+            self._record('hassubset', counts)
+
+    def _itersubsets(self, node, setarr, path):
+        """Counting version of SetTrie._itersubsets()."""
+        counts = [1, 0, 0, 0]
+        try:
+            if node.flag_last:
+                counts[3] += 1
+                yield node
+            stack = [iter(self._subsetchildren(node, setarr, 0, counts))]
+            while stack:
+                for child, idx in stack[-1]:
+                    counts[0] += 1
+                    path.append(child.data)
+                    if child.flag_last:
+                        counts[3] += 1
+                        yield child
+                    if child.children:
+                        stack.append(iter(self._subsetchildren(
+                            child, setarr, idx, counts)))
+                        break
+                    path.pop()
+                else:
+                    stack.pop()
+                    if stack:
+                        path.pop()
+        finally:
+            self._record('subsets', counts)
+
+
 class SetTrie:
     """Set-trie container of sets for efficient supersets/subsets of a set
        over a set of sets queries.
@@ -46,71 +484,471 @@ class SetTrie:
     """
 
     class Node:
-        """Node object used by SetTrie."""
+        """Node object used by SetTrie.
+
+           Nodes use __slots__ and keep their children in two parallel
+           sequences sorted by label: labels (the data of each child)
+           and children (the child nodes).  Leaves share the empty
+           tuple, nodes with a small fan-out store tuples, and nodes
+           whose fan-out grows beyond Node.MAXTUPLE are promoted to
+           lists that can be updated in place.
+
+           Each node also summarizes the labels below it (height,
+           maxdata and signature), which lets the superset searches
+           skip the subtrees that cannot hold the elements still to be
+           found.
+        """
+
+        __slots__ = ('data', 'flag_last', 'labels', 'children', 'count',
+                     'height', 'maxdata', 'signature')
+
+        # maximal fan-out stored in (immutable) tuples
+        MAXTUPLE = 16
 
         def __init__(self, data=None):
-            # child nodes a.k.a. children
-            self.children = sortedcontainers.SortedList()
-            # if True, this is the last element of a set in the
-            # set-trie use this to store user data (a set
-            # element). Must be a hashable (i.e. hash(data) should
-            # work) and comparable/orderable (i.e. data1 < data2
-            # should work; see
+            # store user data (a set element). Must be a hashable
+            # (i.e. hash(data) should work) and comparable/orderable
+            # (i.e. data1 < data2 should work; see
             # https://wiki.python.org/moin/HowTo/Sorting/) type.
-            self.flag_last = False
             self.data = data
+            # if True, this is the last element of a set in the
+            # set-trie
+            self.flag_last = False
+            # sorted labels of child nodes and the child nodes
+            # a.k.a. children in the same order
+            self.labels = ()
+            self.children = ()
+            # number of nodes marked flag_last in the subtree of this
+            # node (including itself), i.e. the number of stored sets
+            # having the path to this node as a prefix
+            self.count = 0
+            # summary of the labels strictly below this node: length
+            # of the longest path down to a leaf, largest label (None
+            # for leaves) and OR of the signature bits of the labels
+            # (see bit())
+            self.height = 0
+            self.maxdata = None
+            self.signature = 0
+
+        @staticmethod
+        def bit(data):
+            """Return the signature bit of label data: one of 64 bits for
+               ints (e.g. interned elements), and all bits (-1) for
+               the other types, whose hash may differ between processes.
+            """
+            return 1 << (data & 63) if type(data) is int else -1
+
+        def getchild(self, data):
+            """Return the child node labeled data, or None if there is
+               no such child.
+            """
+            labels = self.labels
+            i = bisect_left(labels, data)
+            if i < len(labels) and labels[i] == data:
+                return self.children[i]
+            return None
+
+        def addchild(self, data):
+            """Return the child node labeled data, creating it (and
+               inserting it at its sorted position) if needed.
+            """
+            labels = self.labels
+            i = bisect_left(labels, data)
+            if i < len(labels) and labels[i] == data:
+                return self.children[i]
+            return self.insertchild(i, data)
+
+        def insertchild(self, i, data):
+            """Create a new child node labeled data at position i, which
+               must be the sorted position of data in self.labels.
+               Returns the new child.
+            """
+            labels = self.labels
+            child = self.__class__(data)
+            if type(labels) is tuple and len(labels) < self.MAXTUPLE:
+                self.labels = labels[:i] + (data,) + labels[i:]
+                self.children = self.children[:i] + (child,) + \
+                    self.children[i:]
+            else:
+                if type(labels) is tuple:  # promote to lists
+                    self.labels = labels = list(labels)
+                    self.children = list(self.children)
+                labels.insert(i, data)
+                self.children.insert(i, child)
+            return child
+
+        def compact(self):
+            """Store the child sequences of this node in tuples if its
+               fan-out is at most Node.MAXTUPLE.
+            """
+            if type(self.labels) is list and \
+               len(self.labels) <= self.MAXTUPLE:
+                self.labels = tuple(self.labels)
+                self.children = tuple(self.children)
+
+        def removechild(self, data):
+            """Remove the child node labeled data, which must exist.
+               Lists shrinking to Node.MAXTUPLE items are turned back
+               into tuples.
+            """
+            labels = self.labels
+            i = bisect_left(labels, data)
+            if type(labels) is tuple:
+                self.labels = labels[:i] + labels[i + 1:]
+                self.children = self.children[:i] + self.children[i + 1:]
+            else:
+                del labels[i]
+                del self.children[i]
+                self.compact()
+
+        def copy(self):
+            """Return a copy of this node, sharing its children (but not
+               its lists, if any).  Used by the copy-on-write updates
+               (see SetTrie.__init__()).
+            """
+            node = self.__class__.__new__(self.__class__)
+            node.data = self.data
+            node.flag_last = self.flag_last
+            if type(self.labels) is list:
+                node.labels = list(self.labels)
+                node.children = list(self.children)
+            else:
+                node.labels = self.labels
+                node.children = self.children
+            node.count = self.count
+            node.height = self.height
+            node.maxdata = self.maxdata
+            node.signature = self.signature
+            return node
+
+        def copychild(self, i):
+            """Replace the child node at position i by a copy of it and
+               return the copy.  This node must be a copy itself.
+            """
+            children = self.children
+            child = children[i].copy()
+            if type(children) is tuple:
+                self.children = children[:i] + (child,) + children[i + 1:]
+            else:
+                children[i] = child
+            return child
+
+        def summarize(self):
+            """Recompute the summary of the labels below this node (height,
+               maxdata and signature) from its children.  Returns True
+               iff it changed.
+            """
+            height = 0
+            maxdata = None
+            signature = 0
+            for child in self.children:
+                data = child.data
+                if type(data) is int:  # see bit()
+                    signature |= child.signature | 1 << (data & 63)
+                else:
+                    signature = -1
+                below = child.height
+                if below:
+                    data = child.maxdata
+                    if below >= height:
+                        height = below + 1
+                elif not height:
+                    height = 1
+                if maxdata is None or data > maxdata:
+                    maxdata = data
+            if height == self.height and signature == self.signature and \
+               maxdata == self.maxdata:
+                return False
+            self.height = height
+            self.maxdata = maxdata
+            self.signature = signature
+            return True
 
-        # comparison operators to support rich comparisons, sorting
-        # etc. using self.data as key
-        def __eq__(self, other): return self.data == other.data
-
-        def __ne__(self, other): return self.data != other.data
-
-        def __lt__(self, other): return self.data < other.data
-
-        def __le__(self, other): return self.data <= other.data
-
-        def __gt__(self, other): return self.data > other.data
-
-        def __ge__(self, other): return self.data >= other.data
-
-    def __init__(self, iterable=None):
+    def __init__(self, iterable=None, intern=False, cache=None,
+                 concurrent=False, trace=None):
         """Initialize this set-trie. If iterable is specified, set-trie is
-           populated from its items.
+           populated from its items: they are sorted once and loaded
+           in a single pass (see fromsorted()).
+
+           If intern is True, or an Interner (that may be shared with
+           other containers), the set elements are stored as integer
+           ids given by self.interner (see Interner), which makes the
+           searches faster when the elements are expensive to compare.
+           The elements then only need to be hashable, and the sets
+           are iterated in the order of the ids of their elements
+           (i.e. the order in which the elements were first added)
+           instead of the sorted order of the elements.
+
+           If cache is a positive int, the results of the last cache
+           distinct queries of the has*(), count*(), supersets() and
+           subsets() methods are kept in self.cache (see QueryCache),
+           and each change to the set-trie invalidates them.  The
+           elements of the probes must then be hashable, and the
+           lists returned by supersets() and subsets() may share their
+           sets with earlier results.
+
+           If concurrent is True, any number of threads can search the
+           set-trie while one thread at a time changes it, without
+           locks: each change copies the nodes of the path that it
+           updates and then replaces self.root by the new root in one
+           step, so a search (which follows self.root as it was when
+           the search started) never sees a change half-done, and no
+           node reachable from a published root is ever modified.
+           Changes then cost O(depth * fan-out) instead of
+           O(depth * log(fan-out)).  A query cache is not synchronized
+           and cannot be combined with concurrent=True.
+
+           If trace is a QueryStats, it counts the nodes visited by the
+           superset and subset searches (see QueryStats).
         """
+        if cache and concurrent:
+            raise ValueError('cache cannot be used with concurrent=True')
         self.root = SetTrie.Node()
+        self.interner = Interner() if intern is True else intern or None
+        self._codec = self.interner or _Identity
+        self.cache = QueryCache(cache) if cache else None
+        self.concurrent = concurrent
+        self.trace = trace
         if iterable is not None:
-            for s in iterable:
-                self.add(s)
+            encode = self._codec.encode
+            self._load(sorted(tuple(encode(s)) for s in iterable))
+
+    @classmethod
+    def fromsorted(cls, iterable):
+        """Return a new set-trie populated from iterable, which must yield
+           sorted sequences (e.g. tuples) of set elements in
+           lexicographic order, like the list returned by
+           sorted(tuple(sorted(s)) for s in sets).  Repeated sets are
+           allowed.  The nodes are created in one pass, with children
+           appended in order, without any searching or sorting.
+           Raises ValueError if iterable is not in sorted order, or if
+           the elements of a sequence are not strictly increasing.  The
+           new set-trie does not intern its elements.
+        """
+        t = cls()
+        t._load(iterable)
+        return t
+
+    def _load(self, keys):
+        """Used by __init__() and fromsorted()."""
+        for _ in SetTrie._bulkadd(self.root, zip(keys, repeat(None))):
+            pass
+
+    @staticmethod
+    def _bulkadd(node, items):
+        """Used by the bulk loading methods of all containers: build the
+           subtree of the empty node from items, which are (sorted
+           sequence, value) pairs in lexicographic order of the
+           sequences.  The node of the last element of each sequence
+           is marked flag_last, and a (node, value) pair is yielded
+           for each item.
+
+           Only the rightmost path of the subtree can still get new
+           children, so it is kept in a stack; the child sequences of
+           its nodes are lists, and nodes that leave the stack are
+           final: their counts are computed and they get compacted.
+        """
+        cls = node.__class__
+        stack = [node]
+        prev = ()
+        # the cyclic garbage collector would repeatedly traverse all the
+        # new nodes while building (and there are no cycles to find)
+        gcenabled = gc.isenabled()
+        gc.disable()
+        try:
+            for key, value in items:
+                # length of common prefix with the previous key
+                n = 0
+                m = min(len(key), len(prev))
+                while n < m and key[n] == prev[n]:
+                    n += 1
+                while len(stack) > n + 1:
+                    SetTrie._finish(stack.pop())
+                node = stack[-1]
+                for i in range(n, len(key)):
+                    data = key[i]
+                    # the elements of the key must be strictly increasing
+                    if i and not data > key[i - 1]:
+                        raise ValueError('input is not in sorted order')
+                    # append new child: its siblings are all smaller
+                    child = cls(data)
+                    if node.labels:
+                        if not data > node.labels[-1]:
+                            raise ValueError('input is not in sorted order')
+                        node.labels.append(data)
+                        node.children.append(child)
+                    else:
+                        node.labels = [data]
+                        node.children = [child]
+                    node = child
+                    stack.append(node)
+                prev = key
+                node.flag_last = True
+                yield node, value
+        finally:
+            if gcenabled:
+                gc.enable()
+        while stack:
+            SetTrie._finish(stack.pop())
+
+    @staticmethod
+    def _finish(node):
+        """Used by _bulkadd(): set the count and the summary of node from
+           its children and compact it.
+        """
+        node.count = node.flag_last + sum(child.count
+                                          for child in node.children)
+        if node.children:
+            node.summarize()
+            node.compact()
 
     def add(self, aset):
         """Add set aset to the container.  aset must be a sortable and
            iterable container type.
         """
-        self._add(self.root, iter(sorted(aset)))
+        root = self.root.copy() if self.concurrent else self.root
+        count = root.count
+        SetTrie._add(root, self._codec.encode(aset), self.concurrent)
+        self.root = root
+        if self.cache is not None and root.count != count:
+            self.cache.invalidate()
 
     @staticmethod
-    def _add(node, it):
-        """Recursive function used by self.insert().
-           node is a SetTrieNode object
-           it is an iterator over a sorted set"""
-        try:
-            data = next(it)
-            nextnode = None
-            try:
-                # find first child with this data
-                nextnode = node.children[node.children.index(
-                    SetTrie.Node(data))]
-            except ValueError:  # not found
-                nextnode = SetTrie.Node(data)  # create new node
-                node.children.add(nextnode)  # add to children & sort
-            SetTrie._add(nextnode, it)  # recurse
-        except StopIteration:  # end of set to add
+    def _add(node, setarr, copy=False):
+        """Used by self.add() (and the assign() methods of the other
+           containers): follow the path labeled by the sorted list
+           setarr from node, creating the missing nodes, mark the node
+           of the last element flag_last (updating the counts along
+           the path if it was not marked yet) and return it.
+
+           If copy is True, node must be a copy (see Node.copy()), and
+           the existing nodes of the path below it are copied before
+           they are changed, which leaves the trie of the original
+           node unchanged.
+        """
+        path = [node]
+        grown = False
+        for data in setarr:
+            # find first child with this data
+            labels = node.labels
+            i = bisect_left(labels, data)
+            if i < len(labels) and labels[i] == data:
+                node = node.copychild(i) if copy else node.children[i]
+            else:  # not found: create new node
+                node = node.insertchild(i, data)
+                grown = True
+            path.append(node)
+        if grown:
+            SetTrie._grow(path, setarr)
+        if not node.flag_last:
             node.flag_last = True
+            for pnode in path:
+                pnode.count += 1
+        return node
+
+    @staticmethod
+    def _grow(path, setarr):
+        """Used by _add(): update the summaries of the nodes of path, the
+           nodes labeled by the (non-empty) sorted list setarr, after
+           some of them were created.  The labels setarr[i:] are below
+           path[i].
+        """
+        top = setarr[-1]
+        height = 0
+        signature = 0
+        bit = SetTrie.Node.bit
+        for i in range(len(setarr) - 1, -1, -1):
+            node = path[i]
+            height += 1
+            signature |= bit(setarr[i])
+            if not node.height or node.maxdata < top:
+                node.maxdata = top
+            if node.height < height:
+                node.height = height
+            node.signature |= signature
+
+    @staticmethod
+    def _find(node, setarr):
+        """Used by self.contains() (and the lookup methods of the other
+           containers): follow the path labeled by the sorted list
+           setarr from node and return the node of the last element,
+           or None if there is no such path.
+        """
+        for data in setarr:
+            # find first child with this data
+            labels = node.labels
+            i = bisect_left(labels, data)
+            if i == len(labels) or labels[i] != data:  # not found
+                return None
+            node = node.children[i]
+        return node
+
+    @staticmethod
+    def _remove(node, setarr, copy=False):
+        """Used by the removal methods of all containers: if the path
+           labeled by the sorted list setarr from node ends in a node
+           marked flag_last, unmark that node, prune the nodes of the
+           path that do not lead to any stored set any more, and
+           return the (unmarked) node.  Otherwise, return None and
+           leave the trie unchanged.  Parameter copy: see _add().
+        """
+        path = [node]
+        for data in setarr:
+            # find first child with this data
+            labels = node.labels
+            i = bisect_left(labels, data)
+            if i == len(labels) or labels[i] != data:  # not found
+                return None
+            node = node.copychild(i) if copy else node.children[i]
+            path.append(node)
+        if not node.flag_last:
+            return None
+        node.flag_last = False
+        for pnode in path:
+            pnode.count -= 1
+        # remove nodes bottom-up until one is still needed, then update
+        # the summaries above it while they change.  Nodes with lists of
+        # children keep theirs, which stay upper bounds: recomputing
+        # them would make removals O(fan-out)
+        i = len(path) - 1
+        while i and not path[i].flag_last and not path[i].children:
+            i -= 1
+            path[i].removechild(path[i + 1].data)
+        if i < len(path) - 1:
+            while i >= 0 and type(path[i].children) is tuple and \
+                    path[i].summarize():
+                i -= 1
+        return node
+
+    def remove(self, aset):
+        """Remove set aset from this set-trie.  Raises KeyError if aset is
+           not stored.  Nodes that are no longer needed are removed
+           from the trie.
+        """
+        if not self._discard(aset):
+            raise KeyError(aset)
+
+    def discard(self, aset):
+        """Remove set aset from this set-trie if it is stored."""
+        self._discard(aset)
+
+    def _discard(self, aset):
+        """Used by remove() and discard(): remove set aset, and return True
+           iff it was stored.
+        """
+        root = self.root.copy() if self.concurrent else self.root
+        if SetTrie._remove(root, self._codec.lookup(aset),
+                           self.concurrent) is None:
+            return False
+        self.root = root
+        if self.cache is not None:
+            self.cache.invalidate()
+        return True
 
     def contains(self, aset):
         """Returns True iff this set-trie contains set aset."""
-        return self._contains(self.root, iter(sorted(aset)))
+        node = SetTrie._find(self.root, self._codec.lookup(aset))
+        return node is not None and node.flag_last
 
     def __contains__(self, aset):
         """Returns True iff this set-trie contains set aset.
@@ -124,155 +962,518 @@ class SetTrie:
         """
         return self.contains(aset)
 
-    @staticmethod
-    def _contains(node, it):
-        """Recursive function used by self.contains()."""
-        try:
-            data = next(it)
-            try:
-                # find first child with this data
-                matchnode = node.children[node.children.index(
-                    SetTrie.Node(data))]
-                return SetTrie._contains(matchnode, it)  # recurse
-            except ValueError:  # not found
-                return False
-        except StopIteration:
-            return node.flag_last
-
     def hassuperset(self, aset):
         """Returns True iff there is at least one set in this set-trie that is
            the superset of set aset.
         """
         # TODO: if aset is not a set, convert it to a set first to
         # collapse multiply existing elements
-        return SetTrie._hassuperset(self.root, list(sorted(aset)), 0)
+        setarr = self._codec.lookup(aset)
+        engine = self.trace or SetTrie
+        if self.cache is not None:
+            return self.cache.query(('hassuperset', tuple(setarr)),
+                                    engine._hassuperset, self.root, setarr)
+        return engine._hassuperset(self.root, setarr)
 
     @staticmethod
-    def _hassuperset(node, setarr, idx):
-        """Used by hassuperset()."""
-        if idx > len(setarr) - 1:
-            return True
-        found = False
-        for child in node.children:
-            # don't go to subtrees where current element cannot be
-            if child.data > setarr[idx]:
-                break
-            if child.data == setarr[idx]:
-                found = SetTrie._hassuperset(child, setarr, idx + 1)
-            else:
-                found = SetTrie._hassuperset(child, setarr, idx)
-            if found:
-                break
-        return found
+    def _hassuperset(node, setarr):
+        """Used by hassuperset(): depth-first search with an explicit
+           stack of (node, index of next element of setarr to find)
+           pairs.
+        """
+        last = len(setarr)
+        if last == 0:
+            return node.count > 0
+        top = setarr[-1]
+        needs = SetTrie._needs(setarr)
+        stack = [(node, 0)]
+        while stack:
+            node, idx = stack.pop()
+            data = setarr[idx]
+            labels = node.labels
+            children = node.children
+            # don't go to subtrees where current element cannot be:
+            # only children[:c] (+ children[c] if it matches) are
+            # pushed, in reverse order so that they are visited in
+            # sorted order
+            c = bisect_left(labels, data)
+            if c < len(labels) and labels[c] == data:
+                if idx + 1 == last:
+                    return True
+                child = children[c]
+                need = needs[idx + 1]
+                if child.height >= last - idx - 1 and \
+                   child.signature & need == need and child.maxdata >= top:
+                    stack.append((child, idx + 1))
+            # nor to subtrees too short or missing some of the elements
+            # still to find (see Node.summarize())
+            need = needs[idx]
+            for c in range(c - 1, -1, -1):
+                child = children[c]
+                if child.height >= last - idx and \
+                   child.signature & need == need and child.maxdata >= top:
+                    stack.append((child, idx))
+        return False
 
-    def itersupersets(self, aset):
+    @staticmethod
+    def _needs(setarr):
+        """Used by the superset searches: return the list of the ORs of the
+           signature bits (see Node.bit()) of the ints in setarr[i:],
+           for i in 0..len(setarr).  A subtree can only hold all the
+           elements of setarr[i:] if its signature has all the bits of
+           the i-th item.
+        """
+        needs = [0] * (len(setarr) + 1)
+        need = 0
+        for i in range(len(setarr) - 1, -1, -1):
+            data = setarr[i]
+            if type(data) is int:
+                need |= 1 << (data & 63)
+            needs[i] = need
+        return needs
+
+    def itersupersets(self, aset, limit=None):
         """Return an iterator over all sets in this set-trie that are (proper
            or not proper) supersets of set aset.
+
+           If limit is not None, at most limit sets are returned: the
+           search stops as soon as they have been found, and no set is
+           created for the matches that are not returned.
         """
         path = []
-        return SetTrie._itersupersets(self.root, list(sorted(aset)), 0, path)
+        decode = self._codec.decode
+        engine = self.trace or SetTrie
+        return SetTrie._limit((decode(path) for _ in engine._itersupersets(
+            self.root, self._codec.lookup(aset), path)), limit)
+
+    @staticmethod
+    def _limit(it, limit):
+        """Return iterator it, cut after limit items if limit is not
+           None.
+        """
+        return it if limit is None else islice(it, limit)
+
+    @staticmethod
+    def _achunks(it, chunk, executor):
+        """Used by the aiter*() methods of all containers: return an
+           asynchronous iterator over the items of iterator it, which
+           lets the event loop run its other tasks after every chunk
+           items, or takes the chunks from a thread of executor if it
+           is not None (see settrie.aio, which needs Python 3.5).
+        """
+        from settrie.aio import ChunkIterator
+        return ChunkIterator(it, chunk, executor)
 
     @staticmethod
-    def _itersupersets(node, setarr, idx, path):
-        """Used by itersupersets()."""
-        if node.data is not None:
-            path.append(node.data)
-        if node.flag_last and idx > len(setarr) - 1:
-            yield set(path)
-        # we still have elements of aset to find
-        if idx <= len(setarr) - 1:
-            for child in node.children:
-                # don't go to subtrees where current element cannot be
-                if child.data > setarr[idx]:
+    def _itersupersets(node, setarr, path):
+        """Used by the itersupersets() methods of all containers: yield each
+           node marked flag_last in the subtree of node whose path is a
+           superset of the sorted list setarr, in pre-order.  While a
+           node is yielded, path holds the labels leading to it from
+           node.
+
+           The traversal uses an explicit stack of (iterator over
+           children, index of next element of setarr to find) pairs, so
+           it is not limited by the recursion limit and every result
+           is yielded from this single frame.
+        """
+        last = len(setarr)
+        if node.flag_last and last == 0:
+            yield node
+        top = setarr[-1] if setarr else None
+        needs = SetTrie._needs(setarr)
+        stack = [(iter(node.children), 0)]
+        while stack:
+            children, idx = stack[-1]
+            for child in children:
+                data = child.data
+                if idx < last:  # we still have elements of aset to find
+                    # don't go to subtrees where current element cannot be
+                    if data > setarr[idx]:
+                        stack.pop()
+                        if stack:
+                            path.pop()
+                        break
+                    nidx = idx + 1 if data == setarr[idx] else idx
+                    # nor to those which cannot hold the elements after it
+                    if nidx < last and (
+                            child.height < last - nidx or
+                            child.signature & needs[nidx] != needs[nidx] or
+                            child.maxdata < top):
+                        continue
+                else:  # just traverse this subtree to get all supersets
+                    nidx = idx
+                path.append(data)
+                if child.flag_last and nidx == last:
+                    yield child
+                if child.children:
+                    stack.append((iter(child.children), nidx))
                     break
-                if child.data == setarr[idx]:
-                    yield from SetTrie._itersupersets(child, setarr,
-                                                      idx + 1, path)
-                else:
-                    yield from SetTrie._itersupersets(child, setarr,
-                                                      idx, path)
-        # no more elements to find: just traverse this subtree to get
-        # all supersets
-        else:
-            for child in node.children:
-                yield from SetTrie._itersupersets(child, setarr, idx, path)
-        if node.data is not None:
-            path.pop()
+                path.pop()
+            else:  # no more children
+                stack.pop()
+                if stack:
+                    path.pop()
 
-    def supersets(self, aset):
+    def supersets(self, aset, limit=None):
         """Return a list containing all sets in this set-trie that are
-           supersets of set aset.
+           supersets of set aset (at most limit of them if limit is not
+           None, see itersupersets()).
         """
-        return list(self.itersupersets(aset))
+        if self.cache is not None:
+            key = ('supersets', tuple(self._codec.lookup(aset)), limit)
+            return list(self.cache.query(
+                key, lambda: tuple(self.itersupersets(aset, limit))))
+        return list(self.itersupersets(aset, limit))
+
+    def aitersupersets(self, aset, limit=None, chunk=1000, executor=None):
+        """Return an asynchronous iterator over the sets returned by
+           itersupersets(aset, limit), for use in asyncio tasks
+           (async for).  The search gives control back to the event loop
+           after every chunk sets.  If executor (e.g. a
+           concurrent.futures.ThreadPoolExecutor) is given, the sets
+           are searched for in its threads chunk at a time, so the loop
+           is never blocked by the search, however many nodes it
+           visits.  The container must not be changed while the search
+           runs, unless it was created with concurrent=True (then the
+           search is not affected by the changes).
+        """
+        return SetTrie._achunks(self.itersupersets(aset, limit), chunk,
+                                executor)
+
+    def countsupersets(self, aset):
+        """Return the number of sets in this set-trie that are (proper or
+           not proper) supersets of set aset, without enumerating them.
+        """
+        setarr = self._codec.lookup(aset)
+        if self.cache is not None:
+            return self.cache.query(('countsupersets', tuple(setarr)),
+                                    SetTrie._countsupersets, self.root,
+                                    setarr)
+        return SetTrie._countsupersets(self.root, setarr)
+
+    @staticmethod
+    def _countsupersets(node, setarr):
+        """Used by the countsupersets() methods of all containers: search
+           like _hassuperset(), but add up the counts of all the nodes
+           where the last element of setarr is found instead of
+           descending into their subtrees.
+        """
+        last = len(setarr)
+        if last == 0:
+            return node.count
+        top = setarr[-1]
+        needs = SetTrie._needs(setarr)
+        total = 0
+        stack = [(node, 0)]
+        while stack:
+            node, idx = stack.pop()
+            data = setarr[idx]
+            labels = node.labels
+            children = node.children
+            c = bisect_left(labels, data)
+            if c < len(labels) and labels[c] == data:
+                if idx + 1 == last:
+                    total += children[c].count
+                else:
+                    child = children[c]
+                    need = needs[idx + 1]
+                    if child.height >= last - idx - 1 and \
+                       child.signature & need == need and \
+                       child.maxdata >= top:
+                        stack.append((child, idx + 1))
+            need = needs[idx]
+            for c in range(c - 1, -1, -1):
+                child = children[c]
+                if child.height >= last - idx and \
+                   child.signature & need == need and child.maxdata >= top:
+                    stack.append((child, idx))
+        return total
+
+    def batchhassuperset(self, probes):
+        """Return a list of booleans telling for each set in probes whether
+           there is at least one set in this set-trie that is its
+           superset (see hassuperset()).  The probes are deduplicated
+           and searched for in a single traversal of the trie shared by
+           all of them, which amortizes the cost of many hassuperset()
+           calls.
+        """
+        keys, index = SetTrie._batchkeys(probes, self._codec.lookup)
+        found = [False] * len(keys)
+        for _, group in SetTrie._batchsupersets(self.root, keys, [], True):
+            for i in group:
+                found[i] = True
+        return [found[i] for i in index]
+
+    def batchsupersets(self, probes):
+        """Return a list containing, for each set in probes, the list of
+           sets in this set-trie that are its supersets (see
+           supersets()).  All the probes are searched for in a single
+           traversal of the trie (see batchhassuperset()).  Equal
+           probes get the same list, and the lists may share the
+           superset objects.
+        """
+        keys, index = SetTrie._batchkeys(probes, self._codec.lookup)
+        results = [[] for _ in keys]
+        path = []
+        decode = self._codec.decode
+        for node, group in SetTrie._batchsupersets(self.root, keys, path):
+            sets = [decode(path) for _ in SetTrie._iter(node, path)]
+            for i in group:
+                results[i].extend(sets)
+        return [results[i] for i in index]
+
+    @staticmethod
+    def _batchkeys(probes, lookup):
+        """Used by the batch methods of all containers: return the sorted
+           list of distinct probes (as tuples of labels sorted by the
+           lookup() method of a codec), and a list with the position of
+           each probe in it.
+        """
+        keys = [tuple(lookup(aset)) for aset in probes]
+        unique = sorted(set(keys))
+        pos = {key: i for i, key in enumerate(unique)}
+        return unique, [pos[key] for key in keys]
+
+    @staticmethod
+    def _batchsupersets(node, probes, path, once=False):
+        """Used by the batch methods of all containers: superset search for
+           all the sorted sequences in probes at once.  Yields
+           (node, group) pairs in pre-order, where group lists the
+           indices of the probes all of whose elements have been found
+           on the path to node, so that all the sets in the subtree of
+           node are their supersets.  While a pair is yielded, path
+           holds the labels leading to node.  If once is True, each
+           probe is reported at most once and is not searched for any
+           further.
+
+           The traversal uses an explicit stack of (node, depth, group,
+           active) items, where active is the sorted list of (next
+           element to find, probe index, index of that element)
+           triples of the probes still searched for in the subtree of
+           node.  Each node is visited once for all the probes sharing
+           it, and the lists of the children are cut from the list of
+           the parent by bisection.
+        """
+        group = [i for i, probe in enumerate(probes) if not probe]
+        if group and node.count:
+            yield node, group
+        found = set(group)
+        active = sorted((probe[0], i, 0)
+                        for i, probe in enumerate(probes) if probe)
+        stack = [(node, 0, [], active)] if active else []
+        while stack:
+            node, depth, group, active = stack.pop()
+            if depth:
+                del path[depth - 1:]
+                path.append(node.data)
+                if once:
+                    group = [i for i in group if i not in found]
+                    active = [a for a in active if a[1] not in found]
+                if group:
+                    yield node, group
+                    if once:
+                        found.update(group)
+            labels = node.labels
+            children = node.children
+            last = len(active)
+            nexts = []
+            k = 0
+            for c in range(len(labels)):
+                data = labels[c]
+                # don't go to subtrees where no probe's current element
+                # can be: probes in active[k:] have elements >= data
+                k = bisect_left(active, (data,), k)
+                if k == last:
+                    break
+                group = []
+                advanced = []
+                j = k
+                while j < last and active[j][0] == data:
+                    _, i, idx = active[j]
+                    idx += 1
+                    if idx == len(probes[i]):
+                        group.append(i)
+                    else:
+                        advanced.append((probes[i][idx], i, idx))
+                    j += 1
+                if advanced:
+                    advanced.extend(active[j:])
+                    advanced.sort()
+                else:
+                    advanced = active[j:]
+                if group or advanced:
+                    nexts.append((children[c], depth + 1, group, advanced))
+            nexts.reverse()
+            stack.extend(nexts)
 
     def hassubset(self, aset):
         """Return True iff there is at least one set in this set-trie that is
            the (proper or not proper) subset of set aset.
         """
-        return SetTrie._hassubset(self.root, list(sorted(aset)), 0)
+        setarr = self._codec.lookupknown(aset)
+        engine = self.trace or SetTrie
+        if self.cache is not None:
+            return self.cache.query(('hassubset', tuple(setarr)),
+                                    engine._hassubset, self.root, setarr)
+        return engine._hassubset(self.root, setarr)
 
     @staticmethod
-    def _hassubset(node, setarr, idx):
-        """Used by hassubset()."""
-        if node.flag_last:
-            return True
-        if idx > len(setarr) - 1:
-            return False
-        found = False
-        try:
-            c = node.children.index(SetTrie.Node(setarr[idx]))
-            found = SetTrie._hassubset(node.children[c], setarr, idx + 1)
-        except ValueError:
-            pass
-        if not found:
-            return SetTrie._hassubset(node, setarr, idx + 1)
+    def _hassubset(node, setarr):
+        """Used by hassubset(): depth-first search with an explicit stack
+           of (node, index of next element of setarr to look for)
+           pairs.
+        """
+        last = len(setarr)
+        stack = [(node, 0)]
+        while stack:
+            node, idx = stack.pop()
+            if node.flag_last:
+                return True
+            if idx < last:
+                stack.extend(SetTrie._subsetchildren(node, setarr, idx))
+        return False
+
+    @staticmethod
+    def _subsetchildren(node, setarr, idx):
+        """Used by the subset searches: return the list of (child, index
+           of the element after its label in setarr) pairs of the
+           children of node labeled by one of the elements of the
+           sorted list setarr[idx:], in sorted order.
+
+           The two sorted sequences are joined by going through the
+           shorter one and finding its items in the longer one by
+           bisection (starting after the previous match), so the cost
+           is proportional to the smaller side, even for wide nodes or
+           large setarr.
+        """
+        labels = node.labels
+        children = node.children
+        last = len(setarr)
+        nlabels = len(labels)
+        matches = []
+        if nlabels <= last - idx:
+            # look up the children among the remaining elements
+            jdx = idx
+            for c in range(nlabels):
+                data = labels[c]
+                jdx = bisect_left(setarr, data, jdx)
+                if jdx == last:
+                    break
+                if setarr[jdx] == data:
+                    matches.append((children[c], jdx + 1))
         else:
-            return True
+            # look up the remaining elements among the children
+            c = 0
+            for jdx in range(idx, last):
+                data = setarr[jdx]
+                c = bisect_left(labels, data, c)
+                if c == nlabels:
+                    break
+                if labels[c] == data:
+                    matches.append((children[c], jdx + 1))
+        return matches
 
-    def itersubsets(self, aset):
+    def itersubsets(self, aset, limit=None):
         """Return an iterator over all sets in this set-trie that are (proper
-           or not proper) subsets of set aset.
+           or not proper) subsets of set aset.  Parameter limit: see
+           itersupersets().
         """
         path = []
-        return SetTrie._itersubsets(self.root, list(sorted(aset)), 0, path)
+        decode = self._codec.decode
+        engine = self.trace or SetTrie
+        return SetTrie._limit((decode(path) for _ in engine._itersubsets(
+            self.root, self._codec.lookupknown(aset), path)), limit)
 
     @staticmethod
-    def _itersubsets(node, setarr, idx, path):
-        """Used by itersubsets()."""
-        if node.data is not None:
-            path.append(node.data)
+    def _itersubsets(node, setarr, path):
+        """Used by the itersubsets() methods of all containers: yield each
+           node marked flag_last in the subtree of node whose path is a
+           subset of the sorted list setarr, in pre-order.  While a
+           node is yielded, path holds the labels leading to it from
+           node.  Uses an explicit stack of iterators over the
+           matching children (see _subsetchildren()), like
+           _itersupersets().
+        """
+        last = len(setarr)
         if node.flag_last:
-            yield set(path)
-        for child in node.children:
-            if idx > len(setarr) - 1:
-                break
-            if child.data == setarr[idx]:
-                yield from SetTrie._itersubsets(child, setarr, idx + 1, path)
-            else:
-                # advance in search set until we find child (or get to
-                # the end, or get to an element > child)
-                jdx = idx + 1
-                while jdx < len(setarr) and child.data >= setarr[jdx]:
-                    if child.data == setarr[jdx]:
-                        yield from SetTrie._itersubsets(child, setarr,
-                                                        jdx, path)
-                        break
-                    jdx += 1
-        if node.data is not None:
-            path.pop()
+            yield node
+        stack = [iter(SetTrie._subsetchildren(node, setarr, 0))]
+        while stack:
+            for child, idx in stack[-1]:
+                path.append(child.data)
+                if child.flag_last:
+                    yield child
+                if child.children and idx < last:
+                    stack.append(iter(SetTrie._subsetchildren(child, setarr,
+                                                              idx)))
+                    break
+                path.pop()
+            else:  # no more children
+                stack.pop()
+                if stack:
+                    path.pop()
 
-    def subsets(self, aset):
+    def subsets(self, aset, limit=None):
         """Return a list of sets in this set-trie that are (proper or not
-           proper) subsets of set aset.
+           proper) subsets of set aset (at most limit of them if limit
+           is not None, see itersupersets()).
         """
-        return list(self.itersubsets(aset))
+        if self.cache is not None:
+            key = ('subsets', tuple(self._codec.lookupknown(aset)), limit)
+            return list(self.cache.query(
+                key, lambda: tuple(self.itersubsets(aset, limit))))
+        return list(self.itersubsets(aset, limit))
+
+    def aitersubsets(self, aset, limit=None, chunk=1000, executor=None):
+        """Return an asynchronous iterator over the sets returned by
+           itersubsets(aset, limit).  Parameters chunk and executor: see
+           aitersupersets().
+        """
+        return SetTrie._achunks(self.itersubsets(aset, limit), chunk,
+                                executor)
+
+    def countsubsets(self, aset):
+        """Return the number of sets in this set-trie that are (proper or
+           not proper) subsets of set aset, without creating them.
+        """
+        setarr = self._codec.lookupknown(aset)
+        if self.cache is not None:
+            return self.cache.query(('countsubsets', tuple(setarr)),
+                                    SetTrie._countsubsets, self.root, setarr)
+        return SetTrie._countsubsets(self.root, setarr)
+
+    @staticmethod
+    def _countsubsets(node, setarr):
+        """Used by the countsubsets() methods of all containers: visit the
+           nodes visited by _itersubsets() in any order, without
+           keeping track of the path.
+        """
+        last = len(setarr)
+        total = 0
+        stack = [(node, 0)]
+        while stack:
+            node, idx = stack.pop()
+            if node.flag_last:
+                total += 1
+            if idx < last and node.children:
+                stack.extend(SetTrie._subsetchildren(node, setarr, idx))
+        return total
 
-    def iter(self):
+    def iter(self, limit=None):
         """Returns an iterator over the sets stored in this set-trie (with
            pre-order tree traversal).  The sets are returned in sorted
-           order with their elements sorted.
+           order with their elements sorted.  If limit is not None, only
+           the first limit sets are returned.
+        """
+        return SetTrie._limit(self.__iter__(), limit)
+
+    def aiter(self, limit=None, chunk=1000, executor=None):
+        """Return an asynchronous iterator over the sets returned by
+           iter(limit).  Parameters chunk and executor: see
+           aitersupersets().
         """
-        return self.__iter__()
+        return SetTrie._achunks(self.iter(limit), chunk, executor)
 
     def __iter__(self):
         """Returns an iterator over the sets stored in this set-trie (with
@@ -289,25 +1490,337 @@ class SetTrie:
            {2, 3, 4}
         """
         path = []
-        yield from SetTrie._iter(self.root, path)
+        decode = self._codec.decode
+        return (decode(path) for _ in SetTrie._iter(self.root, path))
 
     @staticmethod
     def _iter(node, path):
-        """Recursive function used by self.__iter__()."""
-        if node.data is not None:
-            path.append(node.data)
+        """Used by the iter() methods of all containers: yield each node
+           marked flag_last in the subtree of node, in pre-order.  While
+           a node is yielded, path holds the labels leading to it from
+           node.  Uses an explicit stack like _itersupersets().
+        """
         if node.flag_last:
-            yield set(path)
-        for child in node.children:
-            yield from SetTrie._iter(child, path)
-        if node.data is not None:
-            path.pop()
+            yield node
+        stack = [iter(node.children)]
+        while stack:
+            for child in stack[-1]:
+                path.append(child.data)
+                if child.flag_last:
+                    yield child
+                if child.children:
+                    stack.append(iter(child.children))
+                    break
+                path.pop()
+            else:  # no more children
+                stack.pop()
+                if stack:
+                    path.pop()
+
+    @staticmethod
+    def _iternodes(node):
+        """Yield (node, level) pairs for all the nodes in the subtree of
+           node (including node itself at level 0), in pre-order.
+        """
+        stack = [(node, 0)]
+        while stack:
+            node, level = stack.pop()
+            yield node, level
+            for child in reversed(node.children):
+                stack.append((child, level + 1))
+
+    def stats(self):
+        """Return a dict describing the shape and memory use of this
+           set-trie, computed in one pass over the nodes:
+
+           nodes: the number of nodes (including the root)
+           terminals: the number of nodes marked flag_last (the number
+                      of sets)
+           depths: list of the numbers of nodes at each depth (the
+                   root is at depth 0, the nodes of the sets of n
+                   elements end at depth n)
+           fanouts: dict of the numbers of nodes by number of children
+           labels: list of dicts of the numbers of nodes with each set
+                   element as label at each depth (labels[0] is empty)
+           bytes: dict of the estimated sizes in bytes (sys.getsizeof)
+                  of the nodes (with their signatures, see
+                  Node.summarize()), of the children tuples and lists
+                  of the nodes ('children'), of the values stored in
+                  maps ('values', shallow: the objects the values refer
+                  to are not counted), of the interner (shallow) and
+                  their 'total'; the set elements are not counted
+        """
+        return SetTrie._stats(self, None)
+
+    @staticmethod
+    def _stats(container, valuesize):
+        """Used by the stats() methods of all containers: walk the nodes
+           of container with an explicit stack of (node, depth) pairs.
+           valuesize is None for sets, else the function returning
+           the size of the value of a node.
+        """
+        element = container._codec.element
+        getsizeof = sys.getsizeof
+        depths = []
+        fanouts = {}
+        labels = []
+        terminals = 0
+        nodebytes = 0
+        childbytes = 0
+        valuebytes = 0
+        stack = [(container.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if depth == len(depths):
+                depths.append(0)
+                labels.append({})
+            depths[depth] += 1
+            if node.signature > 256:  # not one of the shared small ints
+                nodebytes += getsizeof(node.signature)
+            if depth:
+                data = element(node.data)
+                level = labels[depth]
+                level[data] = level.get(data, 0) + 1
+            if node.flag_last:
+                terminals += 1
+                if valuesize is not None:
+                    valuebytes += valuesize(node.value)
+            children = node.children
+            fanout = len(children)
+            fanouts[fanout] = fanouts.get(fanout, 0) + 1
+            if fanout:
+                childbytes += getsizeof(node.labels) + getsizeof(children)
+                depth += 1
+                for child in children:
+                    stack.append((child, depth))
+        nodes = sum(depths)
+        interner = container.interner
+        sizes = {'nodes': nodes * getsizeof(container.root) + nodebytes,
+                 'children': childbytes,
+                 'values': valuebytes,
+                 'interner': (getsizeof(interner.ids) +
+                              getsizeof(interner.elements)
+                              if interner is not None else 0)}
+        sizes['total'] = sum(sizes.values())
+        return {'nodes': nodes,
+                'terminals': terminals,
+                'depths': depths,
+                'fanouts': dict(sorted(fanouts.items())),
+                'labels': labels,
+                'bytes': sizes}
+
+    def __len__(self):
+        """Returns the number of sets stored in this set-trie.  The count
+           is kept up to date by the methods that add and remove sets,
+           so this takes constant time.
+        """
+        return self.root.count
 
     def aslist(self):
         """Return an array containing all the sets stored in this set-trie.
            The sets are in sorted order with their elements sorted."""
         return list(self)
 
+    def snapshot(self):
+        """Return a new set-trie holding the same sets as this one, in
+           constant time: both share all their nodes (and interner), and
+           are switched to concurrent mode (see __init__()), so that
+           their changes copy the nodes that they update instead of
+           modifying them.  Each of them can then be changed without
+           affecting the other one, which makes it cheap to keep and
+           publish successive versions:
+
+           >>> t = SetTrie([{1, 2}])
+           >>> v1 = t.snapshot()
+           >>> t.add({1, 3})
+           >>> v1, t
+           ([{1, 2}], [{1, 2}, {1, 3}])
+
+           This set-trie stays in concurrent mode after the snapshot
+           is taken (changing its shared nodes in place would change
+           the snapshot too), so its later changes cost more: call
+           unshare() to switch it back.  Raises ValueError if this
+           set-trie has a query cache.
+        """
+        if self.cache is not None:
+            raise ValueError('cache cannot be used with concurrent=True')
+        self.concurrent = True
+        t = self.__class__(intern=self.interner, concurrent=True,
+                           trace=self.trace)
+        t.root = self.root
+        return t
+
+    def unshare(self, concurrent=False):
+        """Give this set-trie its own copy of all its nodes, in time linear
+           in their number, so that it shares none with its snapshots
+           (see snapshot()), and set its mode to concurrent (see
+           __init__()): by default, changes modify the nodes in place
+           again.  The snapshots are not affected.
+        """
+        self.root = SetTrie._copytree(self.root)
+        self.concurrent = concurrent
+
+    @staticmethod
+    def _copytree(root, copyvalue=None):
+        """Used by the unshare() methods of all containers: return a copy of
+           the tree of root that shares no node with it.  If copyvalue
+           is not None, the values of the nodes marked flag_last are
+           replaced by copyvalue(value).
+        """
+        root = root.copy()
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if copyvalue is not None and node.flag_last:
+                node.value = copyvalue(node.value)
+            if node.children:
+                children = [child.copy() for child in node.children]
+                if type(node.children) is tuple:
+                    node.children = tuple(children)
+                else:
+                    node.children = children
+                stack.extend(children)
+        return root
+
+    def save(self, path):
+        """Save this set-trie to file path in a compact binary format that
+           load() reads back much faster than the set-trie can be
+           rebuilt (see _dump()).
+        """
+        with open(path, 'wb') as stream:
+            SetTrie._dump(self, stream, False)
+
+    @classmethod
+    def load(cls, path):
+        """Return a new set-trie read from file path, written by save().
+           An interner is restored as a new Interner (not shared with
+           any other container).  Raises ValueError if the file was
+           not written by the save() method of this class.
+
+           The labels are unpickled, so only load files from trusted
+           sources.
+        """
+        t = cls()
+        with open(path, 'rb') as stream:
+            SetTrie._undump(t, stream, False)
+        return t
+
+    # magic number and version of the files written by save()
+    _FILEMAGIC = b'SETTRIE\x01'
+
+    @staticmethod
+    def _dump(t, stream, withvalues):
+        """Used by the save() methods of all containers: write container t
+           to the binary stream.  After the magic number, the file
+           holds a pickled header (with the distinct node labels and
+           the elements of the interner), followed by the nodes in
+           level order (breadth-first) as flat arrays of label
+           indices (not for the root), numbers of children, flag_last
+           bytes and counts, and, if withvalues is True, the pickled
+           list of the values of the nodes marked flag_last.  In level
+           order, the children of each node are stored contiguously,
+           so load() can cut them from the list of all the nodes.
+        """
+        nodes = [t.root]
+        for node in nodes:  # grows while iterated: level order
+            nodes.extend(node.children)
+        datas = [node.data for node in nodes[1:]]
+        table = list(dict.fromkeys(datas))
+        pos = {data: i for i, data in enumerate(table)}
+        arrays = [
+            SetTrie._array([pos[data] for data in datas]),
+            SetTrie._array([len(node.children) for node in nodes]),
+            array('B', [node.flag_last for node in nodes]),
+            SetTrie._array([node.count for node in nodes])]
+        header = {'kind': t.__class__.__name__,
+                  'byteorder': sys.byteorder,
+                  'nodes': len(nodes),
+                  'arrays': [a.typecode for a in arrays],
+                  'labels': table,
+                  'elements': t.interner and t.interner.elements}
+        stream.write(SetTrie._FILEMAGIC)
+        pickle.dump(header, stream, pickle.HIGHEST_PROTOCOL)
+        for a in arrays:
+            a.tofile(stream)
+        if withvalues:
+            pickle.dump([node.value for node in nodes if node.flag_last],
+                        stream, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _array(ints):
+        """Used by _dump(): return an array of the non-negative ints with
+           the smallest item type that fits them all.
+        """
+        top = max(ints) if ints else 0
+        for typecode in 'BHIL':
+            if top < 1 << 8 * array(typecode).itemsize:
+                break
+        else:
+            typecode = 'Q'
+        return array(typecode, ints)
+
+    @staticmethod
+    def _undump(t, stream, withvalues):
+        """Used by the load() methods of all containers: read the nodes (and
+           values, if withvalues is True) written by _dump() from the
+           binary stream into the empty container t.
+        """
+        if stream.read(len(SetTrie._FILEMAGIC)) != SetTrie._FILEMAGIC:
+            raise ValueError('not a settrie file')
+        header = pickle.load(stream)
+        if header['kind'] != t.__class__.__name__:
+            raise ValueError('file holds a {}, not a {}'.format(
+                header['kind'], t.__class__.__name__))
+        n = header['nodes']
+        arrays = []
+        for typecode, size in zip(header['arrays'], (n - 1, n, n, n)):
+            a = array(typecode)
+            a.fromfile(stream, size)
+            if header['byteorder'] != sys.byteorder:
+                a.byteswap()
+            arrays.append(a)
+        labelids, nchildren, flags, counts = arrays
+        if header['elements'] is not None:
+            t.interner = t._codec = Interner(header['elements'])
+        table = header['labels']
+        # datas[i] is the label of nodes[i]
+        datas = [None]
+        datas += map(table.__getitem__, labelids)
+        cls = t.root.__class__
+        maxtuple = cls.MAXTUPLE
+        gcenabled = gc.isenabled()
+        gc.disable()
+        try:
+            nodes = [t.root]
+            nodes += map(cls, datas[1:])
+            # the children of the nodes are nodes[1:] in level order
+            pos = 1
+            for node, nchild, flag, count in zip(nodes, nchildren, flags,
+                                                 counts):
+                if flag:
+                    node.flag_last = True
+                node.count = count
+                if nchild:
+                    end = pos + nchild
+                    if nchild > maxtuple:
+                        node.labels = datas[pos:end]
+                        node.children = nodes[pos:end]
+                    else:
+                        node.labels = tuple(datas[pos:end])
+                        node.children = tuple(nodes[pos:end])
+                    pos = end
+            # children come after their parents in level order
+            for node in reversed(nodes):
+                if node.children:
+                    node.summarize()
+        finally:
+            if gcenabled:
+                gc.enable()
+        if withvalues:
+            values = pickle.load(stream)
+            for node, value in zip(compress(nodes, flags), values):
+                node.value = value
+
     def printtree(self, tabchr=' ', tabsize=2, stream=sys.stdout):
         """Print a mirrored 90-degree rotation of the nodes in this trie to
            stream (default: sys.stdout).  Nodes marked as flag_last
@@ -315,19 +1828,13 @@ class SetTrie:
            determine the indentation: at tree level n, n*tabsize
            tabchar characters will be used.
         """
-        self._printtree(self.root, 0, tabchr, tabsize, stream)
-
-    @staticmethod
-    def _printtree(node, level, tabchr, tabsize, stream):
-        """Used by self.printTree(), recursive preorder traverse and printing
-           of trie node
-        """
-        print(str(node.data).rjust(len(repr(node.data)) + level *
-                                   tabsize, tabchr) +
-              ('#' if node.flag_last else ''),
-              file=stream)
-        for child in node.children:
-            SetTrie._printtree(child, level + 1, tabchr, tabsize, stream)
+        element = self._codec.element
+        for node, level in SetTrie._iternodes(self.root):
+            data = element(node.data) if level else node.data
+            print(str(data).rjust(len(repr(data)) + level *
+                                       tabsize, tabchr) +
+                  ('#' if node.flag_last else ''),
+                  file=stream)
 
     def __str__(self):
         """Returns str(self.aslist())."""
@@ -366,75 +1873,115 @@ class SetTrieMap:
       ['A', 'B']
     """
 
-    class Node:
+    class Node(SetTrie.Node):
         """Node object used by SetTrieMap. You probably don't need to use it
-           from the outside.
+           from the outside.  Same layout as SetTrie.Node, plus the
+           associated value.
         """
 
+        __slots__ = ('value',)
+
         def __init__(self, data=None, value=None):
-            # child nodes a.k.a. children
-            self.children = sortedcontainers.SortedList()
-            # if True, this is the last element of a key set store a
-            # member element of the key set. Must be a hashable
-            # (i.e. hash(data) should work) and comparable/orderable
-            # (i.e. data1 < data2 should work; see
-            # https://wiki.python.org/moin/HowTo/Sorting/) type.
-            self.flag_last = False
-            self.data = data
+            SetTrie.Node.__init__(self, data)
             # the value associated to the key set if flag_last ==
             # True, otherwise None
             self.value = None
 
-        # comparison operators to support rich comparisons, sorting
-        # etc. using self.data as key
-        def __eq__(self, other): return self.data == other.data
-
-        def __ne__(self, other): return self.data != other.data
-
-        def __lt__(self, other): return self.data < other.data
-
-        def __le__(self, other): return self.data <= other.data
+        def copy(self):
+            """Return a copy of this node, see SetTrie.Node.copy()."""
+            node = SetTrie.Node.copy(self)
+            node.value = self.value
+            return node
 
-        def __gt__(self, other): return self.data > other.data
-
-        def __ge__(self, other): return self.data >= other.data
-
-    def __init__(self, iterable=None):
+    def __init__(self, iterable=None, intern=False, cache=None,
+                 concurrent=False, trace=None):
         """Set up this SetTrieMap object.  If iterable is specified, it must
            be an iterable of (keyset, value) pairs from which set-trie
-           is populated.
+           is populated in a single pass (see fromsorted()).  If a
+           keyset is repeated, the last value is kept.  Parameters
+           intern, cache, concurrent and trace: see
+           SetTrie.__init__().
         """
         self.root = SetTrieMap.Node()
+        if cache and concurrent:
+            raise ValueError('cache cannot be used with concurrent=True')
+        self.interner = Interner() if intern is True else intern or None
+        self._codec = self.interner or _Identity
+        self.cache = QueryCache(cache) if cache else None
+        self.concurrent = concurrent
+        self.trace = trace
         if iterable is not None:
-            for key, value in iterable:
-                self.assign(key, value)
+            encode = self._codec.encode
+            self._load(sorted(((tuple(encode(key)), value)
+                               for key, value in iterable),
+                              key=itemgetter(0)))
+
+    @classmethod
+    def fromsorted(cls, iterable):
+        """Return a new SetTrieMap populated from iterable, which must
+           yield (keyset, value) pairs where the keysets are sorted
+           sequences (e.g. tuples) given in lexicographic order.  If a
+           keyset is repeated, the last value is kept.  See
+           SetTrie.fromsorted().
+        """
+        t = cls()
+        t._load(iterable)
+        return t
+
+    def _load(self, items):
+        """Used by __init__() and fromsorted()."""
+        for node, value in SetTrie._bulkadd(self.root, items):
+            node.value = value
 
     def assign(self, akey, avalue):
         """Add key akey with associated value avalue to the container.
            akey must be a sortable and iterable container type."""
-        self._assign(self.root, iter(sorted(akey)), avalue)
+        root = self.root.copy() if self.concurrent else self.root
+        node = SetTrie._add(root, self._codec.encode(akey), self.concurrent)
+        node.value = avalue
+        self.root = root
+        if self.cache is not None:
+            self.cache.invalidate()
+
+    def remove(self, keyset):
+        """Remove key keyset and its associated value from this
+           SetTrieMap.  Raises KeyError if keyset is not a key.  Nodes
+           that are no longer needed are removed from the trie.
+        """
+        self.pop(keyset)
 
-    @staticmethod
-    def _assign(node, it, val):
-        """Recursive function used by self.assign()."""
-        try:
-            data = next(it)
-            nextnode = None
-            try:
-                # find first child with this data
-                nextnode = node.children[node.children.index(
-                    SetTrieMap.Node(data))]
-            except ValueError:  # not found
-                nextnode = SetTrieMap.Node(data)  # create new node
-                node.children.add(nextnode)  # add to children & sort
-            SetTrieMap._assign(nextnode, it, val)  # recurse
-        except StopIteration:  # end of set to add
-            node.flag_last = True
-            node.value = val
+    def discard(self, keyset):
+        """Remove key keyset and its associated value from this SetTrieMap
+           if keyset is a key.
+        """
+        self.pop(keyset, None)
+
+    def __delitem__(self, keyset):
+        """Same as self.remove(keyset), enables del m[keyset]."""
+        self.pop(keyset)
+
+    def pop(self, keyset, *default):
+        """Remove key keyset and return its associated value.  If keyset is
+           not a key, return default if given, else raise KeyError.
+        """
+        root = self.root.copy() if self.concurrent else self.root
+        node = SetTrie._remove(root, self._codec.lookup(keyset),
+                               self.concurrent)
+        if node is None:
+            if default:
+                return default[0]
+            raise KeyError(keyset)
+        value = node.value
+        node.value = None
+        self.root = root
+        if self.cache is not None:
+            self.cache.invalidate()
+        return value
 
     def contains(self, keyset):
         """Returns True iff this set-trie contains set keyset as a key."""
-        return self._contains(self.root, iter(sorted(keyset)))
+        node = SetTrie._find(self.root, self._codec.lookup(keyset))
+        return node is not None and node.flag_last
 
     def __contains__(self, keyset):
         """Returns True iff this set-trie contains set keyset as a key.  This
@@ -448,67 +1995,27 @@ class SetTrieMap:
         """
         return self.contains(keyset)
 
-    @staticmethod
-    def _contains(node, it):
-        """Recursive function used by self.contains()."""
-        try:
-            data = next(it)
-            try:
-                # find first child with this data
-                matchnode = node.children[node.children.index(
-                    SetTrieMap.Node(data))]
-                return SetTrieMap._contains(matchnode, it)  # recurse
-            except ValueError:  # not found
-                return False
-        except StopIteration:
-            return node.flag_last
-
     def get(self, keyset, default=None):
         """Return the value associated to keyset if keyset is in this
            SetTrieMap, else default.
         """
-        return self._get(self.root, iter(sorted(keyset)), default)
-
-    @staticmethod
-    def _get(node, it, default):
-        """Recursive function used by self.get()."""
-        try:
-            data = next(it)
-            try:
-                # find first child with this data
-                matchnode = node.children[node.children.index(
-                    SetTrieMap.Node(data))]
-                return SetTrieMap._get(matchnode, it, default)  # recurse
-            except ValueError:  # not found
-                return default
-        except StopIteration:
-            return (node.value if node.flag_last else default)
+        node = SetTrie._find(self.root, self._codec.lookup(keyset))
+        if node is None or not node.flag_last:
+            return default
+        return node.value
 
     def hassuperset(self, aset):
         """Returns True iff there is at least one key set in this SetTrieMap
            that is the superset of set aset.
         """
-        return SetTrieMap._hassuperset(self.root, list(sorted(aset)), 0)
-
-    @staticmethod
-    def _hassuperset(node, setarr, idx):
-        """Used by hassuperset()."""
-        if idx > len(setarr) - 1:
-            return True
-        found = False
-        for child in node.children:
-            # don't go to subtrees where current element cannot be
-            if child.data > setarr[idx]:
-                break
-            if child.data == setarr[idx]:
-                found = SetTrieMap._hassuperset(child, setarr, idx + 1)
-            else:
-                found = SetTrieMap._hassuperset(child, setarr, idx)
-            if found:
-                break
-        return found
-
-    def itersupersets(self, aset, mode=None):
+        setarr = self._codec.lookup(aset)
+        engine = self.trace or SetTrie
+        if self.cache is not None:
+            return self.cache.query(('hassuperset', tuple(setarr)),
+                                    engine._hassuperset, self.root, setarr)
+        return engine._hassuperset(self.root, setarr)
+
+    def itersupersets(self, aset, mode=None, limit=None):
         """Return an iterator over all (keyset, value) pairs from this
            SetTrieMap for which set keyset is a superset (proper or
            not proper) of set aset.  If mode is not None, the
@@ -523,80 +2030,93 @@ class SetTrieMap:
            If mode is neither of 'keys', 'values' or None, behavior is
            equivalent to mode=None.
 
+           If limit is not None, at most limit items are returned: the
+           search stops as soon as they have been found.
         """
         path = []
-        return SetTrieMap._itersupersets(self.root, list(sorted(aset)), 0,
-                                         path, mode)
-
-    @staticmethod
-    def _itersupersets(node, setarr, idx, path, mode):
-        """Used by itersupersets()."""
-        if node.data is not None:
-            path.append(node.data)
-        if node.flag_last and idx > len(setarr) - 1:
-            if mode == 'keys':
-                yield set(path)
-            elif mode == 'values':
-                yield node.value
-            else:
-                yield (set(path), node.value)
-        # we still have elements of aset to find
-        if idx <= len(setarr) - 1:
-            for child in node.children:
-                # don't go to subtrees where current element cannot be
-                if child.data > setarr[idx]:
-                    break
-                if child.data == setarr[idx]:
-                    yield from SetTrieMap._itersupersets(child,
-                                                         setarr, idx +
-                                                         1, path,
-                                                         mode)
-                else:
-                    yield from SetTrieMap._itersupersets(child,
-                                                         setarr, idx,
-                                                         path, mode)
-        # no more elements to find: just traverse this subtree to get
-        # all supersets
-        else:
-            for child in node.children:
-                yield from SetTrieMap._itersupersets(child, setarr,
-                                                     idx, path, mode)
-        if node.data is not None:
-            path.pop()
+        engine = self.trace or SetTrie
+        return SetTrie._limit(self._output(
+            engine._itersupersets(self.root, self._codec.lookup(aset), path),
+            path, mode), limit)
 
-    def supersets(self, aset, mode=None):
+    def supersets(self, aset, mode=None, limit=None):
         """Return a list containing pairs of (keyset, value) for which keyset
            is superset of set aset.
 
+           Parameters mode and limit: see documentation for
+           itersupersets().
+        """
+        if self.cache is not None:
+            key = ('supersets', tuple(self._codec.lookup(aset)), mode, limit)
+            return list(self.cache.query(
+                key, lambda: tuple(self.itersupersets(aset, mode, limit))))
+        return list(self.itersupersets(aset, mode, limit))
+
+    def aitersupersets(self, aset, mode=None, limit=None, chunk=1000,
+                       executor=None):
+        """Return an asynchronous iterator over the items returned by
+           itersupersets(aset, mode, limit).  Parameters chunk and
+           executor: see SetTrie.aitersupersets().
+        """
+        return SetTrie._achunks(self.itersupersets(aset, mode, limit), chunk,
+                                executor)
+
+    def countsupersets(self, aset):
+        """Return the number of keysets in this SetTrieMap that are (proper
+           or not proper) supersets of set aset, without enumerating
+           them.
+        """
+        setarr = self._codec.lookup(aset)
+        if self.cache is not None:
+            return self.cache.query(('countsupersets', tuple(setarr)),
+                                    SetTrie._countsupersets, self.root,
+                                    setarr)
+        return SetTrie._countsupersets(self.root, setarr)
+
+    def batchhassuperset(self, probes):
+        """Return a list of booleans telling for each set in probes whether
+           there is at least one keyset in this SetTrieMap that is its
+           superset.  See SetTrie.batchhassuperset().
+        """
+        keys, index = SetTrie._batchkeys(probes, self._codec.lookup)
+        found = [False] * len(keys)
+        for _, group in SetTrie._batchsupersets(self.root, keys, [], True):
+            for i in group:
+                found[i] = True
+        return [found[i] for i in index]
+
+    def batchsupersets(self, probes, mode=None):
+        """Return a list containing, for each set in probes, the list of
+           items from this SetTrieMap whose keysets are its supersets
+           (see supersets()).  All the probes are searched for in a
+           single traversal of the trie (see
+           SetTrie.batchhassuperset()).  Equal probes get the same
+           list, and the lists may share the keyset objects.
+
            Parameter mode: see documentation for itersupersets().
         """
-        return list(self.itersupersets(aset, mode))
+        keys, index = SetTrie._batchkeys(probes, self._codec.lookup)
+        results = [[] for _ in keys]
+        path = []
+        for node, group in SetTrie._batchsupersets(self.root, keys, path):
+            items = list(self._output(SetTrie._iter(node, path), path,
+                                      mode))
+            for i in group:
+                results[i].extend(items)
+        return [results[i] for i in index]
 
     def hassubset(self, aset):
         """Return True iff there is at least one set in this SetTrieMap that
            is the (proper or not proper) subset of set aset.
         """
-        return SetTrieMap._hassubset(self.root, list(sorted(aset)), 0)
-
-    @staticmethod
-    def _hassubset(node, setarr, idx):
-        """Used by hassubset()."""
-        if node.flag_last:
-            return True
-        if idx > len(setarr) - 1:
-            return False
-        found = False
-        try:
-            c = node.children.index(SetTrieMap.Node(setarr[idx]))
-            found = SetTrieMap._hassubset(node.children[c], setarr, idx + 1)
-        except ValueError:
-            pass
-        if not found:
-            return SetTrieMap._hassubset(node, setarr, idx + 1)
-        else:
-            return True
-
-    def itersubsets(self, aset, mode=None):
+        setarr = self._codec.lookupknown(aset)
+        engine = self.trace or SetTrie
+        if self.cache is not None:
+            return self.cache.query(('hassubset', tuple(setarr)),
+                                    engine._hassubset, self.root, setarr)
+        return engine._hassubset(self.root, setarr)
+
+    def itersubsets(self, aset, mode=None, limit=None):
         """Return an iterator over pairs (keyset, value) from this SetTrieMap
            for which keyset is (proper or not proper) subset of set aset.
            If mode is not None, the following values are allowed:
@@ -609,52 +2129,50 @@ class SetTrieMap:
 
            If mode is neither of 'keys', 'values' or None, behavior is
            equivalent to mode=None.
+
+           If limit is not None, at most limit items are returned: the
+           search stops as soon as they have been found.
         """
         path = []
-        return SetTrieMap._itersubsets(self.root, list(sorted(aset)),
-                                       0, path, mode)
-
-    @staticmethod
-    def _itersubsets(node, setarr, idx, path, mode):
-        """Used by itersubsets()."""
-        if node.data is not None:
-            path.append(node.data)
-        if node.flag_last:
-            if mode == 'keys':
-                yield set(path)
-            elif mode == 'values':
-                yield node.value
-            else:
-                yield (set(path), node.value)
-        for child in node.children:
-            if idx > len(setarr) - 1:
-                break
-            if child.data == setarr[idx]:
-                yield from SetTrieMap._itersubsets(child, setarr,
-                                                   idx + 1, path, mode)
-            else:
-                # advance in search set until we find child (or get to
-                # the end, or get to an element > child)
-                jdx = idx + 1
-                while jdx < len(setarr) and child.data >= setarr[jdx]:
-                    if child.data == setarr[jdx]:
-                        yield from SetTrieMap._itersubsets(child,
-                                                           setarr,
-                                                           jdx, path,
-                                                           mode)
-                        break
-                    jdx += 1
-        if node.data is not None:
-            path.pop()
+        setarr = self._codec.lookupknown(aset)
+        engine = self.trace or SetTrie
+        return SetTrie._limit(self._output(
+            engine._itersubsets(self.root, setarr, path), path, mode),
+            limit)
 
-    def subsets(self, aset, mode=None):
+    def subsets(self, aset, mode=None, limit=None):
         """Return a list of (keyset, value) pairs from this set-trie
            for which keyset is (proper or not proper) subset of set aset.
-           Parameter mode: see documentation for itersubsets().
+           Parameters mode and limit: see documentation for
+           itersubsets().
+        """
+        if self.cache is not None:
+            key = ('subsets', tuple(self._codec.lookupknown(aset)), mode,
+                   limit)
+            return list(self.cache.query(
+                key, lambda: tuple(self.itersubsets(aset, mode, limit))))
+        return list(self.itersubsets(aset, mode, limit))
+
+    def aitersubsets(self, aset, mode=None, limit=None, chunk=1000,
+                     executor=None):
+        """Return an asynchronous iterator over the items returned by
+           itersubsets(aset, mode, limit).  Parameters chunk and
+           executor: see SetTrie.aitersupersets().
         """
-        return list(self.itersubsets(aset, mode))
+        return SetTrie._achunks(self.itersubsets(aset, mode, limit), chunk,
+                                executor)
 
-    def iter(self, mode=None):
+    def countsubsets(self, aset):
+        """Return the number of keysets in this SetTrieMap that are (proper
+           or not proper) subsets of set aset, without creating them.
+        """
+        setarr = self._codec.lookupknown(aset)
+        if self.cache is not None:
+            return self.cache.query(('countsubsets', tuple(setarr)),
+                                    SetTrie._countsubsets, self.root, setarr)
+        return SetTrie._countsubsets(self.root, setarr)
+
+    def iter(self, mode=None, limit=None):
         """Returns an iterator to all (keyset, value) pairs stored in this
            SetTrieMap (using pre-order tree traversal).  The pairs are
            returned sorted to their keys, which are also sorted.  If
@@ -669,9 +2187,20 @@ class SetTrieMap:
 
            If mode is neither of 'keys', 'values' or None, behavior is
            equivalent to mode=None.
+
+           If limit is not None, at most limit items are returned: the
+           search stops as soon as they have been found.
         """
         path = []
-        yield from SetTrieMap._iter(self.root, path, mode)
+        return SetTrie._limit(self._output(
+            SetTrie._iter(self.root, path), path, mode), limit)
+
+    def aiter(self, mode=None, limit=None, chunk=1000, executor=None):
+        """Return an asynchronous iterator over the items returned by
+           iter(mode, limit).  Parameters chunk and executor: see
+           SetTrie.aitersupersets().
+        """
+        return SetTrie._achunks(self.iter(mode, limit), chunk, executor)
 
     def keys(self):
         """Alias for self.iter(mode='keys')."""
@@ -689,22 +2218,28 @@ class SetTrieMap:
         """Same as self.iter(mode='keys')."""
         return self.keys()
 
-    @staticmethod
-    def _iter(node, path, mode):
-        """Recursive function used by self.iter()."""
-        if node.data is not None:
-            path.append(node.data)
-        if node.flag_last:
-            if mode == 'keys':
-                yield set(path)
-            elif mode == 'values':
+    def _output(self, nodes, path, mode):
+        """Used by the iterator methods: turn the nodes yielded by one
+           of the SetTrie traversal functions into the items selected
+           by mode (see itersupersets()).
+        """
+        decode = self._codec.decode
+        if mode == 'keys':
+            for _ in nodes:
+                yield decode(path)
+        elif mode == 'values':
+            for node in nodes:
                 yield node.value
-            else:
-                yield (set(path), node.value)
-        for child in node.children:
-            yield from SetTrieMap._iter(child, path, mode)
-        if node.data is not None:
-            path.pop()
+        else:
+            for node in nodes:
+                yield (decode(path), node.value)
+
+    def __len__(self):
+        """Returns the number of keysets stored in this SetTrieMap.  The
+           count is kept up to date by the methods that add and remove
+           keys, so this takes constant time.
+        """
+        return self.root.count
 
     def aslist(self):
         """Return a list containing all the (keyset, value) pairs stored in
@@ -713,6 +2248,48 @@ class SetTrieMap:
         """
         return list(self.iter())
 
+    def snapshot(self):
+        """Return a new SetTrieMap holding the same items as this one, in
+           constant time, see SetTrie.snapshot().
+        """
+        if self.cache is not None:
+            raise ValueError('cache cannot be used with concurrent=True')
+        self.concurrent = True
+        t = self.__class__(intern=self.interner, concurrent=True,
+                           trace=self.trace)
+        t.root = self.root
+        return t
+
+    def unshare(self, concurrent=False):
+        """Give this SetTrieMap its own copy of all its nodes and set its
+           mode to concurrent, see SetTrie.unshare().
+        """
+        self.root = SetTrie._copytree(self.root)
+        self.concurrent = concurrent
+
+    def save(self, path):
+        """Save this SetTrieMap (with its values, which are pickled) to file
+           path.  See SetTrie.save().
+        """
+        with open(path, 'wb') as stream:
+            SetTrie._dump(self, stream, True)
+
+    @classmethod
+    def load(cls, path):
+        """Return a new SetTrieMap read from file path, written by save().
+           See SetTrie.load().
+        """
+        t = cls()
+        with open(path, 'rb') as stream:
+            SetTrie._undump(t, stream, True)
+        return t
+
+    def stats(self):
+        """Return a dict describing the shape and memory use of this
+           SetTrieMap, see SetTrie.stats().
+        """
+        return SetTrie._stats(self, sys.getsizeof)
+
     def printtree(self, tabchr=' ', tabsize=2, stream=sys.stdout):
         """Print a mirrored 90-degree rotation of the nodes in this SetTrieMap
            to stream (default: sys.stdout).  Nodes marked as flag_last
@@ -721,21 +2298,15 @@ class SetTrieMap:
            tabchar characters will be used.  Associated values are
            printed after ': ' trailing flag_last=True nodes.
         """
-        self._printtree(self.root, 0, tabchr, tabsize, stream)
-
-    @staticmethod
-    def _printtree(node, level, tabchr, tabsize, stream):
-        """Used by self.printTree(), recursive preorder traverse and printing
-           of trie node
-        """
-        print((str(node.data).rjust(len(repr(node.data)) + level * tabsize,
-                                    tabchr) +
-               (': {}'.format(repr(node.value)) if
-                node.flag_last else
-                '')),
-              file=stream)
-        for child in node.children:
-            SetTrieMap._printtree(child, level + 1, tabchr, tabsize, stream)
+        element = self._codec.element
+        for node, level in SetTrie._iternodes(self.root):
+            data = element(node.data) if level else node.data
+            print((str(data).rjust(len(repr(data)) +
+                                        level * tabsize, tabchr) +
+                   (': {}'.format(repr(node.value)) if
+                    node.flag_last else
+                    '')),
+                  file=stream)
 
     def __str__(self):
         """Returns str(self.aslist())."""
@@ -774,49 +2345,70 @@ class SetTrieMultiMap:
 
     """
 
-    class Node:
+    class Node(SetTrie.Node):
         """Node object used by SetTrieMultiMap. You probably don't need to
-           use it from the outside.
+           use it from the outside.  Same layout as SetTrie.Node, plus
+           the associated values.
         """
 
+        __slots__ = ('value',)
+
         def __init__(self, data=None, value=None):
-            # child nodes a.k.a. children
-            self.children = sortedcontainers.SortedList()
-            # if True, this is the last element of a key set store a
-            # member element of the key set. Must be a hashable
-            # (i.e. hash(data) should work) and comparable/orderable
-            # (i.e. data1 < data2 should work; see
-            # https://wiki.python.org/moin/HowTo/Sorting/) type.
-            self.flag_last = False
-            self.data = data
+            SetTrie.Node.__init__(self, data)
             # the list of values associated to the key set if
             # flag_last == True, otherwise None
             self.value = None
 
-        # comparison operators to support rich comparisons, sorting
-        # etc. using self.data as key
-        def __eq__(self, other): return self.data == other.data
-
-        def __ne__(self, other): return self.data != other.data
-
-        def __lt__(self, other): return self.data < other.data
-
-        def __le__(self, other): return self.data <= other.data
-
-        def __gt__(self, other): return self.data > other.data
-
-        def __ge__(self, other): return self.data >= other.data
+        def copy(self):
+            """Return a copy of this node, see SetTrie.Node.copy().  The
+               copy shares the list of values.
+            """
+            node = SetTrie.Node.copy(self)
+            node.value = self.value
+            return node
 
-    def __init__(self, iterable=None):
+    def __init__(self, iterable=None, intern=False, cache=None,
+                 concurrent=False, trace=None):
         """Set up this SetTrieMultiMap object.  If iterable is specified, it
            must be an iterable of (keyset, value) pairs from which
-           set-trie is populated; key may be repeated, all associated
-           values will be stored.
+           set-trie is populated in a single pass (see fromsorted());
+           key may be repeated, all associated values will be stored.
+           Parameters intern, cache, concurrent and trace: see
+           SetTrie.__init__().
         """
         self.root = SetTrieMultiMap.Node()
+        if cache and concurrent:
+            raise ValueError('cache cannot be used with concurrent=True')
+        self.interner = Interner() if intern is True else intern or None
+        self._codec = self.interner or _Identity
+        self.cache = QueryCache(cache) if cache else None
+        self.concurrent = concurrent
+        self.trace = trace
         if iterable is not None:
-            for key, value in iterable:
-                self.assign(key, value)
+            encode = self._codec.encode
+            # sorting is stable: values of a key keep their order
+            self._load(sorted(((tuple(encode(key)), value)
+                               for key, value in iterable),
+                              key=itemgetter(0)))
+
+    @classmethod
+    def fromsorted(cls, iterable):
+        """Return a new SetTrieMultiMap populated from iterable, which
+           must yield (keyset, value) pairs where the keysets are sorted
+           sequences (e.g. tuples) given in lexicographic order.  All
+           the values of a repeated keyset are stored.  See
+           SetTrie.fromsorted().
+        """
+        t = cls()
+        t._load(iterable)
+        return t
+
+    def _load(self, items):
+        """Used by __init__() and fromsorted()."""
+        for node, value in SetTrie._bulkadd(self.root, items):
+            if node.value is None:
+                node.value = []
+            node.value.append(value)
 
     def assign(self, akey, avalue):
         """Add key akey with associated value avalue to the container.  akey
@@ -832,35 +2424,88 @@ class SetTrieMultiMap:
            before this function call, returns (number of items before
            call + 1) if akey was an already existing key.
         """
-        valcnt = [0]
-        self._assign(self.root, iter(sorted(akey)), avalue, valcnt)
-        return valcnt[0]
+        root = self.root.copy() if self.concurrent else self.root
+        node = SetTrie._add(root, self._codec.encode(akey), self.concurrent)
+        if node.value is None:
+            node.value = []
+        elif self.concurrent:  # the list may be shared with searches
+            node.value = list(node.value)
+        node.value.append(avalue)
+        self.root = root
+        if self.cache is not None:
+            self.cache.invalidate()
+        # return # of values for key after this assignment
+        return len(node.value)
+
+    def remove(self, keyset):
+        """Remove key keyset and all its associated values from this
+           SetTrieMultiMap.  Raises KeyError if keyset is not a key.
+           Nodes that are no longer needed are removed from the trie.
+        """
+        self.pop(keyset)
 
-    @staticmethod
-    def _assign(node, it, val, valcnt):
-        """Recursive function used by self.assign()."""
-        try:
-            data = next(it)
-            nextnode = None
-            try:
-                # find first child with this data
-                nextnode = node.children[node.children.index(
-                    SetTrieMultiMap.Node(data))]
-            except ValueError:  # not found
-                nextnode = SetTrieMultiMap.Node(data)  # create new node
-                node.children.add(nextnode)  # add to children & sort
-            SetTrieMultiMap._assign(nextnode, it, val, valcnt)  # recurse
-        except StopIteration:  # end of set to add
-            node.flag_last = True
-            if node.value is None:
-                node.value = []
-            node.value.append(val)
-            # return # of values for key after this assignment
-            valcnt[0] = len(node.value)
+    def discard(self, keyset):
+        """Remove key keyset and all its associated values from this
+           SetTrieMultiMap if keyset is a key.
+        """
+        self.pop(keyset, None)
+
+    def __delitem__(self, keyset):
+        """Same as self.remove(keyset), enables del m[keyset]."""
+        self.pop(keyset)
+
+    def pop(self, keyset, *default):
+        """Remove key keyset and return the list of its associated values.
+           If keyset is not a key, return default if given, else
+           raise KeyError.
+        """
+        root = self.root.copy() if self.concurrent else self.root
+        node = SetTrie._remove(root, self._codec.lookup(keyset),
+                               self.concurrent)
+        if node is None:
+            if default:
+                return default[0]
+            raise KeyError(keyset)
+        values = node.value
+        node.value = None
+        self.root = root
+        if self.cache is not None:
+            self.cache.invalidate()
+        return values
+
+    def removevalue(self, keyset, avalue):
+        """Remove the first occurrence of avalue from the values
+           associated to keyset.  When the last value of keyset is
+           removed, keyset itself is removed (see remove()).  Raises
+           KeyError if keyset is not a key and ValueError if avalue is
+           not associated to it.
+
+           Returns the number of values associated to keyset after
+           the removal.
+        """
+        setarr = self._codec.lookup(keyset)
+        node = SetTrie._find(self.root, setarr)
+        if node is None or not node.flag_last:
+            raise KeyError(keyset)
+        values = list(node.value) if self.concurrent else node.value
+        values.remove(avalue)
+        if self.cache is not None:
+            self.cache.invalidate()
+        if values:
+            if self.concurrent:  # replace the list of a copy of node
+                root = self.root.copy()
+                SetTrie._add(root, setarr, True).value = values
+                self.root = root
+            return len(values)
+        root = self.root.copy() if self.concurrent else self.root
+        SetTrie._remove(root, setarr, self.concurrent).value = None
+        self.root = root
+        return 0
 
     def contains(self, keyset):
         """Returns True iff this set-trie contains set keyset as a key."""
-        return self._contains(self.root, iter(sorted(keyset)))
+        node = SetTrie._find(self.root, self._codec.lookup(keyset))
+        return node is not None and node.flag_last
 
     def __contains__(self, keyset):
         """Returns True iff this set-trie contains set keyset as a key.  This
@@ -873,93 +2518,43 @@ class SetTrieMultiMap:
         """
         return self.contains(keyset)
 
-    @staticmethod
-    def _contains(node, it):
-        """Recursive function used by self.contains()."""
-        try:
-            data = next(it)
-            try:
-                # find first child with this data
-                matchnode = node.children[node.children.index(
-                    SetTrieMultiMap.Node(data))]
-                return SetTrieMap._contains(matchnode, it)  # recurse
-            except ValueError:  # not found
-                return False
-        except StopIteration:
-            return node.flag_last
-
     def count(self, keyset):
         """Returns the number of values associated to keyset. If keyset is
            unknown, returns 0.
         """
-        return self._count(self.root, iter(sorted(keyset)))
-
-    @staticmethod
-    def _count(node, it):
-        """Recursive function used by self.count()."""
-        try:
-            data = next(it)
-            try:
-                # find first child with this data
-                matchnode = node.children[node.children.index(
-                    SetTrieMultiMap.Node(data))]
-                return SetTrieMultiMap._count(matchnode, it)  # recurse
-            except ValueError:  # not found
-                return 0
-        except StopIteration:
-            if node.flag_last and node.value is not None:
-                return len(node.value)
-            else:
-                return 0
+        node = SetTrie._find(self.root, self._codec.lookup(keyset))
+        if node is None or not node.flag_last or node.value is None:
+            return 0
+        return len(node.value)
 
     def iterget(self, keyset):
         """Return an iterator to the values associated to keyset."""
-        return self._iterget(self.root, iter(sorted(keyset)))
-
-    @staticmethod
-    def _iterget(node, it):
-        """Recursive function used by self.get()."""
-        try:
-            data = next(it)
-            try:
-                # find first child with this data
-                matchnode = node.children[node.children.index(
-                    SetTrieMultiMap.Node(data))]
-                yield from SetTrieMultiMap._iterget(matchnode, it)  # recurse
-            except ValueError:  # not found
-                return None
-        except StopIteration:
-            if node.flag_last:
-                yield from node.value
+        node = SetTrie._find(self.root, self._codec.lookup(keyset))
+        if node is None or not node.flag_last:
+            return iter(())
+        return iter(node.value)
 
     def get(self, keyset, default=None):
         """Return a list of values associated to keyset if keyset is in this
            SetTrieMultiMap, else default.
         """
-        return self._get(self.root, iter(sorted(keyset)), default)
-
-    @staticmethod
-    def _get(node, it, default):
-        """Recursive function used by self.get()."""
-        try:
-            data = next(it)
-            try:
-                # find first child with this data
-                matchnode = node.children[node.children.index(
-                    SetTrieMultiMap.Node(data))]
-                return SetTrieMultiMap._get(matchnode, it, default)  # recurse
-            except ValueError:  # not found
-                return default
-        except StopIteration:
-            return (node.value if node.flag_last else default)
+        node = SetTrie._find(self.root, self._codec.lookup(keyset))
+        if node is None or not node.flag_last:
+            return default
+        return node.value
 
     def hassuperset(self, aset):
         """Returns True iff there is at least one key set in this
            SetTrieMultiMap that is the superset of set aset.
         """
-        return SetTrieMap._hassuperset(self.root, list(sorted(aset)), 0)
-
-    def itersupersets(self, aset, mode=None):
+        setarr = self._codec.lookup(aset)
+        engine = self.trace or SetTrie
+        if self.cache is not None:
+            return self.cache.query(('hassuperset', tuple(setarr)),
+                                    engine._hassuperset, self.root, setarr)
+        return engine._hassuperset(self.root, setarr)
+
+    def itersupersets(self, aset, mode=None, limit=None):
         """Return an iterator over all (keyset, value) pairs from this
            SetTrieMultiMap for which set keyset is a superset (proper
            or not proper) of set aset.  If mode is not None, the
@@ -974,84 +2569,94 @@ class SetTrieMultiMap:
            If mode is neither of 'keys', 'values' or None, behavior is
            equivalent to mode=None.
 
+           If limit is not None, at most limit items are returned: the
+           search stops as soon as they have been found.
         """
         path = []
-        return SetTrieMultiMap._itersupersets(self.root,
-                                              list(sorted(aset)), 0,
-                                              path, mode)
+        engine = self.trace or SetTrie
+        return SetTrie._limit(self._output(
+            engine._itersupersets(self.root, self._codec.lookup(aset), path),
+            path, mode), limit)
 
-    @staticmethod
-    def _itersupersets(node, setarr, idx, path, mode):
-        """Used by itersupersets()."""
-        if node.data is not None:
-            path.append(node.data)
-        if node.flag_last and idx > len(setarr) - 1:
-            if mode == 'keys':
-                yield set(path)
-            elif mode == 'values':
-                yield from node.value
-            else:
-                yield from [(set(path), val) for val in node.value]
-        if idx <= len(setarr) - 1:  # we still have elements of aset to find
-            for child in node.children:
-                # don't go to subtrees where current element cannot be
-                if child.data > setarr[idx]:
-                    break
-                if child.data == setarr[idx]:
-                    yield from SetTrieMultiMap._itersupersets(child,
-                                                              setarr,
-                                                              idx + 1,
-                                                              path, mode)
-                else:
-                    yield from SetTrieMultiMap._itersupersets(child,
-                                                              setarr,
-                                                              idx,
-                                                              path,
-                                                              mode)
-        # no more elements to find: just traverse this subtree to get
-        # all supersets
-        else:
-            for child in node.children:
-                yield from SetTrieMultiMap._itersupersets(child,
-                                                          setarr, idx,
-                                                          path, mode)
-        if node.data is not None:
-            path.pop()
-
-    def supersets(self, aset, mode=None):
+    def supersets(self, aset, mode=None, limit=None):
         """Return a list containing pairs of (keyset, value) for which keyset
            is superset of set aset.
 
+           Parameters mode and limit: see documentation for
+           itersupersets().
+        """
+        if self.cache is not None:
+            key = ('supersets', tuple(self._codec.lookup(aset)), mode, limit)
+            return list(self.cache.query(
+                key, lambda: tuple(self.itersupersets(aset, mode, limit))))
+        return list(self.itersupersets(aset, mode, limit))
+
+    def aitersupersets(self, aset, mode=None, limit=None, chunk=1000,
+                       executor=None):
+        """Return an asynchronous iterator over the items returned by
+           itersupersets(aset, mode, limit).  Parameters chunk and
+           executor: see SetTrie.aitersupersets().
+        """
+        return SetTrie._achunks(self.itersupersets(aset, mode, limit), chunk,
+                                executor)
+
+    def countsupersets(self, aset):
+        """Return the number of keysets in this SetTrieMultiMap that are
+           (proper or not proper) supersets of set aset, without
+           enumerating them.  Keysets are counted once, regardless of
+           the number of their values.
+        """
+        setarr = self._codec.lookup(aset)
+        if self.cache is not None:
+            return self.cache.query(('countsupersets', tuple(setarr)),
+                                    SetTrie._countsupersets, self.root,
+                                    setarr)
+        return SetTrie._countsupersets(self.root, setarr)
+
+    def batchhassuperset(self, probes):
+        """Return a list of booleans telling for each set in probes whether
+           there is at least one keyset in this SetTrieMultiMap that is its
+           superset.  See SetTrie.batchhassuperset().
+        """
+        keys, index = SetTrie._batchkeys(probes, self._codec.lookup)
+        found = [False] * len(keys)
+        for _, group in SetTrie._batchsupersets(self.root, keys, [], True):
+            for i in group:
+                found[i] = True
+        return [found[i] for i in index]
+
+    def batchsupersets(self, probes, mode=None):
+        """Return a list containing, for each set in probes, the list of
+           items from this SetTrieMultiMap whose keysets are its supersets
+           (see supersets()).  All the probes are searched for in a
+           single traversal of the trie (see
+           SetTrie.batchhassuperset()).  Equal probes get the same
+           list, and the lists may share the keyset objects.
+
            Parameter mode: see documentation for itersupersets().
         """
-        return list(self.itersupersets(aset, mode))
+        keys, index = SetTrie._batchkeys(probes, self._codec.lookup)
+        results = [[] for _ in keys]
+        path = []
+        for node, group in SetTrie._batchsupersets(self.root, keys, path):
+            items = list(self._output(SetTrie._iter(node, path), path,
+                                      mode))
+            for i in group:
+                results[i].extend(items)
+        return [results[i] for i in index]
 
     def hassubset(self, aset):
         """Return True iff there is at least one set in this SetTrieMultiMap
            that is the (proper or not proper) subset of set aset.
         """
-        return SetTrieMultiMap._hassubset(self.root, list(sorted(aset)), 0)
-
-    @staticmethod
-    def _hassubset(node, setarr, idx):
-        """Used by hassubset()."""
-        if node.flag_last:
-            return True
-        if idx > len(setarr) - 1:
-            return False
-        found = False
-        try:
-            c = node.children.index(SetTrieMultiMap.Node(setarr[idx]))
-            found = SetTrieMultiMap._hassubset(
-                node.children[c], setarr, idx + 1)
-        except ValueError:
-            pass
-        if not found:
-            return SetTrieMultiMap._hassubset(node, setarr, idx + 1)
-        else:
-            return True
-
-    def itersubsets(self, aset, mode=None):
+        setarr = self._codec.lookupknown(aset)
+        engine = self.trace or SetTrie
+        if self.cache is not None:
+            return self.cache.query(('hassubset', tuple(setarr)),
+                                    engine._hassubset, self.root, setarr)
+        return engine._hassubset(self.root, setarr)
+
+    def itersubsets(self, aset, mode=None, limit=None):
         """Return an iterator over pairs (keyset, value) from this
            SetTrieMultiMap for which keyset is (proper or not proper)
            subset of set aset.  If mode is not None, the following
@@ -1065,39 +2670,52 @@ class SetTrieMultiMap:
 
            If mode is neither of 'keys', 'values' or None, behavior is
            equivalent to mode=None.
+
+           If limit is not None, at most limit items are returned: the
+           search stops as soon as they have been found.
         """
         path = []
-        return SetTrieMultiMap._itersubsets(self.root, aset, path,
-                                            mode)
-
-    @staticmethod
-    def _itersubsets(node, setarr, path, mode):
-        """Used by itersubsets()."""
-        path.append(node.data)
-
-        if node.flag_last:
-            f_path = set(path[1:])
-            if mode == 'keys':
-                yield f_path
-            elif mode == 'values':
-                yield from node.value
-            else:
-                yield from ((f_path, val) for val in node.value)
+        setarr = self._codec.lookupknown(aset)
+        engine = self.trace or SetTrie
+        return SetTrie._limit(self._output(
+            engine._itersubsets(self.root, setarr, path), path, mode),
+            limit)
 
-        for child in node.children:
-            if child.data in setarr:
-                yield from SetTrieMultiMap._itersubsets(child, setarr,
-                                                        path, mode)
-        path.pop()
-
-    def subsets(self, aset, mode=None):
+    def subsets(self, aset, mode=None, limit=None):
         """Return a list of (keyset, value) pairs
            for which keyset is (proper or not proper) subset of set aset.
-           Parameter mode: see documentation for itersubsets().
+           Parameters mode and limit: see documentation for
+           itersubsets().
+        """
+        if self.cache is not None:
+            key = ('subsets', tuple(self._codec.lookupknown(aset)), mode,
+                   limit)
+            return list(self.cache.query(
+                key, lambda: tuple(self.itersubsets(aset, mode, limit))))
+        return list(self.itersubsets(aset, mode, limit))
+
+    def aitersubsets(self, aset, mode=None, limit=None, chunk=1000,
+                     executor=None):
+        """Return an asynchronous iterator over the items returned by
+           itersubsets(aset, mode, limit).  Parameters chunk and
+           executor: see SetTrie.aitersupersets().
         """
-        return list(self.itersubsets(aset, mode))
+        return SetTrie._achunks(self.itersubsets(aset, mode, limit), chunk,
+                                executor)
+
+    def countsubsets(self, aset):
+        """Return the number of keysets in this SetTrieMultiMap that are
+           (proper or not proper) subsets of set aset, without creating
+           them.  Keysets are counted once, regardless of the number of
+           their values.
+        """
+        setarr = self._codec.lookupknown(aset)
+        if self.cache is not None:
+            return self.cache.query(('countsubsets', tuple(setarr)),
+                                    SetTrie._countsubsets, self.root, setarr)
+        return SetTrie._countsubsets(self.root, setarr)
 
-    def iter(self, mode=None):
+    def iter(self, mode=None, limit=None):
         """Returns an iterator to all (keyset, value) pairs stored in this
            SetTrieMultiMap (using pre-order tree traversal).  The
            pairs are returned sorted to their keys, which are also
@@ -1112,9 +2730,20 @@ class SetTrieMultiMap:
 
            If mode is neither of 'keys', 'values' or None, behavior is
            equivalent to mode=None.
+
+           If limit is not None, at most limit items are returned: the
+           search stops as soon as they have been found.
         """
         path = []
-        yield from SetTrieMultiMap._iter(self.root, path, mode)
+        return SetTrie._limit(self._output(
+            SetTrie._iter(self.root, path), path, mode), limit)
+
+    def aiter(self, mode=None, limit=None, chunk=1000, executor=None):
+        """Return an asynchronous iterator over the items returned by
+           iter(mode, limit).  Parameters chunk and executor: see
+           SetTrie.aitersupersets().
+        """
+        return SetTrie._achunks(self.iter(mode, limit), chunk, executor)
 
     def keys(self):
         """Alias for self.iter(mode='keys')."""
@@ -1132,22 +2761,31 @@ class SetTrieMultiMap:
         """Same as self.iter(mode='keys')."""
         return self.keys()
 
-    @staticmethod
-    def _iter(node, path, mode):
-        """Recursive function used by self.iter()."""
-        if node.data is not None:
-            path.append(node.data)
-        if node.flag_last:
-            if mode == 'keys':
-                yield set(path)
-            elif mode == 'values':
+    def _output(self, nodes, path, mode):
+        """Used by the iterator methods: turn the nodes yielded by one
+           of the SetTrie traversal functions into the items selected
+           by mode (see itersupersets()).  A pair is produced for each
+           of the values associated to a keyset.
+        """
+        decode = self._codec.decode
+        if mode == 'keys':
+            for _ in nodes:
+                yield decode(path)
+        elif mode == 'values':
+            for node in nodes:
                 yield from node.value
-            else:
-                yield from [(set(path), val) for val in node.value]
-        for child in node.children:
-            yield from SetTrieMultiMap._iter(child, path, mode)
-        if node.data is not None:
-            path.pop()
+        else:
+            for node in nodes:
+                for val in node.value:
+                    yield (decode(path), val)
+
+    def __len__(self):
+        """Returns the number of keysets stored in this SetTrieMultiMap
+           (not the number of values).  The count is kept up to date by
+           the methods that add and remove keys, so this takes constant
+           time.
+        """
+        return self.root.count
 
     def aslist(self):
         """Return a list containing all the (keyset, value) pairs stored in
@@ -1156,6 +2794,56 @@ class SetTrieMultiMap:
         """
         return list(self.iter())
 
+    def snapshot(self):
+        """Return a new SetTrieMultiMap holding the same items as this one,
+           in constant time, see SetTrie.snapshot().
+        """
+        if self.cache is not None:
+            raise ValueError('cache cannot be used with concurrent=True')
+        self.concurrent = True
+        t = self.__class__(intern=self.interner, concurrent=True,
+                           trace=self.trace)
+        t.root = self.root
+        return t
+
+    def unshare(self, concurrent=False):
+        """Give this SetTrieMultiMap its own copy of all its nodes and value
+           lists, and set its mode to concurrent, see SetTrie.unshare().
+        """
+        self.root = SetTrie._copytree(self.root, list)
+        self.concurrent = concurrent
+
+    def save(self, path):
+        """Save this SetTrieMultiMap (with its values, which are pickled) to
+           file path.  See SetTrie.save().
+        """
+        with open(path, 'wb') as stream:
+            SetTrie._dump(self, stream, True)
+
+    @classmethod
+    def load(cls, path):
+        """Return a new SetTrieMultiMap read from file path, written by save().
+           See SetTrie.load().
+        """
+        t = cls()
+        with open(path, 'rb') as stream:
+            SetTrie._undump(t, stream, True)
+        return t
+
+    def stats(self):
+        """Return a dict describing the shape and memory use of this
+           SetTrieMultiMap, see SetTrie.stats().  The values are
+           counted with their lists.
+        """
+        return SetTrie._stats(self, SetTrieMultiMap._valuesize)
+
+    @staticmethod
+    def _valuesize(values):
+        """Used by stats(): return the shallow size of the list values and
+           its items.
+        """
+        return sys.getsizeof(values) + sum(map(sys.getsizeof, values))
+
     def printtree(self, tabchr=' ', tabsize=2, stream=sys.stdout):
         """Print a mirrored 90-degree rotation of the nodes in this SetTrieMap
            to stream (default: sys.stdout).  Nodes marked as flag_last
@@ -1164,19 +2852,15 @@ class SetTrieMultiMap:
            tabchar characters will be used.  Associated values are
            printed after ': ' trailing flag_last=True nodes.
         """
-        self._printtree(self.root, 0, tabchr, tabsize, stream)
-
-    @staticmethod
-    def _printtree(node, level, tabchr, tabsize, stream):
-        """Used by self.printTree(), recursive preorder traverse and printing
-           of trie node
-        """
-        print((str(node.data).rjust(len(repr(node.data)) + level * tabsize,
-                                    tabchr) +
-               (': {}'.format(repr(node.value)) if node.flag_last else '')),
-              file=stream)
-        for child in node.children:
-            SetTrieMap._printtree(child, level + 1, tabchr, tabsize, stream)
+        element = self._codec.element
+        for node, level in SetTrie._iternodes(self.root):
+            data = element(node.data) if level else node.data
+            print((str(data).rjust(len(repr(data)) +
+                                        level * tabsize, tabchr) +
+                   (': {}'.format(repr(node.value)) if
+                    node.flag_last else
+                    '')),
+                  file=stream)
 
     def __str__(self):
         """Returns str(self.aslist())."""
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Module settrie.aio
+
+Asynchronous iterators for asyncio behind the aiter*() methods of the
+containers.  Requires Python 3.5 (async def); the settrie module only
+imports it when one of these methods is called, so it can still be
+used with older versions.
+
+See README.md for more information.
+
+Licensed under the GNU LESSER GENERAL PUBLIC LICENSE, Version 3.
+See https://www.gnu.org/licenses/lgpl.html
+"""
+
+import asyncio
+from itertools import islice
+
+
+class ChunkIterator:
+    """Asynchronous iterator over the items of iterator it, which lets the
+       event loop run its other tasks after every chunk items.  If
+       executor is not None, the chunks are taken from it in a thread
+       of executor instead, so the loop only waits for them.
+    """
+
+    def __init__(self, it, chunk, executor):
+        self._it = it
+        self._chunk = chunk
+        self._executor = executor
+        # items taken from it and not returned yet (executor only)
+        self._items = []
+        self._pos = 0
+        # number of items returned since the loop last ran its tasks
+        self._count = 0
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._executor is None:
+            if self._count == self._chunk:
+                self._count = 0
+                await asyncio.sleep(0)
+            try:
+                item = next(self._it)
+            except StopIteration:
+                raise StopAsyncIteration
+            self._count += 1
+            return item
+        if self._pos == len(self._items):
+            if self._done:
+                raise StopAsyncIteration
+            loop = asyncio.get_event_loop()
+            self._items = await loop.run_in_executor(
+                self._executor, list, islice(self._it, self._chunk))
+            self._pos = 0
+            self._done = len(self._items) < self._chunk
+            if not self._items:
+                raise StopAsyncIteration
+        item = self._items[self._pos]
+        self._pos += 1
+        return item
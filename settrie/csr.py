@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Module settrie.csr
+
+Set-tries stored in flat arrays in compressed sparse row (CSR) layout
+instead of Node objects.
+
+See README.md for more information.
+
+Licensed under the GNU LESSER GENERAL PUBLIC LICENSE, Version 3.
+See https://www.gnu.org/licenses/lgpl.html
+"""
+
+import gc
+import pickle
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from settrie import SetTrie, _Identity
+
+
+class _CSRTrie:
+    """Searches shared by the containers in CSR layout.
+
+       The nodes are numbered in level order (breadth-first, the root
+       is node 0), so the children of each node are numbered
+       contiguously.  The trie is stored in the following sequences
+       of ints (arrays or memoryviews), which subclasses set:
+
+       _labels: the label of each node (0 for the root)
+       _first: the number of the first child of each node; the
+               children of node v are the nodes _first[v] to
+               _first[v + 1] - 1 (so _first has an extra item)
+       _flags: 1 for the nodes marked flag_last, 0 for the others
+       _counts: the number of nodes marked flag_last in the subtree of
+                each node
+
+       The set elements are turned into labels and back by the codec
+       in _codec (see settrie.Interner).
+    """
+
+    def __len__(self):
+        """Returns the number of sets stored in this container."""
+        return self._counts[0]
+
+    def _find(self, setarr):
+        """Return the node whose path is labeled by the sorted list of
+           labels setarr, or -1 if there is no such node.
+        """
+        labels = self._labels
+        first = self._first
+        node = 0
+        for data in setarr:
+            hi = first[node + 1]
+            i = bisect_left(labels, data, first[node], hi)
+            if i == hi or labels[i] != data:  # not found
+                return -1
+            node = i
+        return node
+
+    def _contains(self, aset):
+        """Return the node of set aset if it is stored, else -1."""
+        node = self._find(self._codec.lookup(aset))
+        return node if node >= 0 and self._flags[node] else -1
+
+    def _iter(self, node, path):
+        """Yield each node marked flag_last in the subtree of node, in
+           pre-order.  While a node is yielded, path holds the labels
+           leading to it from node.  Uses an explicit stack of
+           iterators over the (numbers of the) children, like
+           SetTrie._iter().
+        """
+        labels = self._labels
+        first = self._first
+        flags = self._flags
+        if flags[node]:
+            yield node
+        stack = [iter(range(first[node], first[node + 1]))]
+        while stack:
+            for child in stack[-1]:
+                path.append(labels[child])
+                if flags[child]:
+                    yield child
+                lo = first[child]
+                hi = first[child + 1]
+                if lo < hi:
+                    stack.append(iter(range(lo, hi)))
+                    break
+                path.pop()
+            else:  # no more children
+                stack.pop()
+                if stack:
+                    path.pop()
+
+    def _supersetroots(self, setarr):
+        """Yield the nodes where the last element of the sorted list of
+           labels setarr is found by a superset search, so that the sets
+           in their subtrees are the supersets of setarr.  See
+           SetTrie._countsupersets().
+        """
+        labels = self._labels
+        first = self._first
+        last = len(setarr)
+        if last == 0:
+            yield 0
+            return
+        stack = [(iter(range(first[0], first[1])), 0)]
+        while stack:
+            children, idx = stack[-1]
+            for child in children:
+                data = labels[child]
+                # don't go to subtrees where current element cannot be
+                if data > setarr[idx]:
+                    stack.pop()
+                    break
+                if data == setarr[idx]:
+                    if idx + 1 == last:
+                        yield child
+                        continue
+                    nidx = idx + 1
+                else:
+                    nidx = idx
+                lo = first[child]
+                hi = first[child + 1]
+                if lo < hi:
+                    stack.append((iter(range(lo, hi)), nidx))
+                    break
+            else:  # no more children
+                stack.pop()
+
+    def _itersupersets(self, setarr, path, node=0, idx=0):
+        """Yield each node marked flag_last in the subtree of node whose
+           path is a superset of the sorted list of labels setarr, in
+           pre-order (see _iter()), where setarr[:idx] are the elements
+           found on the path to node.  Same search as
+           SetTrie._itersupersets().
+        """
+        labels = self._labels
+        first = self._first
+        flags = self._flags
+        last = len(setarr)
+        if flags[node] and idx == last:
+            yield node
+        stack = [(iter(range(first[node], first[node + 1])), idx)]
+        while stack:
+            children, idx = stack[-1]
+            for child in children:
+                data = labels[child]
+                if idx < last:  # we still have elements of aset to find
+                    # don't go to subtrees where current element cannot be
+                    if data > setarr[idx]:
+                        stack.pop()
+                        if stack:
+                            path.pop()
+                        break
+                    nidx = idx + 1 if data == setarr[idx] else idx
+                else:  # just traverse this subtree to get all supersets
+                    nidx = idx
+                path.append(data)
+                if flags[child] and nidx == last:
+                    yield child
+                lo = first[child]
+                hi = first[child + 1]
+                if lo < hi:
+                    stack.append((iter(range(lo, hi)), nidx))
+                    break
+                path.pop()
+            else:  # no more children
+                stack.pop()
+                if stack:
+                    path.pop()
+
+    def _subsetchildren(self, node, setarr, idx):
+        """Return the list of (child, index of the element after its label
+           in setarr) pairs of the children of node labeled by one of
+           the elements of the sorted list setarr[idx:], in sorted
+           order.  See SetTrie._subsetchildren().
+        """
+        labels = self._labels
+        lo = self._first[node]
+        hi = self._first[node + 1]
+        last = len(setarr)
+        matches = []
+        if hi - lo <= last - idx:
+            # look up the children among the remaining elements
+            jdx = idx
+            for c in range(lo, hi):
+                data = labels[c]
+                jdx = bisect_left(setarr, data, jdx)
+                if jdx == last:
+                    break
+                if setarr[jdx] == data:
+                    matches.append((c, jdx + 1))
+        else:
+            # look up the remaining elements among the children
+            c = lo
+            for jdx in range(idx, last):
+                data = setarr[jdx]
+                c = bisect_left(labels, data, c, hi)
+                if c == hi:
+                    break
+                if labels[c] == data:
+                    matches.append((c, jdx + 1))
+        return matches
+
+    def _itersubsets(self, setarr, path, node=0, idx=0):
+        """Yield each node marked flag_last in the subtree of node whose
+           path is a subset of the sorted list of labels setarr, in
+           pre-order (see _iter()), where the label of node (if not
+           the root) is setarr[idx - 1].  Same search as
+           SetTrie._itersubsets().
+        """
+        labels = self._labels
+        first = self._first
+        flags = self._flags
+        last = len(setarr)
+        if flags[node]:
+            yield node
+        stack = [iter(self._subsetchildren(node, setarr, idx))]
+        while stack:
+            for child, idx in stack[-1]:
+                path.append(labels[child])
+                if flags[child]:
+                    yield child
+                if idx < last and first[child] < first[child + 1]:
+                    stack.append(iter(self._subsetchildren(child, setarr,
+                                                           idx)))
+                    break
+                path.pop()
+            else:  # no more children
+                stack.pop()
+                if stack:
+                    path.pop()
+
+    def _hassuperset(self, aset):
+        """Return True iff a set in the trie is a superset of aset."""
+        counts = self._counts
+        for node in self._supersetroots(self._codec.lookup(aset)):
+            if counts[node]:  # only the root can have no sets
+                return True
+        return False
+
+    def _countsupersets(self, aset):
+        """Return the number of sets in the trie that are supersets of aset."""
+        counts = self._counts
+        return sum(counts[node] for node in
+                   self._supersetroots(self._codec.lookup(aset)))
+
+    def _hassubset(self, aset):
+        """Return True iff a set in the trie is a subset of aset."""
+        for _ in self._itersubsets(self._codec.lookupknown(aset), []):
+            return True
+        return False
+
+    def _countsubsets(self, aset):
+        """Return the number of sets in the trie that are subsets of aset."""
+        setarr = self._codec.lookupknown(aset)
+        flags = self._flags
+        last = len(setarr)
+        total = 0
+        stack = [(0, 0)]
+        while stack:
+            node, idx = stack.pop()
+            total += flags[node]
+            if idx < last:
+                stack.extend(self._subsetchildren(node, setarr, idx))
+        return total
+
+    def __str__(self):
+        """Returns str(self.aslist())."""
+        return str(self.aslist())
+
+    def __repr__(self):
+        """Returns str(self.aslist())."""
+        return str(self.aslist())
+
+
+class IntSetTrie(_CSRTrie):
+    """SetTrie for sets of integers (which must fit in a C int), storing
+       the nodes in flat arrays (see _CSRTrie) instead of Node
+       objects: 13 bytes or less per node (4 for the label, 1 for
+       flag_last, up to 4 each for the child offset and the count)
+       instead of about 100.  Children are found by binary search in
+       their contiguous range of the labels array.  The public API is
+       the same as that of SetTrie.
+
+       The arrays are built in one pass over all the sets, so
+       IntSetTrie is meant for sets that are loaded once and searched
+       many times: add() and remove() are buffered (contains() and
+       len() take them into account), and the first search after them
+       rebuilds the arrays, which takes time proportional to the size
+       of the trie.
+
+       Usage:
+       ------
+       >>> from settrie.csr import IntSetTrie
+       >>> t = IntSetTrie([{1, 3}, {1, 2, 3}])
+       >>> t.add({3, 4, 5})
+       >>> t.supersets({1, 3})
+       [{1, 2, 3}, {1, 3}]
+    """
+
+    _codec = _Identity
+
+    # magic number and version of the files written by save()
+    _FILEMAGIC = b'SETTRIEI\x01'
+
+    def __init__(self, iterable=None):
+        """Initialize this set-trie.  If iterable is specified, set-trie is
+           populated from its items.
+        """
+        # sorted tuples of the sets added and removed since the arrays
+        # were built
+        self._added = set()
+        self._removed = set()
+        self._build(sorted(tuple(sorted(set(s))) for s in iterable)
+                    if iterable is not None else [])
+
+    @classmethod
+    def fromsorted(cls, iterable):
+        """Return a new IntSetTrie populated from iterable, which must yield
+           sorted sequences of ints in lexicographic order.  See
+           SetTrie.fromsorted().
+        """
+        t = cls()
+        t._build([tuple(key) for key in iterable])
+        return t
+
+    def _build(self, keys):
+        """Build the arrays from keys, a list of sorted tuples of ints in
+           lexicographic order (repetitions allowed).  In level order,
+           the nodes of each depth are the distinct prefixes of that
+           length of the keys, in the same (sorted) order, so they are
+           created by going through the keys once for each depth.
+           Raises ValueError if keys are not in sorted order, or if the
+           elements of a key are not strictly increasing.
+        """
+        labels = array('i', [0])
+        flags = array('B', [0])
+        # parent and number of children of each node
+        parents = [0]
+        nchildren = [0]
+        # indices of the keys longer than the current depth
+        level = []
+        prev = ()
+        for k, key in enumerate(keys):
+            if key < prev:
+                raise ValueError('input is not in sorted order')
+            # the elements of the key must be strictly increasing
+            for i in range(1, len(key)):
+                if not key[i] > key[i - 1]:
+                    raise ValueError('input is not in sorted order')
+            prev = key
+            if key:
+                level.append(k)
+            else:
+                flags[0] = 1
+        # node of the prefix of each key up to the current depth
+        nodes = [0] * len(keys)
+        depth = 0
+        # see SetTrie._bulkadd()
+        gcenabled = gc.isenabled()
+        gc.disable()
+        try:
+            while level:
+                nexts = []
+                lastparent = lastdata = node = None
+                for k in level:
+                    key = keys[k]
+                    parent = nodes[k]
+                    data = key[depth]
+                    if data != lastdata or parent != lastparent:  # new
+                        node = len(labels)
+                        labels.append(data)
+                        flags.append(0)
+                        parents.append(parent)
+                        nchildren.append(0)
+                        nchildren[parent] += 1
+                        lastparent = parent
+                        lastdata = data
+                    if len(key) == depth + 1:
+                        flags[node] = 1
+                    else:
+                        nodes[k] = node
+                        nexts.append(k)
+                level = nexts
+                depth += 1
+        finally:
+            if gcenabled:
+                gc.enable()
+        counts = list(flags)
+        for node in range(len(labels) - 1, 0, -1):
+            counts[parents[node]] += counts[node]
+        self._labels = labels
+        self._first = SetTrie._array(list(accumulate([1] + nchildren)))
+        self._flags = flags
+        self._counts = SetTrie._array(counts)
+        self._added.clear()
+        self._removed.clear()
+
+    def _update(self):
+        """Rebuild the arrays if sets were added or removed since they were
+           built.  Called by the searches.
+        """
+        if self._added or self._removed:
+            path = []
+            keys = [tuple(path) for _ in self._iter(0, path)]
+            if self._removed:
+                keys = [key for key in keys if key not in self._removed]
+            # both runs are sorted already (see SetTrie.iter())
+            keys += sorted(self._added)
+            keys.sort()
+            self._build(keys)
+
+    def add(self, aset):
+        """Add set aset to the container.  aset must be an iterable of ints
+           (TypeError or OverflowError is raised otherwise).
+        """
+        key = tuple(sorted(aset))
+        array('i', key)  # check the elements now, not when rebuilding
+        if key in self._removed:
+            self._removed.remove(key)
+        elif self._contains(key) < 0:
+            self._added.add(key)
+
+    def remove(self, aset):
+        """Remove set aset from this set-trie.  Raises KeyError if aset is
+           not stored.
+        """
+        key = tuple(sorted(aset))
+        if key in self._added:
+            self._added.remove(key)
+        elif key not in self._removed and self._contains(key) >= 0:
+            self._removed.add(key)
+        else:
+            raise KeyError(aset)
+
+    def discard(self, aset):
+        """Remove set aset from this set-trie if it is stored."""
+        try:
+            self.remove(aset)
+        except KeyError:
+            pass
+
+    def contains(self, aset):
+        """Returns True iff this set-trie contains set aset."""
+        key = tuple(sorted(aset))
+        if key in self._added:
+            return True
+        return key not in self._removed and self._contains(key) >= 0
+
+    def __contains__(self, aset):
+        """Returns True iff this set-trie contains set aset."""
+        return self.contains(aset)
+
+    def __len__(self):
+        """Returns the number of sets stored in this set-trie."""
+        return self._counts[0] + len(self._added) - len(self._removed)
+
+    def hassuperset(self, aset):
+        """Returns True iff there is at least one set in this set-trie that is
+           the superset of set aset.
+        """
+        self._update()
+        return self._hassuperset(aset)
+
+    def itersupersets(self, aset, limit=None):
+        """Return an iterator over all sets in this set-trie that are (proper
+           or not proper) supersets of set aset.  Parameter limit: see
+           SetTrie.itersupersets().
+        """
+        self._update()
+        path = []
+        setarr = self._codec.lookup(aset)
+        return SetTrie._limit((set(path) for _ in
+                               self._itersupersets(setarr, path)), limit)
+
+    def supersets(self, aset, limit=None):
+        """Return a list containing all sets in this set-trie that are
+           supersets of set aset (see itersupersets()).
+        """
+        return list(self.itersupersets(aset, limit))
+
+    def countsupersets(self, aset):
+        """Return the number of sets in this set-trie that are (proper or
+           not proper) supersets of set aset, without enumerating them.
+        """
+        self._update()
+        return self._countsupersets(aset)
+
+    def batchhassuperset(self, probes):
+        """Return a list of booleans telling for each set in probes whether
+           there is at least one set in this set-trie that is its
+           superset (see hassuperset()).
+        """
+        self._update()
+        return [self._hassuperset(aset) for aset in probes]
+
+    def batchsupersets(self, probes):
+        """Return a list containing, for each set in probes, the list of
+           sets in this set-trie that are its supersets (see
+           supersets()).
+        """
+        return [self.supersets(aset) for aset in probes]
+
+    def hassubset(self, aset):
+        """Return True iff there is at least one set in this set-trie that is
+           the (proper or not proper) subset of set aset.
+        """
+        self._update()
+        return self._hassubset(aset)
+
+    def itersubsets(self, aset, limit=None):
+        """Return an iterator over all sets in this set-trie that are (proper
+           or not proper) subsets of set aset.  Parameter limit: see
+           SetTrie.itersupersets().
+        """
+        self._update()
+        path = []
+        setarr = self._codec.lookupknown(aset)
+        return SetTrie._limit((set(path) for _ in
+                               self._itersubsets(setarr, path)), limit)
+
+    def subsets(self, aset, limit=None):
+        """Return a list of sets in this set-trie that are (proper or not
+           proper) subsets of set aset (see itersubsets()).
+        """
+        return list(self.itersubsets(aset, limit))
+
+    def countsubsets(self, aset):
+        """Return the number of sets in this set-trie that are (proper or
+           not proper) subsets of set aset, without creating them.
+        """
+        self._update()
+        return self._countsubsets(aset)
+
+    def iter(self, limit=None):
+        """Returns an iterator over the sets stored in this set-trie (with
+           pre-order tree traversal).  The sets are returned in sorted
+           order.  If limit is not None, only the first limit sets are
+           returned.
+        """
+        return SetTrie._limit(self.__iter__(), limit)
+
+    def __iter__(self):
+        """Returns an iterator over the sets stored in this set-trie (see
+           iter()).
+        """
+        self._update()
+        path = []
+        return (set(path) for _ in self._iter(0, path))
+
+    def aslist(self):
+        """Return a list containing all the sets stored in this set-trie."""
+        return list(self)
+
+    def printtree(self, tabchr=' ', tabsize=2, stream=sys.stdout):
+        """Print a mirrored 90-degree rotation of the nodes in this trie to
+           stream.  See SetTrie.printtree().
+        """
+        self._update()
+        labels = self._labels
+        first = self._first
+        flags = self._flags
+        stack = [(0, 0)]
+        while stack:
+            node, level = stack.pop()
+            data = labels[node] if node else None
+            print(str(data).rjust(len(repr(data)) + level * tabsize,
+                                  tabchr) +
+                  ('#' if flags[node] else ''),
+                  file=stream)
+            for child in range(first[node + 1] - 1, first[node] - 1, -1):
+                stack.append((child, level + 1))
+
+    def save(self, path):
+        """Save this set-trie to file path.  The arrays are written as they
+           are, so load() takes about as long as reading the file.
+        """
+        self._update()
+        arrays = (self._labels, self._first, self._flags, self._counts)
+        header = {'byteorder': sys.byteorder,
+                  'arrays': [(a.typecode, len(a)) for a in arrays]}
+        with open(path, 'wb') as stream:
+            stream.write(self._FILEMAGIC)
+            pickle.dump(header, stream, pickle.HIGHEST_PROTOCOL)
+            for a in arrays:
+                a.tofile(stream)
+
+    @classmethod
+    def load(cls, path):
+        """Return a new IntSetTrie read from file path, written by save().
+           Raises ValueError if the file was not written by
+           IntSetTrie.save().
+        """
+        t = cls()
+        with open(path, 'rb') as stream:
+            if stream.read(len(cls._FILEMAGIC)) != cls._FILEMAGIC:
+                raise ValueError('not an IntSetTrie file')
+            header = pickle.load(stream)
+            arrays = []
+            for typecode, size in header['arrays']:
+                a = array(typecode)
+                a.fromfile(stream, size)
+                if header['byteorder'] != sys.byteorder:
+                    a.byteswap()
+                arrays.append(a)
+        t._labels, t._first, t._flags, t._counts = arrays
+        return t
@@ -0,0 +1,597 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Module settrie.frozen
+
+Read-only set-tries stored in flat arrays in a file that is
+memory-mapped, so that processes using the same file (e.g. pre-forked
+workers) share one physical copy of it, and opening it does not
+deserialize the trie.
+
+See README.md for more information.
+
+Licensed under the GNU LESSER GENERAL PUBLIC LICENSE, Version 3.
+See https://www.gnu.org/licenses/lgpl.html
+"""
+
+import mmap
+import multiprocessing
+import os
+import pickle
+import sys
+
+from settrie import Interner, SetTrie
+from settrie.csr import _CSRTrie
+
+
+class _FrozenBase(_CSRTrie):
+    """File handling shared by FrozenSetTrie and FrozenSetTrieMap.
+
+       The file holds the arrays of the CSR layout (see _CSRTrie),
+       which are used through memoryviews of the memory-mapped file.
+       The labels are the ranks of the set elements in the sorted list
+       of the distinct labels of the frozen container.  Maps also have
+
+       offsets: the values of node v are pickled in
+                blob[offsets[v]:offsets[v + 1]]
+
+       The set elements of the ranks (the only part of the file that
+       is unpickled when it is opened) are kept in an Interner, which
+       is used to encode the queries and decode the results.
+    """
+
+    # magic number and version of the files written by freeze()
+    _FILEMAGIC = b'SETTRIEF\x01'
+
+    # True if the containers of the class have values
+    _withvalues = False
+
+    def __init__(self, path):
+        """Open the frozen set-trie written to file path by freeze().
+           Raises ValueError if the file is not of the right kind or
+           was written on a machine with a different byte order.
+        """
+        with open(path, 'rb') as stream:
+            self._mmap = mmap.mmap(stream.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            stat = os.fstat(stream.fileno())
+        # absolute path and identity of the file, reopened and checked
+        # by the worker processes of the parallel searches (see
+        # _parallel()), which may run in another working directory
+        self._path = os.path.abspath(path)
+        self._ident = (stat.st_dev, stat.st_ino, stat.st_size,
+                       stat.st_mtime_ns)
+        mm = self._mmap
+        start = len(self._FILEMAGIC)
+        if mm[:start] != self._FILEMAGIC:
+            mm.close()
+            raise ValueError('not a frozen settrie file')
+        header = pickle.loads(mm[int.from_bytes(mm[start:start + 8],
+                                                'little'):])
+        if header['kind'] != self.__class__.__name__ or \
+           header['byteorder'] != sys.byteorder:
+            mm.close()
+            raise ValueError('file holds a {} ({} endian), not a {}'.format(
+                header['kind'], header['byteorder'],
+                self.__class__.__name__))
+        self._views = {}
+        buf = memoryview(mm)
+        for name, typecode, offset, size in header['arrays']:
+            view = buf[offset:offset + size]
+            self._views[name] = view.cast(typecode) if typecode else view
+        self._labels = self._views['labels']
+        self._first = self._views['first']
+        self._flags = self._views['flags']
+        self._counts = self._views['counts']
+        self.interner = Interner(header['elements'])
+        self._codec = self.interner
+
+    @classmethod
+    def freeze(cls, container, path):
+        """Write container (a SetTrie for FrozenSetTrie, a SetTrieMap or
+           SetTrieMultiMap for FrozenSetTrieMap) to file path, and
+           return it opened as an instance of this class.
+        """
+        if cls._withvalues and not hasattr(container.root, 'value'):
+            raise TypeError('{} needs a container with values'.format(
+                cls.__name__))
+        cls._write(container, path, cls.__name__, cls._withvalues)
+        return cls(path)
+
+    @staticmethod
+    def _write(container, path, kind, withvalues):
+        """Used by freeze(): write the arrays (see _FrozenBase), each
+           aligned to 8 bytes and with the smallest item type that fits
+           them, after the magic number and the offset of the pickled
+           header, which is written last.
+        """
+        nodes = [container.root]
+        for node in nodes:  # grows while iterated: level order
+            nodes.extend(node.children)
+        table = sorted(set(node.data for node in nodes[1:]))
+        rank = {data: r for r, data in enumerate(table)}
+        first = [1]
+        for node in nodes:
+            first.append(first[-1] + len(node.children))
+        arrays = [
+            ('labels', [0] + [rank[node.data] for node in nodes[1:]]),
+            ('first', first),
+            ('flags', [node.flag_last for node in nodes]),
+            ('counts', [node.count for node in nodes])]
+        if withvalues:
+            blob = bytearray()
+            offsets = [0]
+            for node in nodes:
+                if node.flag_last:
+                    blob += pickle.dumps(node.value, pickle.HIGHEST_PROTOCOL)
+                offsets.append(len(blob))
+            arrays.append(('offsets', offsets))
+        with open(path, 'wb') as stream:
+            stream.write(_FrozenBase._FILEMAGIC + bytes(8))
+            entries = []
+            for name, ints in arrays:
+                a = SetTrie._array(ints)
+                stream.write(bytes(-stream.tell() % 8))
+                entries.append((name, a.typecode, stream.tell(),
+                                len(a) * a.itemsize))
+                a.tofile(stream)
+            if withvalues:
+                entries.append(('blob', None, stream.tell(), len(blob)))
+                stream.write(blob)
+            element = container._codec.element
+            header = {'kind': kind,
+                      'byteorder': sys.byteorder,
+                      'arrays': entries,
+                      'elements': [element(data) for data in table]}
+            hoffset = stream.tell()
+            pickle.dump(header, stream, pickle.HIGHEST_PROTOCOL)
+            stream.seek(len(_FrozenBase._FILEMAGIC))
+            stream.write(hoffset.to_bytes(8, 'little'))
+
+    def _parallel(self, executor, kind, setarr, mode):
+        """Used by the iterator methods given an executor: yield the same
+           results, in the same order, as the search kind
+           ('supersets', 'subsets' or 'iter', for which setarr is
+           empty) for the sorted list of labels setarr, but search the
+           subtrees of the trie in the processes of executor (a
+           concurrent.futures.ProcessPoolExecutor), which open the
+           file of this container once each (see _runtasks()), and
+           merge their results.
+        """
+        futures = [executor.submit(_runtasks, self.__class__, self._path,
+                                   self._ident, kind, setarr, mode, entry)
+                   if type(entry) is list else entry
+                   for entry in self._plan(kind, setarr)]
+        try:
+            for entry in futures:
+                if type(entry) is tuple:
+                    node, path = entry
+                    yield from self._output((node,), list(path), mode)
+                else:
+                    yield from entry.result()
+        finally:  # e.g. the caller stopped after limit results
+            for entry in futures:
+                if type(entry) is not tuple:
+                    entry.cancel()
+
+    # number of tasks per CPU that the parallel searches aim at
+    _TASKSPERCPU = 4
+
+    def _plan(self, kind, setarr):
+        """Used by _parallel(): return the list of the units of work of
+           the search kind for setarr, in the order of their results:
+           (node, labels of the path to node) tuples for the nodes
+           yielded by the search itself, and lists of
+           (node, index in setarr, labels of the path to node) tasks
+           for the subtrees searched in the worker processes.  The
+           subtrees holding more than a share of all the sets are
+           split, and consecutive small subtrees grouped, so that
+           each list holds about that share.
+        """
+        labels = self._labels
+        first = self._first
+        flags = self._flags
+        counts = self._counts
+        last = len(setarr)
+        # os.cpu_count() needs Python 3.4
+        try:
+            cpus = multiprocessing.cpu_count()
+        except NotImplementedError:
+            cpus = 1
+        share = max(counts[0] // (cpus * self._TASKSPERCPU), 1)
+
+        def children(node, idx):
+            # (child, index of next element) pairs entered by the search
+            if kind == 'subsets':
+                return self._subsetchildren(node, setarr, idx)
+            pairs = []
+            for child in range(first[node], first[node + 1]):
+                if idx < last:
+                    data = labels[child]
+                    if data > setarr[idx]:
+                        break
+                    pairs.append((child, idx + 1 if data == setarr[idx]
+                                  else idx))
+                else:
+                    pairs.append((child, idx))
+            return pairs
+
+        plan = []
+        if flags[0] and (kind == 'subsets' or last == 0):
+            plan.append((0, ()))
+        tasks = []
+        size = 0
+        path = []
+        stack = [iter(children(0, 0))]
+        while stack:
+            for child, idx in stack[-1]:
+                prefix = tuple(path) + (labels[child],)
+                if counts[child] > share and first[child] < first[child + 1]:
+                    # split: search this node here and its children apart
+                    if tasks:
+                        plan.append(tasks)
+                        tasks = []
+                        size = 0
+                    if flags[child] and (kind == 'subsets' or idx == last):
+                        plan.append((child, prefix))
+                    path.append(labels[child])
+                    stack.append(iter(children(child, idx)))
+                    break
+                tasks.append((child, idx, prefix))
+                size += counts[child]
+                if size >= share:
+                    plan.append(tasks)
+                    tasks = []
+                    size = 0
+            else:  # no more children
+                stack.pop()
+                if stack:
+                    path.pop()
+        if tasks:
+            plan.append(tasks)
+        return plan
+
+    def _runtasks(self, kind, setarr, mode, tasks):
+        """Return the list of the results of the search kind for setarr in
+           the subtrees of tasks (see _plan()).
+        """
+        results = []
+        for node, idx, prefix in tasks:
+            path = list(prefix)
+            if kind == 'supersets':
+                nodes = self._itersupersets(setarr, path, node, idx)
+            elif kind == 'subsets':
+                nodes = self._itersubsets(setarr, path, node, idx)
+            else:
+                nodes = self._iter(node, path)
+            results.extend(self._output(nodes, path, mode))
+        return results
+
+    def close(self):
+        """Close the memory-mapped file.  The container cannot be used
+           after this.
+        """
+        for view in self._views.values():
+            view.release()
+        self._views.clear()
+        self._labels = self._first = self._flags = self._counts = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# containers opened by _runtasks() in this process, by file path
+_opened = {}
+
+
+def _runtasks(cls, path, ident, kind, setarr, mode, tasks):
+    """Run in the worker processes of the parallel searches: return the
+       results of tasks (see _FrozenBase._runtasks()) in the container
+       of class cls in file path, which is opened on the first call
+       (and reopened if the file was replaced since).
+    """
+    t = _opened.get(path)
+    if t is None or t._ident != ident or t.__class__ is not cls:
+        if t is not None:
+            t.close()
+        t = _opened[path] = cls(path)
+    return t._runtasks(kind, setarr, mode, tasks)
+
+
+class FrozenSetTrie(_FrozenBase):
+    """Read-only SetTrie in a memory-mapped file.  Searches read the
+       flat arrays of the file directly: opening the file only
+       unpickles the list of the distinct set elements, and processes
+       opening the same file share its pages.  The sets are returned
+       in the same order as by the SetTrie it was made of.
+
+       Usage:
+       ------
+       >>> from settrie import SetTrie
+       >>> from settrie.frozen import FrozenSetTrie
+       >>> FrozenSetTrie.freeze(SetTrie([{1, 3}, {1, 2, 3}]), 'sets.bin')
+       [{1, 2, 3}, {1, 3}]
+       >>> t = FrozenSetTrie('sets.bin')  # e.g. in another process
+       >>> t.supersets({3})
+       [{1, 2, 3}, {1, 3}]
+    """
+
+    def contains(self, aset):
+        """Returns True iff this set-trie contains set aset."""
+        return self._contains(aset) >= 0
+
+    def __contains__(self, aset):
+        """Returns True iff this set-trie contains set aset."""
+        return self._contains(aset) >= 0
+
+    def hassuperset(self, aset):
+        """Returns True iff there is at least one set in this set-trie that is
+           the superset of set aset.
+        """
+        return self._hassuperset(aset)
+
+    def itersupersets(self, aset, limit=None, executor=None):
+        """Return an iterator over all sets in this set-trie that are (proper
+           or not proper) supersets of set aset.  Parameter limit: see
+           SetTrie.itersupersets().  If executor (a
+           concurrent.futures.ProcessPoolExecutor) is given, the
+           subtrees are searched in its processes, which is faster
+           for searches returning many sets; the sets are returned in
+           the same order.
+        """
+        setarr = self._codec.lookup(aset)
+        if executor is not None:
+            return SetTrie._limit(self._parallel(executor, 'supersets',
+                                                 setarr, None), limit)
+        path = []
+        return SetTrie._limit(self._output(
+            self._itersupersets(setarr, path), path, None), limit)
+
+    def supersets(self, aset, limit=None, executor=None):
+        """Return a list containing all sets in this set-trie that are
+           supersets of set aset (see itersupersets()).
+        """
+        return list(self.itersupersets(aset, limit, executor))
+
+    def countsupersets(self, aset):
+        """Return the number of sets in this set-trie that are (proper or
+           not proper) supersets of set aset, without enumerating them.
+        """
+        return self._countsupersets(aset)
+
+    def hassubset(self, aset):
+        """Return True iff there is at least one set in this set-trie that is
+           the (proper or not proper) subset of set aset.
+        """
+        return self._hassubset(aset)
+
+    def itersubsets(self, aset, limit=None, executor=None):
+        """Return an iterator over all sets in this set-trie that are (proper
+           or not proper) subsets of set aset.  Parameters limit and
+           executor: see itersupersets().
+        """
+        setarr = self._codec.lookupknown(aset)
+        if executor is not None:
+            return SetTrie._limit(self._parallel(executor, 'subsets',
+                                                 setarr, None), limit)
+        path = []
+        return SetTrie._limit(self._output(
+            self._itersubsets(setarr, path), path, None), limit)
+
+    def subsets(self, aset, limit=None, executor=None):
+        """Return a list of sets in this set-trie that are (proper or not
+           proper) subsets of set aset (see itersubsets()).
+        """
+        return list(self.itersubsets(aset, limit, executor))
+
+    def countsubsets(self, aset):
+        """Return the number of sets in this set-trie that are (proper or
+           not proper) subsets of set aset, without creating them.
+        """
+        return self._countsubsets(aset)
+
+    def iter(self, limit=None, executor=None):
+        """Returns an iterator over the sets stored in this set-trie (with
+           pre-order tree traversal).  If limit is not None, only the
+           first limit sets are returned.  Parameter executor: see
+           itersupersets().
+        """
+        if executor is not None:
+            return SetTrie._limit(self._parallel(executor, 'iter', [], None),
+                                  limit)
+        return SetTrie._limit(self.__iter__(), limit)
+
+    def __iter__(self):
+        """Returns an iterator over the sets stored in this set-trie."""
+        path = []
+        return self._output(self._iter(0, path), path, None)
+
+    def _output(self, nodes, path, mode):
+        """Used by the iterator methods: turn the nodes yielded by one
+           of the traversal methods into sets (mode is ignored).
+        """
+        decode = self._codec.decode
+        return (decode(path) for _ in nodes)
+
+    def aslist(self, executor=None):
+        """Return a list containing all the sets stored in this set-trie."""
+        return list(self.iter(executor=executor))
+
+
+class FrozenSetTrieMap(_FrozenBase):
+    """Read-only SetTrieMap in a memory-mapped file (see FrozenSetTrie).
+       The values are pickled in the file, and unpickled each time
+       they are returned.  A FrozenSetTrieMap made of a SetTrieMultiMap
+       has the lists of values of the keys as values.
+
+       Usage:
+       ------
+       >>> from settrie import SetTrieMap
+       >>> from settrie.frozen import FrozenSetTrieMap
+       >>> m = SetTrieMap([({1, 2}, 'A'), ({1, 2, 3}, 'B')])
+       >>> m = FrozenSetTrieMap.freeze(m, 'map.bin')
+       >>> m.get({1, 2})
+       'A'
+       >>> m.supersets({3})
+       [({1, 2, 3}, 'B')]
+    """
+
+    _withvalues = True
+
+    def __init__(self, path):
+        """Open the frozen SetTrieMap written to file path by freeze().
+           See FrozenSetTrie.
+        """
+        _FrozenBase.__init__(self, path)
+        self._offsets = self._views['offsets']
+        self._blob = self._views['blob']
+
+    def close(self):
+        """Close the memory-mapped file.  The container cannot be used
+           after this.
+        """
+        self._offsets = self._blob = None
+        _FrozenBase.close(self)
+
+    def _value(self, node):
+        """Return the unpickled value of node."""
+        return pickle.loads(self._blob[self._offsets[node]:
+                                       self._offsets[node + 1]])
+
+    def contains(self, keyset):
+        """Returns True iff this SetTrieMap contains set keyset as a key."""
+        return self._contains(keyset) >= 0
+
+    def __contains__(self, keyset):
+        """Returns True iff this SetTrieMap contains set keyset as a key."""
+        return self._contains(keyset) >= 0
+
+    def get(self, keyset, default=None):
+        """Return the value associated to keyset if keyset is in this
+           SetTrieMap, else default.
+        """
+        node = self._contains(keyset)
+        return default if node < 0 else self._value(node)
+
+    def hassuperset(self, aset):
+        """Returns True iff there is at least one key set in this SetTrieMap
+           that is the superset of set aset.
+        """
+        return self._hassuperset(aset)
+
+    def itersupersets(self, aset, mode=None, limit=None, executor=None):
+        """Return an iterator over all (keyset, value) pairs from this
+           SetTrieMap for which set keyset is a superset (proper or
+           not proper) of set aset.  Parameters mode and limit: see
+           SetTrieMap.itersupersets(); executor: see
+           FrozenSetTrie.itersupersets().
+        """
+        setarr = self._codec.lookup(aset)
+        if executor is not None:
+            return SetTrie._limit(self._parallel(executor, 'supersets',
+                                                 setarr, mode), limit)
+        path = []
+        return SetTrie._limit(self._output(
+            self._itersupersets(setarr, path), path, mode), limit)
+
+    def supersets(self, aset, mode=None, limit=None, executor=None):
+        """Return a list containing pairs of (keyset, value) for which keyset
+           is superset of set aset (see itersupersets()).
+        """
+        return list(self.itersupersets(aset, mode, limit, executor))
+
+    def countsupersets(self, aset):
+        """Return the number of keysets in this SetTrieMap that are (proper
+           or not proper) supersets of set aset, without enumerating
+           them.
+        """
+        return self._countsupersets(aset)
+
+    def hassubset(self, aset):
+        """Return True iff there is at least one set in this SetTrieMap that
+           is the (proper or not proper) subset of set aset.
+        """
+        return self._hassubset(aset)
+
+    def itersubsets(self, aset, mode=None, limit=None, executor=None):
+        """Return an iterator over pairs (keyset, value) from this SetTrieMap
+           for which keyset is (proper or not proper) subset of set aset.
+           Parameters mode and limit: see SetTrieMap.itersupersets();
+           executor: see FrozenSetTrie.itersupersets().
+        """
+        setarr = self._codec.lookupknown(aset)
+        if executor is not None:
+            return SetTrie._limit(self._parallel(executor, 'subsets',
+                                                 setarr, mode), limit)
+        path = []
+        return SetTrie._limit(self._output(
+            self._itersubsets(setarr, path), path, mode), limit)
+
+    def subsets(self, aset, mode=None, limit=None, executor=None):
+        """Return a list of (keyset, value) pairs from this SetTrieMap for
+           which keyset is (proper or not proper) subset of set aset
+           (see itersubsets()).
+        """
+        return list(self.itersubsets(aset, mode, limit, executor))
+
+    def countsubsets(self, aset):
+        """Return the number of keysets in this SetTrieMap that are (proper
+           or not proper) subsets of set aset, without creating them.
+        """
+        return self._countsubsets(aset)
+
+    def iter(self, mode=None, limit=None, executor=None):
+        """Returns an iterator to all (keyset, value) pairs stored in this
+           SetTrieMap (using pre-order tree traversal).  Parameters
+           mode and limit: see SetTrieMap.iter(); executor: see
+           FrozenSetTrie.itersupersets().
+        """
+        if executor is not None:
+            return SetTrie._limit(self._parallel(executor, 'iter', [], mode),
+                                  limit)
+        path = []
+        return SetTrie._limit(self._output(self._iter(0, path), path, mode),
+                              limit)
+
+    def keys(self):
+        """Alias for self.iter(mode='keys')."""
+        return self.iter(mode='keys')
+
+    def values(self):
+        """Alias for self.iter(mode='values')."""
+        return self.iter(mode='values')
+
+    def items(self):
+        """Alias for self.iter(mode=None)."""
+        return self.iter(mode=None)
+
+    def __iter__(self):
+        """Same as self.iter(mode='keys')."""
+        return self.keys()
+
+    def _output(self, nodes, path, mode):
+        """Used by the iterator methods: turn the nodes yielded by one
+           of the traversal methods into the items selected by mode
+           (see SetTrieMap.itersupersets()).  Values are only
+           unpickled if they are returned.
+        """
+        decode = self._codec.decode
+        if mode == 'keys':
+            for _ in nodes:
+                yield decode(path)
+        elif mode == 'values':
+            for node in nodes:
+                yield self._value(node)
+        else:
+            for node in nodes:
+                yield (decode(path), self._value(node))
+
+    def aslist(self, executor=None):
+        """Return a list containing all the (keyset, value) pairs stored in
+           this SetTrieMap.
+        """
+        return list(self.iter(executor=executor))
@@ -0,0 +1,838 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Module settrie.radix
+
+Path-compressed (radix / Patricia) set-tries, in which each chain of
+single-child nodes is stored as one node.
+
+See README.md for more information.
+
+Licensed under the GNU LESSER GENERAL PUBLIC LICENSE, Version 3.
+See https://www.gnu.org/licenses/lgpl.html
+"""
+
+import sys
+from bisect import bisect_left
+
+from settrie import Interner, SetTrie, SetTrieMap, _Identity
+
+
+class _RadixTrie:
+    """Trie handling and searches shared by RadixSetTrie and
+       RadixSetTrieMap.
+
+       Each node stands for a chain of nodes of a SetTrie (see
+       SetTrie.Node) in which every node but the last has a single
+       child and no set ending at it: the node is labeled by the
+       tuple of the labels of the chain, its edge.  So every node but
+       the root (which has the empty edge) has a set ending at it or
+       several children, and a set whose elements after a shared
+       prefix are its own takes a single node for all of them.
+       Adding a set splits the edge where the set leaves it, and
+       removing a set merges a node left with a single child and no
+       set ending at it into the child.
+
+       The searches are those of SetTrie, with the elements of the
+       probe looked up in each edge (see _advance() and _within()).
+       While a node is yielded, path holds the labels of the edges
+       leading to it.
+    """
+
+    class Node:
+        """Node object used by the path-compressed tries."""
+
+        __slots__ = ('edge', 'flag_last', 'keys', 'children', 'count',
+                     'value')
+
+        def __init__(self, edge=()):
+            # the labels of the chain of nodes that this node stands for
+            self.edge = edge
+            # True if a set ends at this node
+            self.flag_last = False
+            # the first labels of the edges of the children (sorted)
+            # and the children in the same order: lists, or () for the
+            # nodes without children
+            self.keys = ()
+            self.children = ()
+            # number of sets ending in the subtree of this node
+            self.count = 0
+            # the value associated to the key set ending at this node
+            # (maps only)
+            self.value = None
+
+    def __len__(self):
+        """Returns the number of sets stored in this container."""
+        return self.root.count
+
+    def _add(self, setarr):
+        """Return the node where the sorted list of labels setarr ends,
+           adding the set first if it is not in the trie: the edge
+           where the set leaves the trie is split, and the rest of the
+           set becomes the edge of a new leaf.
+        """
+        node = self.root
+        path = [node]
+        last = len(setarr)
+        i = 0
+        while i < last:
+            data = setarr[i]
+            keys = node.keys
+            c = bisect_left(keys, data)
+            if c == len(keys) or keys[c] != data:  # leave the trie here
+                child = _RadixTrie.Node(tuple(setarr[i:]))
+                if keys:
+                    keys.insert(c, data)
+                    node.children.insert(c, child)
+                else:
+                    node.keys = [data]
+                    node.children = [child]
+                path.append(child)
+                node = child
+                break
+            child = node.children[c]
+            edge = child.edge
+            j = 1
+            n = min(len(edge), last - i)
+            while j < n and edge[j] == setarr[i + j]:
+                j += 1
+            if j < len(edge):  # the set leaves or ends inside the edge
+                top = _RadixTrie.Node(edge[:j])
+                child.edge = edge[j:]
+                top.keys = [child.edge[0]]
+                top.children = [child]
+                top.count = child.count
+                node.children[c] = top
+                child = top
+            path.append(child)
+            node = child
+            i += j
+        if not node.flag_last:
+            node.flag_last = True
+            for node in path:
+                node.count += 1
+        return path[-1]
+
+    def _find(self, setarr):
+        """Return the node where the sorted list of labels setarr ends, or
+           None if it ends inside an edge or leaves the trie.
+        """
+        node = self.root
+        last = len(setarr)
+        i = 0
+        while i < last:
+            keys = node.keys
+            c = bisect_left(keys, setarr[i])
+            if c == len(keys) or keys[c] != setarr[i]:
+                return None
+            node = node.children[c]
+            edge = node.edge
+            if tuple(setarr[i:i + len(edge)]) != edge:
+                return None
+            i += len(edge)
+        return node
+
+    def _remove(self, setarr):
+        """Unmark the node where the sorted list of labels setarr ends,
+           remove it if it has no children, and merge the node that is
+           left with a single child and no set into the child.  Return
+           the unmarked node (whose value is still set), or None if
+           setarr is not in the trie.
+        """
+        node = self.root
+        path = [node]
+        indexes = []
+        last = len(setarr)
+        i = 0
+        while i < last:
+            keys = node.keys
+            c = bisect_left(keys, setarr[i])
+            if c == len(keys) or keys[c] != setarr[i]:
+                return None
+            node = node.children[c]
+            edge = node.edge
+            if tuple(setarr[i:i + len(edge)]) != edge:
+                return None
+            path.append(node)
+            indexes.append(c)
+            i += len(edge)
+        if not node.flag_last:
+            return None
+        node.flag_last = False
+        for other in path:
+            other.count -= 1
+        if len(path) > 1:
+            parent = path[-2]
+            if not node.children:
+                c = indexes[-1]
+                del parent.keys[c]
+                del parent.children[c]
+                if not parent.children:
+                    parent.keys = parent.children = ()
+                elif len(parent.children) == 1 and len(path) > 2 and \
+                        not parent.flag_last:
+                    _RadixTrie._merge(path[-3], indexes[-2])
+            elif len(node.children) == 1:
+                _RadixTrie._merge(parent, indexes[-1])
+        return node
+
+    @staticmethod
+    def _merge(parent, c):
+        """Replace the c-th child of parent, which has a single child and
+           no set ending at it, by that child, prefixing its edge.
+        """
+        node = parent.children[c]
+        child = node.children[0]
+        child.edge = node.edge + child.edge
+        parent.children[c] = child
+
+    @staticmethod
+    def _advance(edge, setarr, idx):
+        """Used by the superset searches: return the index of the next
+           element of the sorted list setarr to find after the labels of
+           edge, given that setarr[idx] is the next one before it, or
+           -1 if an element is skipped by the edge (so no set below it
+           has it).  The elements are looked up in the edge by
+           bisection, so long edges cost little.
+        """
+        last = len(setarr)
+        size = len(edge)
+        pos = 0
+        while idx < last:
+            data = setarr[idx]
+            pos = bisect_left(edge, data, pos)
+            if pos == size:  # the element may be below the edge
+                break
+            if edge[pos] != data:
+                return -1
+            pos += 1
+            idx += 1
+        return idx
+
+    @staticmethod
+    def _within(edge, setarr, idx):
+        """Used by the subset searches: return the index of the element
+           after the last label of edge in the sorted list setarr, if
+           all the labels of edge are in setarr[idx:], else -1.
+        """
+        last = len(setarr)
+        for data in edge:
+            idx = bisect_left(setarr, data, idx)
+            if idx == last or setarr[idx] != data:
+                return -1
+            idx += 1
+        return idx
+
+    def _hassuperset(self, aset):
+        """Return True iff a set in the trie is a superset of aset: depth
+           first search with an explicit stack of (node, index of next
+           element of setarr to find) pairs.
+        """
+        setarr = self._codec.lookup(aset)
+        last = len(setarr)
+        if last == 0:
+            return self.root.count > 0
+        advance = _RadixTrie._advance
+        stack = [(self.root, 0)]
+        while stack:
+            node, idx = stack.pop()
+            data = setarr[idx]
+            for child in node.children:
+                edge = child.edge
+                # don't go to subtrees where current element cannot be
+                if edge[0] > data:
+                    break
+                nidx = advance(edge, setarr, idx)
+                if nidx == last:  # every leaf has a set
+                    return True
+                if nidx >= 0 and child.children:
+                    stack.append((child, nidx))
+        return False
+
+    def _itersupersets(self, setarr, path):
+        """Yield each node marked flag_last whose set is a superset of the
+           sorted list setarr, in pre-order, with an explicit stack of
+           (iterator over children, index of next element of setarr to
+           find, length of the edge of their parent) triples.
+        """
+        last = len(setarr)
+        node = self.root
+        if node.flag_last and last == 0:
+            yield node
+        top = setarr[-1] if setarr else None
+        advance = _RadixTrie._advance
+        stack = [(iter(node.children), 0, 0)]
+        while stack:
+            children, idx, size = stack[-1]
+            for child in children:
+                edge = child.edge
+                if idx < last:  # we still have elements of aset to find
+                    if edge[0] > setarr[idx]:  # nor in the next children
+                        stack.pop()
+                        if size:
+                            del path[-size:]
+                        break
+                    if not child.children:
+                        # a leaf without the largest element is not a
+                        # superset; look up a last element inline
+                        if edge[-1] < top:
+                            continue
+                        if idx == last - 1:
+                            if edge[bisect_left(edge, top)] != top:
+                                continue
+                            nidx = last
+                        else:
+                            nidx = advance(edge, setarr, idx)
+                            if nidx < last:
+                                continue
+                    else:
+                        nidx = advance(edge, setarr, idx)
+                        if nidx < 0:
+                            continue
+                else:  # just traverse this subtree to get all supersets
+                    nidx = idx
+                path.extend(edge)
+                if child.flag_last and nidx == last:
+                    yield child
+                if child.children:
+                    stack.append((iter(child.children), nidx, len(edge)))
+                    break
+                del path[-len(edge):]
+            else:  # no more children
+                stack.pop()
+                if size:
+                    del path[-size:]
+
+    def _countsupersets(self, aset):
+        """Return the number of sets in the trie that are supersets of
+           aset: search like _hassuperset(), adding up the counts of
+           the nodes where the last element is found.
+        """
+        setarr = self._codec.lookup(aset)
+        last = len(setarr)
+        if last == 0:
+            return self.root.count
+        advance = _RadixTrie._advance
+        total = 0
+        stack = [(self.root, 0)]
+        while stack:
+            node, idx = stack.pop()
+            data = setarr[idx]
+            for child in node.children:
+                edge = child.edge
+                if edge[0] > data:
+                    break
+                nidx = advance(edge, setarr, idx)
+                if nidx == last:
+                    total += child.count
+                elif nidx >= 0 and child.children:
+                    stack.append((child, nidx))
+        return total
+
+    @staticmethod
+    def _subsetchildren(node, setarr, idx):
+        """Used by the subset searches: return the list of (child, index
+           of the element after its edge in setarr) pairs of the
+           children of node whose edges are made of elements of the
+           sorted list setarr[idx:], in sorted order.  The first labels
+           of the edges are joined with setarr like in
+           SetTrie._subsetchildren(), and the rest of the edges are
+           looked up in setarr.
+        """
+        keys = node.keys
+        children = node.children
+        last = len(setarr)
+        nkeys = len(keys)
+        within = _RadixTrie._within
+        matches = []
+        if nkeys <= last - idx:
+            jdx = idx
+            for c in range(nkeys):
+                data = keys[c]
+                jdx = bisect_left(setarr, data, jdx)
+                if jdx == last:
+                    break
+                if setarr[jdx] == data:
+                    child = children[c]
+                    nidx = within(child.edge[1:], setarr, jdx + 1)
+                    if nidx >= 0:
+                        matches.append((child, nidx))
+        else:
+            c = 0
+            for jdx in range(idx, last):
+                data = setarr[jdx]
+                c = bisect_left(keys, data, c)
+                if c == nkeys:
+                    break
+                if keys[c] == data:
+                    child = children[c]
+                    nidx = within(child.edge[1:], setarr, jdx + 1)
+                    if nidx >= 0:
+                        matches.append((child, nidx))
+        return matches
+
+    def _hassubset(self, aset):
+        """Return True iff a set in the trie is a subset of aset."""
+        setarr = self._codec.lookupknown(aset)
+        last = len(setarr)
+        stack = [(self.root, 0)]
+        while stack:
+            node, idx = stack.pop()
+            if node.flag_last:
+                return True
+            if idx < last:
+                stack.extend(_RadixTrie._subsetchildren(node, setarr, idx))
+        return False
+
+    def _itersubsets(self, setarr, path):
+        """Yield each node marked flag_last whose set is a subset of the
+           sorted list setarr, in pre-order, with an explicit stack of
+           (iterator over the matching children, length of the edge of
+           their parent) pairs.
+        """
+        last = len(setarr)
+        node = self.root
+        if node.flag_last:
+            yield node
+        stack = [(iter(_RadixTrie._subsetchildren(node, setarr, 0)), 0)]
+        while stack:
+            matches, size = stack[-1]
+            for child, idx in matches:
+                edge = child.edge
+                path.extend(edge)
+                if child.flag_last:
+                    yield child
+                if child.children and idx < last:
+                    stack.append((iter(_RadixTrie._subsetchildren(
+                        child, setarr, idx)), len(edge)))
+                    break
+                del path[-len(edge):]
+            else:  # no more children
+                stack.pop()
+                if size:
+                    del path[-size:]
+
+    def _countsubsets(self, aset):
+        """Return the number of sets in the trie that are subsets of aset:
+           visit the nodes visited by _itersubsets() in any order.
+        """
+        setarr = self._codec.lookupknown(aset)
+        last = len(setarr)
+        total = 0
+        stack = [(self.root, 0)]
+        while stack:
+            node, idx = stack.pop()
+            if node.flag_last:
+                total += 1
+            if idx < last and node.children:
+                stack.extend(_RadixTrie._subsetchildren(node, setarr, idx))
+        return total
+
+    def _iter(self, path):
+        """Yield each node marked flag_last, in pre-order."""
+        node = self.root
+        if node.flag_last:
+            yield node
+        stack = [(iter(node.children), 0)]
+        while stack:
+            children, size = stack[-1]
+            for child in children:
+                edge = child.edge
+                path.extend(edge)
+                if child.flag_last:
+                    yield child
+                if child.children:
+                    stack.append((iter(child.children), len(edge)))
+                    break
+                del path[-len(edge):]
+            else:  # no more children
+                stack.pop()
+                if size:
+                    del path[-size:]
+
+    def _iternodes(self):
+        """Yield (node, level) pairs for all the nodes, in pre-order."""
+        stack = [(self.root, 0)]
+        while stack:
+            node, level = stack.pop()
+            yield node, level
+            for child in reversed(node.children):
+                stack.append((child, level + 1))
+
+    def stats(self):
+        """Return a dict describing the shape and memory use of this
+           container, computed in one pass over the nodes:
+
+           nodes: the number of nodes (including the root)
+           terminals: the number of nodes marked flag_last
+           labels: the number of labels of the edges, which is the
+                   number of nodes of the SetTrie holding the same sets
+                   (without its root)
+           fanouts: dict of the numbers of nodes by number of children
+           bytes: dict of the estimated sizes in bytes (sys.getsizeof)
+                  of the nodes, of their edges, of their keys and
+                  children lists ('children'), of the values (shallow)
+                  and their 'total', like SetTrie.stats()
+        """
+        getsizeof = sys.getsizeof
+        nodes = terminals = labels = 0
+        edgebytes = childbytes = valuebytes = 0
+        fanouts = {}
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            labels += len(node.edge)
+            if node.edge:
+                edgebytes += getsizeof(node.edge)
+            if node.flag_last:
+                terminals += 1
+                if self._withvalues:
+                    valuebytes += getsizeof(node.value)
+            fanout = len(node.children)
+            fanouts[fanout] = fanouts.get(fanout, 0) + 1
+            if fanout:
+                childbytes += getsizeof(node.keys) + getsizeof(node.children)
+                stack.extend(node.children)
+        sizes = {'nodes': nodes * getsizeof(self.root),
+                 'edges': edgebytes,
+                 'children': childbytes,
+                 'values': valuebytes}
+        sizes['total'] = sum(sizes.values())
+        return {'nodes': nodes,
+                'terminals': terminals,
+                'labels': labels,
+                'fanouts': dict(sorted(fanouts.items())),
+                'bytes': sizes}
+
+    def printtree(self, tabchr=' ', tabsize=2, stream=sys.stdout):
+        """Print a mirrored 90-degree rotation of the nodes in this trie to
+           stream (default: sys.stdout), see SetTrie.printtree().  The
+           labels of the edge of each node are printed on its line,
+           separated by spaces.
+        """
+        element = self._codec.element
+        for node, level in self._iternodes():
+            text = (' '.join(str(element(data)) for data in node.edge)
+                    if level else 'None')
+            print(text.rjust(len(text) + level * tabsize, tabchr) +
+                  ('#' if node.flag_last else '') +
+                  (': {}'.format(repr(node.value))
+                   if self._withvalues and node.flag_last else ''),
+                  file=stream)
+
+    def __str__(self):
+        """Returns str(self.aslist())."""
+        return str(self.aslist())
+
+    def __repr__(self):
+        """Returns str(self.aslist())."""
+        return str(self.aslist())
+
+
+class RadixSetTrie(_RadixTrie):
+    """SetTrie with path compression: each chain of single-child nodes is
+       stored as a single node (see _RadixTrie), which saves nodes and
+       pointer hops when the sets have long tails of elements that
+       they do not share with other sets.  Same API and order of the
+       sets as SetTrie, for its add, remove, contains, superset,
+       subset and iteration methods.
+
+       Usage:
+       ------
+       >>> from settrie.radix import RadixSetTrie
+       >>> t = RadixSetTrie([{1, 2, 3, 4}, {1, 5, 6, 7}])
+       >>> t.stats()['nodes']
+       4
+       >>> t.supersets({6})
+       [{1, 5, 6, 7}]
+    """
+
+    _withvalues = False
+
+    def __init__(self, iterable=None, intern=False):
+        """Initialize this set-trie, adding the sets of iterable if it is
+           specified.  Parameter intern: see SetTrie.__init__().
+        """
+        self.root = _RadixTrie.Node()
+        self.interner = Interner() if intern is True else intern or None
+        self._codec = self.interner or _Identity
+        if iterable is not None:
+            for aset in iterable:
+                self.add(aset)
+
+    def add(self, aset):
+        """Add set aset to the container.  aset must be a sortable and
+           iterable container type.
+        """
+        self._add(self._codec.encode(aset))
+
+    def remove(self, aset):
+        """Remove set aset from this set-trie.  Raises KeyError if aset is
+           not in it.
+        """
+        if self._remove(self._codec.lookup(aset)) is None:
+            raise KeyError(aset)
+
+    def discard(self, aset):
+        """Remove set aset from this set-trie if it is in it."""
+        self._remove(self._codec.lookup(aset))
+
+    def contains(self, aset):
+        """Returns True iff this set-trie contains set aset."""
+        node = self._find(self._codec.lookup(aset))
+        return node is not None and node.flag_last
+
+    def __contains__(self, aset):
+        """Returns True iff this set-trie contains set aset."""
+        return self.contains(aset)
+
+    def hassuperset(self, aset):
+        """Returns True iff there is at least one set in this set-trie that is
+           the superset of set aset.
+        """
+        return self._hassuperset(aset)
+
+    def itersupersets(self, aset, limit=None):
+        """Return an iterator over all sets in this set-trie that are (proper
+           or not proper) supersets of set aset.  Parameter limit: see
+           SetTrie.itersupersets().
+        """
+        path = []
+        decode = self._codec.decode
+        return SetTrie._limit((decode(path) for _ in self._itersupersets(
+            self._codec.lookup(aset), path)), limit)
+
+    def supersets(self, aset, limit=None):
+        """Return a list containing all sets in this set-trie that are
+           supersets of set aset (see itersupersets()).
+        """
+        return list(self.itersupersets(aset, limit))
+
+    def countsupersets(self, aset):
+        """Return the number of sets in this set-trie that are (proper or
+           not proper) supersets of set aset, without enumerating them.
+        """
+        return self._countsupersets(aset)
+
+    def hassubset(self, aset):
+        """Return True iff there is at least one set in this set-trie that is
+           the (proper or not proper) subset of set aset.
+        """
+        return self._hassubset(aset)
+
+    def itersubsets(self, aset, limit=None):
+        """Return an iterator over all sets in this set-trie that are (proper
+           or not proper) subsets of set aset.  Parameter limit: see
+           SetTrie.itersupersets().
+        """
+        path = []
+        decode = self._codec.decode
+        return SetTrie._limit((decode(path) for _ in self._itersubsets(
+            self._codec.lookupknown(aset), path)), limit)
+
+    def subsets(self, aset, limit=None):
+        """Return a list of sets in this set-trie that are (proper or not
+           proper) subsets of set aset (see itersubsets()).
+        """
+        return list(self.itersubsets(aset, limit))
+
+    def countsubsets(self, aset):
+        """Return the number of sets in this set-trie that are (proper or
+           not proper) subsets of set aset, without creating them.
+        """
+        return self._countsubsets(aset)
+
+    def iter(self, limit=None):
+        """Returns an iterator over the sets stored in this set-trie (with
+           pre-order tree traversal).  If limit is not None, only the
+           first limit sets are returned.
+        """
+        return SetTrie._limit(self.__iter__(), limit)
+
+    def __iter__(self):
+        """Returns an iterator over the sets stored in this set-trie."""
+        path = []
+        decode = self._codec.decode
+        return (decode(path) for _ in self._iter(path))
+
+    def aslist(self):
+        """Return a list containing all the sets stored in this set-trie."""
+        return list(self)
+
+
+class RadixSetTrieMap(_RadixTrie):
+    """SetTrieMap with path compression (see RadixSetTrie).  Same API and
+       order of the items as SetTrieMap, for its assign, get, pop,
+       remove, contains, superset, subset and iteration methods.
+
+       Usage:
+       ------
+       >>> from settrie.radix import RadixSetTrieMap
+       >>> m = RadixSetTrieMap([({1, 2, 3}, 'A'), ({1, 2}, 'B')])
+       >>> m.get({1, 2})
+       'B'
+       >>> m.supersets({3})
+       [({1, 2, 3}, 'A')]
+    """
+
+    _withvalues = True
+
+    # same as in SetTrieMap
+    _output = SetTrieMap._output
+
+    def __init__(self, iterable=None, intern=False):
+        """Set up this RadixSetTrieMap object, assigning the (keyset, value)
+           pairs of iterable if it is specified (if a keyset is
+           repeated, the last value is kept).  Parameter intern: see
+           SetTrie.__init__().
+        """
+        self.root = _RadixTrie.Node()
+        self.interner = Interner() if intern is True else intern or None
+        self._codec = self.interner or _Identity
+        if iterable is not None:
+            for key, value in iterable:
+                self.assign(key, value)
+
+    def assign(self, akey, avalue):
+        """Add key akey with associated value avalue to the container.
+           akey must be a sortable and iterable container type.
+        """
+        self._add(self._codec.encode(akey)).value = avalue
+
+    def remove(self, keyset):
+        """Remove key keyset and its associated value.  Raises KeyError if
+           keyset is not a key.
+        """
+        self.pop(keyset)
+
+    def discard(self, keyset):
+        """Remove key keyset and its associated value if keyset is a
+           key.
+        """
+        self.pop(keyset, None)
+
+    def __delitem__(self, keyset):
+        """Same as self.remove(keyset), enables del m[keyset]."""
+        self.pop(keyset)
+
+    def pop(self, keyset, *default):
+        """Remove key keyset and return its associated value.  If keyset is
+           not a key, return default if given, else raise KeyError.
+        """
+        node = self._remove(self._codec.lookup(keyset))
+        if node is None:
+            if default:
+                return default[0]
+            raise KeyError(keyset)
+        value = node.value
+        node.value = None
+        return value
+
+    def contains(self, keyset):
+        """Returns True iff this container contains set keyset as a key."""
+        node = self._find(self._codec.lookup(keyset))
+        return node is not None and node.flag_last
+
+    def __contains__(self, keyset):
+        """Returns True iff this container contains set keyset as a key."""
+        return self.contains(keyset)
+
+    def get(self, keyset, default=None):
+        """Return the value associated to keyset if keyset is in this
+           container, else default.
+        """
+        node = self._find(self._codec.lookup(keyset))
+        if node is None or not node.flag_last:
+            return default
+        return node.value
+
+    def hassuperset(self, aset):
+        """Returns True iff there is at least one key set in this container
+           that is the superset of set aset.
+        """
+        return self._hassuperset(aset)
+
+    def itersupersets(self, aset, mode=None, limit=None):
+        """Return an iterator over all (keyset, value) pairs from this
+           container for which set keyset is a superset (proper or not
+           proper) of set aset.  Parameters mode and limit: see
+           SetTrieMap.itersupersets().
+        """
+        path = []
+        return SetTrie._limit(self._output(
+            self._itersupersets(self._codec.lookup(aset), path), path,
+            mode), limit)
+
+    def supersets(self, aset, mode=None, limit=None):
+        """Return a list containing pairs of (keyset, value) for which keyset
+           is superset of set aset (see itersupersets()).
+        """
+        return list(self.itersupersets(aset, mode, limit))
+
+    def countsupersets(self, aset):
+        """Return the number of keysets in this container that are (proper
+           or not proper) supersets of set aset.
+        """
+        return self._countsupersets(aset)
+
+    def hassubset(self, aset):
+        """Return True iff there is at least one set in this container that
+           is the (proper or not proper) subset of set aset.
+        """
+        return self._hassubset(aset)
+
+    def itersubsets(self, aset, mode=None, limit=None):
+        """Return an iterator over pairs (keyset, value) from this container
+           for which keyset is (proper or not proper) subset of set
+           aset.  Parameters mode and limit: see
+           SetTrieMap.itersupersets().
+        """
+        path = []
+        return SetTrie._limit(self._output(
+            self._itersubsets(self._codec.lookupknown(aset), path), path,
+            mode), limit)
+
+    def subsets(self, aset, mode=None, limit=None):
+        """Return a list of (keyset, value) pairs from this container for
+           which keyset is (proper or not proper) subset of set aset
+           (see itersubsets()).
+        """
+        return list(self.itersubsets(aset, mode, limit))
+
+    def countsubsets(self, aset):
+        """Return the number of keysets in this container that are (proper
+           or not proper) subsets of set aset.
+        """
+        return self._countsubsets(aset)
+
+    def iter(self, mode=None, limit=None):
+        """Returns an iterator to all (keyset, value) pairs stored in this
+           container (using pre-order tree traversal).  Parameters mode
+           and limit: see SetTrieMap.iter().
+        """
+        path = []
+        return SetTrie._limit(self._output(self._iter(path), path, mode),
+                              limit)
+
+    def keys(self):
+        """Alias for self.iter(mode='keys')."""
+        return self.iter(mode='keys')
+
+    def values(self):
+        """Alias for self.iter(mode='values')."""
+        return self.iter(mode='values')
+
+    def items(self):
+        """Alias for self.iter(mode=None)."""
+        return self.iter(mode=None)
+
+    def __iter__(self):
+        """Same as self.iter(mode='keys')."""
+        return self.keys()
+
+    def aslist(self):
+        """Return a list containing all the (keyset, value) pairs stored in
+           this container.
+        """
+        return list(self.iter())
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Module settrie.sharded
+
+SetTrieMap split into shards held by local worker processes, for maps
+that do not fit comfortably in one process.
+
+See README.md for more information.
+
+Licensed under the GNU LESSER GENERAL PUBLIC LICENSE, Version 3.
+See https://www.gnu.org/licenses/lgpl.html
+"""
+
+import heapq
+import multiprocessing
+from itertools import islice
+
+from settrie import SetTrieMap
+
+
+def _serve(conn):
+    """Run by the worker processes of ShardedSetTrieMap: hold one shard in
+       a SetTrieMap, and answer the (method name, arguments) requests
+       received on connection conn with ('ok', result) or
+       ('error', exception), until None is received.
+    """
+    m = SetTrieMap()
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        name, args = request
+        try:
+            if name == 'load':
+                m = SetTrieMap(*args)
+                result = None
+            else:
+                result = getattr(m, name)(*args)
+                if name.startswith('iter'):
+                    result = list(result)
+        except Exception as exc:
+            conn.send(('error', exc))
+        else:
+            conn.send(('ok', result))
+    conn.close()
+
+
+def _sortkey(item):
+    """Used by ShardedSetTrieMap to merge the items of the shards in the
+       order of SetTrieMap.
+    """
+    return sorted(item[0])
+
+
+class ShardedSetTrieMap:
+    """SetTrieMap whose keysets are split into shards by their smallest
+       element, each held by a SetTrieMap in a local worker process.
+       Queries about one keyset go to the process of its shard;
+       superset and subset queries are sent to all the processes that
+       may have results, which search their shards at the same time,
+       and their results are merged in the order of SetTrieMap.
+
+       Keysets and values are pickled to and from the worker
+       processes.  The set elements must be sortable (as in
+       SetTrieMap).  A ShardedSetTrieMap must only be used by one
+       thread at a time, and closed (or used in a with statement) to
+       stop its processes.
+
+       Usage:
+       ------
+       >>> from settrie.sharded import ShardedSetTrieMap
+       >>> m = ShardedSetTrieMap([({1, 2}, 'A'), ({2, 3}, 'B')], shards=2)
+       >>> m.assign({1, 2, 3}, 'C')
+       >>> m.supersets({2})
+       [({1, 2}, 'A'), ({1, 2, 3}, 'C'), ({2, 3}, 'B')]
+       >>> m.subsets({2, 3}, mode='values')
+       ['B']
+       >>> m.close()
+    """
+
+    def __init__(self, iterable=None, shards=None, partition=None):
+        """Set up this ShardedSetTrieMap object and start its worker
+           processes, one per shard.  shards is the number of shards
+           (default: the number of CPUs).  partition is a function
+           returning the shard (an int from 0 to shards - 1) of the
+           keysets whose smallest element is its argument, e.g.
+           lambda e: bisect.bisect(bounds, e) for ranges of elements
+           (default: the hash of the element modulo shards).  The
+           empty keyset is in shard 0.  If iterable is specified, it
+           must be an iterable of (keyset, value) pairs with which the
+           shards are populated (see SetTrieMap.__init__()).
+        """
+        if not shards:
+            # os.cpu_count() needs Python 3.4
+            try:
+                shards = multiprocessing.cpu_count()
+            except NotImplementedError:
+                shards = 1
+        self.shards = shards
+        self.partition = partition or (lambda e: hash(e) % self.shards)
+        self._conns = []
+        self._procs = []
+        for _ in range(self.shards):
+            conn, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=_serve, args=(child,),
+                                           daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(conn)
+            self._procs.append(proc)
+        if iterable is not None:
+            parts = [[] for _ in range(self.shards)]
+            for key, value in iterable:
+                parts[self._shard(key)].append((key, value))
+            self._scatter('load', range(self.shards),
+                          [(part,) for part in parts])
+
+    def _shard(self, keyset):
+        """Return the shard of keyset."""
+        return self.partition(min(keyset)) if keyset else 0
+
+    def _call(self, shard, name, *args):
+        """Return the result of method name of the SetTrieMap of shard
+           called with args in its worker process.
+        """
+        return self._scatter(name, (shard,), [args])[0]
+
+    def _scatter(self, name, shards, argslist):
+        """Send the requests to call method name with the args of argslist
+           to the worker processes of shards (an iterable of shards
+           of the same length) at once, and return the list of their
+           results.  The first exception raised by a method is raised
+           after all the results have been received.
+        """
+        conns = [self._conns[shard] for shard in shards]
+        for conn, args in zip(conns, argslist):
+            conn.send((name, args))
+        replies = [conn.recv() for conn in conns]
+        for status, result in replies:
+            if status == 'error':
+                raise result
+        return [result for _, result in replies]
+
+    def _gather(self, name, shards, mode, limit, *args):
+        """Return the list of the items that method name (an iterator of
+           items with parameters mode and limit) returns for args in
+           shards, merged in the order of SetTrieMap, with at most
+           limit items and the parts selected by mode (see
+           SetTrieMap.itersupersets()).
+        """
+        shards = sorted(shards)
+        results = self._scatter(name, shards,
+                                [args + (None, limit)] * len(shards))
+        # heapq.merge() has no key parameter before Python 3.5; no two
+        # shards have the same keyset, so the items are never compared
+        items = islice((item for _, item in heapq.merge(
+            *[[(_sortkey(item), item) for item in result]
+              for result in results])), limit)
+        if mode == 'keys':
+            return [key for key, _ in items]
+        if mode == 'values':
+            return [value for _, value in items]
+        return list(items)
+
+    def _subsetshards(self, aset):
+        """Return the set of the shards that may have subsets of aset (the
+           smallest elements of which are in aset).
+        """
+        return {0} | {self.partition(e) for e in aset}
+
+    def assign(self, akey, avalue):
+        """Add key akey with associated value avalue to the container (see
+           SetTrieMap.assign()).
+        """
+        self._call(self._shard(akey), 'assign', akey, avalue)
+
+    def remove(self, keyset):
+        """Remove key keyset and its associated value.  Raises KeyError if
+           keyset is not a key.
+        """
+        self._call(self._shard(keyset), 'remove', keyset)
+
+    def discard(self, keyset):
+        """Remove key keyset and its associated value if keyset is a
+           key.
+        """
+        self._call(self._shard(keyset), 'discard', keyset)
+
+    def __delitem__(self, keyset):
+        """Same as self.remove(keyset), enables del m[keyset]."""
+        self.remove(keyset)
+
+    def pop(self, keyset, *default):
+        """Remove key keyset and return its associated value.  If keyset is
+           not a key, return default if given, else raise KeyError.
+        """
+        return self._call(self._shard(keyset), 'pop', keyset, *default)
+
+    def contains(self, keyset):
+        """Returns True iff this container contains set keyset as a key."""
+        return self._call(self._shard(keyset), 'contains', keyset)
+
+    def __contains__(self, keyset):
+        """Returns True iff this container contains set keyset as a key."""
+        return self.contains(keyset)
+
+    def get(self, keyset, default=None):
+        """Return the value associated to keyset if keyset is in this
+           container, else default.
+        """
+        return self._call(self._shard(keyset), 'get', keyset, default)
+
+    def hassuperset(self, aset):
+        """Returns True iff there is at least one key set in this container
+           that is the superset of set aset.
+        """
+        return any(self._scatter('hassuperset', range(self.shards),
+                                 [(aset,)] * self.shards))
+
+    def supersets(self, aset, mode=None, limit=None):
+        """Return a list containing pairs of (keyset, value) for which keyset
+           is superset of set aset.  Parameters mode and limit: see
+           SetTrieMap.itersupersets().
+        """
+        return self._gather('supersets', range(self.shards), mode, limit,
+                            aset)
+
+    def countsupersets(self, aset):
+        """Return the number of keysets in this container that are (proper
+           or not proper) supersets of set aset.
+        """
+        return sum(self._scatter('countsupersets', range(self.shards),
+                                 [(aset,)] * self.shards))
+
+    def hassubset(self, aset):
+        """Return True iff there is at least one set in this container that
+           is the (proper or not proper) subset of set aset.
+        """
+        shards = self._subsetshards(aset)
+        return any(self._scatter('hassubset', shards,
+                                 [(aset,)] * len(shards)))
+
+    def subsets(self, aset, mode=None, limit=None):
+        """Return a list of (keyset, value) pairs from this container for
+           which keyset is (proper or not proper) subset of set aset.
+           Parameters mode and limit: see SetTrieMap.itersupersets().
+        """
+        return self._gather('subsets', self._subsetshards(aset), mode, limit,
+                            aset)
+
+    def countsubsets(self, aset):
+        """Return the number of keysets in this container that are (proper
+           or not proper) subsets of set aset.
+        """
+        shards = self._subsetshards(aset)
+        return sum(self._scatter('countsubsets', shards,
+                                 [(aset,)] * len(shards)))
+
+    def iter(self, mode=None, limit=None):
+        """Returns an iterator to all (keyset, value) pairs stored in this
+           container, in the order of SetTrieMap.iter().  The items are
+           gathered from the shards before the first one is returned.
+        """
+        return iter(self._gather('iter', range(self.shards), mode, limit))
+
+    def keys(self):
+        """Alias for self.iter(mode='keys')."""
+        return self.iter(mode='keys')
+
+    def values(self):
+        """Alias for self.iter(mode='values')."""
+        return self.iter(mode='values')
+
+    def items(self):
+        """Alias for self.iter(mode=None)."""
+        return self.iter(mode=None)
+
+    def __iter__(self):
+        """Same as self.iter(mode='keys')."""
+        return self.keys()
+
+    def __len__(self):
+        """Returns the number of keysets stored in this container."""
+        return sum(self._scatter('__len__', range(self.shards),
+                                 [()] * self.shards))
+
+    def aslist(self):
+        """Return a list containing all the (keyset, value) pairs stored in
+           this container.
+        """
+        return self._gather('iter', range(self.shards), None, None)
+
+    def close(self):
+        """Stop the worker processes; their shards are lost.  The container
+           cannot be used after this.
+        """
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except OSError:  # the process has already exited
+                pass
+            conn.close()
+        for proc in self._procs:
+            proc.join()
+        self._conns = []
+        self._procs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __str__(self):
+        """Returns str(self.aslist())."""
+        return str(self.aslist())
+
+    def __repr__(self):
+        """Returns str(self.aslist())."""
+        return str(self.aslist())
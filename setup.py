@@ -13,7 +13,6 @@ setup(
     author='Márton Miháltz ',
     description='Efficient storage and querying of sets of sets using the trie data structure',
     packages=['settrie'],
-    install_requires=['sortedcontainers'],
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# coding: utf8
+"""
+Unit tests for package benchmarks.
+"""
+
+import contextlib
+import json
+import os
+import tempfile
+import unittest
+from benchmarks import orderings
+from benchmarks.__main__ import main
+from benchmarks.suite import compare, run
+from benchmarks.workloads import Workload
+
+
+class TestBenchmarks(unittest.TestCase):
+  """
+  UnitTest for the benchmark workloads and reports
+  """
+
+  def setUp(self):
+    self.w = Workload(sets=200, size=4, alphabet=50, skew=1.2, queries=20)
+
+  def test_workload(self):
+    self.assertEqual(len(self.w.sets), 200)
+    self.assertTrue(all(1 <= len(s) <= 7 and s <= set(range(50)) for s in self.w.sets))
+    self.assertTrue(all(len(s) == 16 for s in self.w.subprobes))
+    self.assertEqual(Workload(sets=200, size=4, alphabet=50, skew=1.2, queries=20).sets, self.w.sets)
+    self.assertEqual(Workload(sets=1, size=10, alphabet=3).sets[0], {0, 1, 2})
+
+  def test_run(self):
+    report = run(self.w, ['SetTrie', 'SetTrieMap'], repeat=2)
+    self.assertEqual(sorted(report['results']), ['SetTrie', 'SetTrieMap'])
+    add = report['results']['SetTrie']['add']
+    self.assertEqual(add['ops'], 200)
+    self.assertTrue(add['p50_us'] <= add['p90_us'] <= add['p99_us'] <= add['max_us'])
+    self.assertGreater(report['results']['SetTrieMap']['memory']['peak_bytes'], 0)
+    json.dumps(report)
+    rows = compare(report, report)
+    self.assertTrue(rows and all(ratio == 1 and not worse for *_, ratio, worse in rows))
+
+  def test_orderings(self):
+    report = orderings.run(self.w.sets, self.w.superprobes, self.w.subprobes, sample=50)
+    self.assertEqual(list(report), ['natural', 'appearance', 'frequent', 'rare'])
+    self.assertTrue(all(result['nodes'] > 1 and result['supersets_seconds'] >= 0
+                        for result in report.values()))
+    superprobes, subprobes = orderings.probes(self.w.sets, 10)
+    self.assertTrue(all(1 <= len(probe) <= 2 for probe in superprobes))
+    self.assertEqual(len(subprobes), 10)
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, 'sets.txt')
+      with open(path, 'w') as stream:
+        stream.write('a b\nb c d\n')
+      self.assertEqual(orderings.readsets(path), [{'a', 'b'}, {'b', 'c', 'd'}])
+      with open(path, 'w') as stream:
+        stream.write('1 2\n3\n')
+      self.assertEqual(orderings.readsets(path), [{1, 2}, {3}])
+      with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        self.assertEqual(main(['orderings', '--input', path, '--queries', '5', '--orders', 'rare']), 0)
+
+  def test_main(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, 'report.json')
+      self.assertEqual(main(['run', '--sets', '100', '--queries', '10', '--containers', 'SetTrie',
+                             '--output', path]), 0)
+      with open(path) as stream:
+        report = json.load(stream)
+      report['results']['SetTrie']['add']['ops_per_sec'] *= 2
+      with open(path + '2', 'w') as stream:
+        json.dump(report, stream)
+      with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+          self.assertEqual(main(['compare', path + '2', path]), 1)
+          self.assertEqual(main(['compare', path, path + '2']), 0)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+      self.assertRaises(SystemExit, main, [])
+
+
+# - - - - - - -
+
+# If module is executed from command line, perform tests:
+if __name__ == "__main__":
+  unittest.main(verbosity=2)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# coding: utf8
+"""
+Unit tests for module settrie.csr.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from settrie import SetTrie
+from settrie.csr import IntSetTrie
+
+
+class TestIntSetTrie(unittest.TestCase):
+  """
+  UnitTest for IntSetTrie class
+  """
+
+  def setUp(self):
+    self.t = IntSetTrie([{1, 3}, {1, 3, 5}, {1, 4}, {1, 2, 4}, {2, 4}, {2, 3, 5}])
+
+  def test_print(self):
+    expected = """None
+  1
+    2
+      4#
+    3#
+      5#
+    4#
+  2
+    3
+      5#
+    4#
+"""
+    out = io.StringIO()
+    self.t.printtree(stream=out)
+    self.assertEqual(out.getvalue(), expected)
+
+  def test_arrays(self):
+    self.assertEqual(list(self.t._labels), [0, 1, 2, 2, 3, 4, 3, 4, 4, 5, 5])
+    self.assertEqual(list(self.t._first), [1, 3, 6, 8, 9, 10, 10, 11, 11, 11, 11, 11])
+    self.assertEqual(list(self.t._counts), [6, 4, 2, 1, 2, 1, 1, 1, 1, 1, 1])
+    self.assertEqual(self.t._labels.typecode, 'i')
+
+  def test_iter(self):
+    self.assertEqual(self.t.aslist(), [{1, 2, 4}, {1, 3}, {1, 3, 5}, {1, 4}, {2, 3, 5}, {2, 4}])
+    self.assertEqual(list(self.t.iter(limit=2)), [{1, 2, 4}, {1, 3}])
+    self.assertEqual(len(self.t), 6)
+
+  def test_contains(self):
+    self.assertTrue(self.t.contains({1, 3}))
+    self.assertFalse(self.t.contains({1}))
+    self.assertFalse(self.t.contains(set()))
+    self.assertFalse({1, 3, 6} in self.t)
+
+  def test_supersets(self):
+    self.assertEqual(self.t.supersets({3}), [{1, 3}, {1, 3, 5}, {2, 3, 5}])
+    self.assertEqual(self.t.supersets({4}, limit=2), [{1, 2, 4}, {1, 4}])
+    self.assertTrue(self.t.hassuperset({3, 5}))
+    self.assertFalse(self.t.hassuperset({3, 4}))
+    self.assertEqual(self.t.countsupersets({1}), 4)
+    self.assertEqual(self.t.batchhassuperset([{5}, {6}]), [True, False])
+    self.assertEqual(self.t.batchsupersets([{5}]), [[{1, 3, 5}, {2, 3, 5}]])
+    self.assertFalse(IntSetTrie().hassuperset(set()))
+
+  def test_subsets(self):
+    self.assertEqual(self.t.subsets({1, 2, 3, 4, 7}), [{1, 2, 4}, {1, 3}, {1, 4}, {2, 4}])
+    self.assertTrue(self.t.hassubset({1, 4}))
+    self.assertFalse(self.t.hassubset({3, 4, 5}))
+    self.assertEqual(self.t.countsubsets({1, 2, 3, 4, 5}), 6)
+
+  def test_update(self):
+    self.t.add({3, 4, 5})
+    self.t.add({1, 3})
+    self.t.remove({2, 4})
+    self.t.discard({7})
+    self.assertRaises(KeyError, self.t.remove, {2, 4})
+    self.assertEqual(len(self.t), 6)
+    self.assertTrue({3, 4, 5} in self.t)
+    self.assertFalse({2, 4} in self.t)
+    self.assertEqual(self.t.supersets({4}), [{1, 2, 4}, {1, 4}, {3, 4, 5}])
+    self.t.add({2, 4})
+    self.t.remove({3, 4, 5})
+    self.t.add(set())
+    self.assertEqual(self.t.aslist(), [set(), {1, 2, 4}, {1, 3}, {1, 3, 5}, {1, 4}, {2, 3, 5}, {2, 4}])
+    self.assertRaises(TypeError, self.t.add, {'a'})
+    self.assertRaises(OverflowError, self.t.add, {1 << 40})
+
+  def test_fromsorted(self):
+    t = IntSetTrie.fromsorted([(1, 2), (1, 2), (1, 2, 3), (2,)])
+    self.assertEqual(t.aslist(), SetTrie([{1, 2}, {1, 2, 3}, {2}]).aslist())
+    self.assertRaises(ValueError, IntSetTrie.fromsorted, [(1, 3), (1, 2)])
+    self.assertRaises(ValueError, IntSetTrie.fromsorted, [(2, 1)])
+    self.assertRaises(ValueError, IntSetTrie.fromsorted, [(1, 1)])
+    t = IntSetTrie([[1, 1], [2, 1, 2]])
+    self.assertEqual((t.aslist(), len(t)), ([{1}, {1, 2}], 2))
+    self.assertTrue(t.contains({1}) and t.contains({1, 2}))
+    self.assertEqual(t.supersets({1}), [{1}, {1, 2}])
+
+  def test_saveload(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, 'trie.bin')
+      self.t.add({7})
+      self.t.save(path)
+      t = IntSetTrie.load(path)
+      self.assertEqual(t.aslist(), self.t.aslist())
+      self.assertEqual(t.subsets({2, 4, 7}), [{2, 4}, {7}])
+      SetTrie().save(path)
+      self.assertRaises(ValueError, IntSetTrie.load, path)
+
+  def test_subsetchildren(self):
+    sets = [{i} for i in range(40)] + [{0, 3}, {0, 7}, {0, 11}, {0, 3, 9}]
+    t = IntSetTrie(sets)
+    labels = t._labels
+    first = t._first
+    node0 = first[0]  # the child of the root labeled 0
+    self.assertEqual((first[1] - first[0], labels[node0], first[node0 + 1] - first[node0]), (40, 0, 3))
+    probes = [[5], [0, 7], [39, 45], [0, 3, 9, 11],
+              list(range(0, 60, 2)), list(range(60)), list(range(1, 60, 3))]
+    for setarr in probes:
+      for node in (0, node0):
+        for idx in range(len(setarr) + 1):
+          expected = [(c, setarr.index(labels[c], idx) + 1)
+                      for c in range(first[node], first[node + 1]) if labels[c] in setarr[idx:]]
+          self.assertEqual(t._subsetchildren(node, setarr, idx), expected)
+      self.assertEqual(t.subsets(set(setarr)), sorted((s for s in sets if s <= set(setarr)), key=sorted))
+
+
+# - - - - - - -
+
+# If module is executed from command line, perform tests:
+if __name__ == "__main__":
+  unittest.main(verbosity=2)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# coding: utf8
+"""
+Unit tests for module settrie.frozen.
+"""
+
+import concurrent.futures
+import os
+import random
+import tempfile
+import unittest
+from settrie import SetTrie, SetTrieMap, SetTrieMultiMap
+from settrie.frozen import FrozenSetTrie, FrozenSetTrieMap
+
+
+class TestFrozenSetTrie(unittest.TestCase):
+  """
+  UnitTest for FrozenSetTrie class
+  """
+
+  def setUp(self):
+    self.tmpdir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmpdir.name, 'trie.bin')
+    self.s = SetTrie([{1, 3}, {1, 3, 5}, {1, 4}, {1, 2, 4}, {2, 4}, {2, 3, 5}])
+    self.t = FrozenSetTrie.freeze(self.s, self.path)
+
+  def tearDown(self):
+    self.t.close()
+    self.tmpdir.cleanup()
+
+  def test_iter(self):
+    self.assertEqual(self.t.aslist(), self.s.aslist())
+    self.assertEqual(list(self.t.iter(limit=2)), [{1, 2, 4}, {1, 3}])
+    self.assertEqual(len(self.t), 6)
+
+  def test_contains(self):
+    self.assertTrue({1, 3} in self.t)
+    self.assertFalse({1} in self.t)
+    self.assertFalse(self.t.contains({1, 3, 6}))
+    self.assertFalse(self.t.contains(set()))
+
+  def test_supersets(self):
+    self.assertEqual(self.t.supersets({3}), [{1, 3}, {1, 3, 5}, {2, 3, 5}])
+    self.assertEqual(self.t.supersets({1, 3}, limit=1), [{1, 3}])
+    self.assertEqual(self.t.supersets({6}), [])
+    self.assertEqual(self.t.supersets(set()), self.s.aslist())
+    self.assertTrue(self.t.hassuperset({4}))
+    self.assertFalse(self.t.hassuperset({3, 4}))
+    self.assertEqual(self.t.countsupersets({4}), 3)
+
+  def test_subsets(self):
+    self.assertEqual(self.t.subsets({1, 2, 3, 4, 7}), [{1, 2, 4}, {1, 3}, {1, 4}, {2, 4}])
+    self.assertEqual(self.t.subsets({1}), [])
+    self.assertTrue(self.t.hassubset({2, 3, 4}))
+    self.assertFalse(self.t.hassubset({3, 4, 5}))
+    self.assertEqual(self.t.countsubsets({1, 2, 3, 4, 5}), 6)
+
+  def test_open(self):
+    with FrozenSetTrie(self.path) as t:
+      self.assertEqual(t.aslist(), self.t.aslist())
+    self.assertRaises(ValueError, FrozenSetTrieMap, self.path)
+    with FrozenSetTrie.freeze(SetTrie(), self.path + '2') as t:
+      self.assertEqual(len(t), 0)
+      self.assertFalse(t.hassuperset(set()))
+
+  def test_intern(self):
+    s = SetTrie([['b', 'c'], ['a', 'b'], ['a', 'd']], intern=True)
+    with FrozenSetTrie.freeze(s, self.path + '2') as t:
+      self.assertEqual(t.aslist(), s.aslist())
+      self.assertEqual(t.supersets({'a'}), [{'a', 'b'}, {'a', 'd'}])
+      self.assertEqual(t.subsets({'a', 'd', 'x'}), [{'a', 'd'}])
+
+  def test_parallel(self):
+    rnd = random.Random(1)
+    s = SetTrie([rnd.sample(range(20), rnd.randint(0, 6)) for _ in range(2000)])
+    with FrozenSetTrie.freeze(s, self.path + '2') as t, \
+         concurrent.futures.ProcessPoolExecutor(2) as executor:
+      self.assertEqual(t.aslist(executor), s.aslist())
+      self.assertEqual(t.supersets({3, 7}, executor=executor), s.supersets({3, 7}))
+      self.assertEqual(t.supersets({99}, executor=executor), [])
+      self.assertEqual(t.subsets(range(10), executor=executor), s.subsets(range(10)))
+      self.assertEqual(list(t.iter(5, executor)), list(s.iter(5)))
+      self.assertEqual(self.t.supersets({4}, 2, executor), [{1, 2, 4}, {1, 4}])
+      self.assertEqual(self.t.subsets({2, 4}, executor=executor), [{2, 4}])
+
+  def test_relativepath(self):
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(self.path))
+    try:
+      t = FrozenSetTrie(os.path.basename(self.path))
+    finally:
+      os.chdir(cwd)
+    with t, concurrent.futures.ProcessPoolExecutor(1) as executor:
+      self.assertEqual(t._path, self.path)
+      self.assertEqual(t.supersets({4}, executor=executor), self.t.supersets({4}))
+
+
+class TestFrozenSetTrieMap(unittest.TestCase):
+  """
+  UnitTest for FrozenSetTrieMap class
+  """
+
+  def setUp(self):
+    self.tmpdir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmpdir.name, 'map.bin')
+    self.m = SetTrieMap([({1, 3}, 'A'), ({1, 3, 5}, 'B'), ({1, 4}, 'C'),
+                         ({1, 2, 4}, 'D'), ({2, 4}, 'E'), ({2, 3, 5}, 'F')])
+    self.t = FrozenSetTrieMap.freeze(self.m, self.path)
+
+  def tearDown(self):
+    self.t.close()
+    self.tmpdir.cleanup()
+
+  def test_get(self):
+    self.assertEqual(self.t.get({1, 3}), 'A')
+    self.assertEqual(self.t.get({1}, 'X'), 'X')
+    self.assertTrue({2, 4} in self.t)
+    self.assertFalse({2, 7} in self.t)
+
+  def test_iters(self):
+    self.assertEqual(self.t.aslist(), self.m.aslist())
+    self.assertEqual(list(self.t.keys()), list(self.m.keys()))
+    self.assertEqual(list(self.t.values()), ['D', 'A', 'B', 'C', 'F', 'E'])
+    self.assertEqual(len(self.t), 6)
+
+  def test_supersets(self):
+    for mode in (None, 'keys', 'values'):
+      self.assertEqual(self.t.supersets({3}, mode), self.m.supersets({3}, mode))
+      self.assertEqual(self.t.subsets({1, 2, 4}, mode, 2), self.m.subsets({1, 2, 4}, mode, 2))
+    self.assertEqual(self.t.countsupersets({1}), 4)
+    self.assertEqual(self.t.countsubsets({1, 4}), 1)
+
+  def test_parallel(self):
+    with concurrent.futures.ProcessPoolExecutor(2) as executor:
+      for mode in (None, 'keys', 'values'):
+        self.assertEqual(self.t.supersets({4}, mode, executor=executor), self.m.supersets({4}, mode))
+        self.assertEqual(self.t.subsets({1, 3, 5}, mode, 2, executor), self.m.subsets({1, 3, 5}, mode, 2))
+        self.assertEqual(list(self.t.iter(mode, executor=executor)), list(self.m.iter(mode)))
+      self.assertEqual(self.t.aslist(executor), self.m.aslist())
+
+  def test_multimap(self):
+    m = SetTrieMultiMap([({1, 2}, 'A'), ({1, 2}, 'B'), ({3}, {'x': 1})])
+    with FrozenSetTrieMap.freeze(m, self.path + '2') as t:
+      self.assertEqual(t.get({1, 2}), ['A', 'B'])
+      self.assertEqual(list(t.items()), [({1, 2}, ['A', 'B']), ({3}, [{'x': 1}])])
+    self.assertRaises(TypeError, FrozenSetTrieMap.freeze, SetTrie(), self.path + '3')
+
+
+# - - - - - - -
+
+# If module is executed from command line, perform tests:
+if __name__ == "__main__":
+  unittest.main(verbosity=2)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# coding: utf8
+"""
+Unit tests for module settrie.radix.
+"""
+
+import io
+import random
+import unittest
+from settrie import SetTrie, SetTrieMap
+from settrie.radix import RadixSetTrie, RadixSetTrieMap
+
+
+class TestRadixSetTrie(unittest.TestCase):
+  """
+  UnitTest for RadixSetTrie class
+  """
+
+  def setUp(self):
+    self.t = RadixSetTrie([{1, 3}, {1, 3, 5}, {1, 4}, {1, 2, 4}, {2, 4}, {2, 3, 5}])
+
+  def test_print(self):
+    expected = """None
+  1
+    2 4#
+    3#
+      5#
+    4#
+  2
+    3 5#
+    4#
+"""
+    out = io.StringIO()
+    self.t.printtree(stream=out)
+    self.assertEqual(out.getvalue(), expected)
+
+  def test_split_merge(self):
+    t = RadixSetTrie([{1, 2, 3, 4, 5}])
+    self.assertEqual(t.stats()['nodes'], 2)
+    t.add({1, 2, 3})  # ends inside the edge
+    self.assertEqual([n.edge for n in t.root.children], [(1, 2, 3)])
+    self.assertEqual(t.root.children[0].children[0].edge, (4, 5))
+    t.add({1, 2, 6})  # leaves the edge
+    self.assertEqual(t.stats()['nodes'], 5)
+    self.assertEqual(t.stats()['labels'], 6)
+    t.remove({1, 2, 3})  # {1, 2} is left with child 3 4 5 and 6
+    self.assertEqual(t.stats()['nodes'], 4)
+    t.remove({1, 2, 6})  # merges 1 2 with 3 4 5
+    self.assertEqual(t.stats()['nodes'], 2)
+    self.assertEqual(t.root.children[0].edge, (1, 2, 3, 4, 5))
+    t.remove({1, 2, 3, 4, 5})
+    self.assertEqual(t.stats()['nodes'], 1)
+    self.assertEqual(len(t), 0)
+    self.assertRaises(KeyError, t.remove, {1})
+
+  def test_contains(self):
+    self.assertTrue(self.t.contains({1, 3}))
+    self.assertFalse(self.t.contains({1}))
+    self.assertFalse(self.t.contains({2, 3}))
+    self.assertFalse(self.t.contains({1, 3, 5, 7}))
+    self.assertTrue({2, 4} in self.t)
+    self.assertFalse(set() in self.t)
+
+  def test_supersets(self):
+    self.assertEqual(self.t.supersets({3}), [{1, 3}, {1, 3, 5}, {2, 3, 5}])
+    self.assertEqual(self.t.supersets({5}), [{1, 3, 5}, {2, 3, 5}])
+    self.assertEqual(self.t.supersets({2, 4}), [{1, 2, 4}, {2, 4}])
+    self.assertEqual(self.t.supersets({1, 5}), [{1, 3, 5}])
+    self.assertEqual(self.t.supersets({6}), [])
+    self.assertEqual(self.t.supersets(set()), self.t.aslist())
+    self.assertEqual(self.t.supersets({3}, limit=1), [{1, 3}])
+    self.assertTrue(self.t.hassuperset({4}))
+    self.assertFalse(self.t.hassuperset({3, 4}))
+    self.assertEqual(self.t.countsupersets({4}), 3)
+    self.assertEqual(self.t.countsupersets(set()), 6)
+
+  def test_subsets(self):
+    self.assertEqual(self.t.subsets({1, 2, 3, 4}), [{1, 2, 4}, {1, 3}, {1, 4}, {2, 4}])
+    self.assertEqual(self.t.subsets({2, 3, 5}), [{2, 3, 5}])
+    self.assertEqual(self.t.subsets({1, 2}), [])
+    self.assertTrue(self.t.hassubset({1, 3, 9}))
+    self.assertFalse(self.t.hassubset({3, 5}))
+    self.assertEqual(self.t.countsubsets({1, 2, 3, 4, 5}), 6)
+
+  def test_intern(self):
+    t = RadixSetTrie([['a', 'b', 'c'], ['a', 'b']], intern=True)
+    self.assertEqual(t.supersets({'c'}), [{'a', 'b', 'c'}])
+    self.assertEqual(t.subsets({'a', 'b', 'z'}), [{'a', 'b'}])
+    out = io.StringIO()
+    t.printtree(stream=out)
+    self.assertEqual(out.getvalue(), "None\n  a b#\n    c#\n")
+
+  def test_random(self):
+    rnd = random.Random(7)
+    sets = [set(rnd.sample(range(30), rnd.randint(0, 8))) for _ in range(400)]
+    t = RadixSetTrie(sets)
+    ref = SetTrie(sets)
+    for aset in sets[::3]:
+      t.discard(aset)
+      ref.discard(aset)
+    self.assertEqual(len(t), len(ref))
+    self.assertEqual(t.aslist(), ref.aslist())
+    self.assertEqual(t.stats()['labels'], ref.stats()['nodes'] - 1)
+    for _ in range(100):
+      probe = set(rnd.sample(range(30), rnd.randint(0, 10)))
+      self.assertEqual(t.supersets(probe), ref.supersets(probe))
+      self.assertEqual(t.subsets(probe), ref.subsets(probe))
+      self.assertEqual(t.hassuperset(probe), ref.hassuperset(probe))
+      self.assertEqual(t.hassubset(probe), ref.hassubset(probe))
+      self.assertEqual(t.countsupersets(probe), ref.countsupersets(probe))
+      self.assertEqual(t.countsubsets(probe), ref.countsubsets(probe))
+      self.assertEqual(t.contains(probe), ref.contains(probe))
+
+
+class TestRadixSetTrieMap(unittest.TestCase):
+  """
+  UnitTest for RadixSetTrieMap class
+  """
+
+  def setUp(self):
+    self.t = RadixSetTrieMap([({1, 3}, 'A'), ({1, 3, 5}, 'B'), ({1, 4}, 'C'),
+                              ({1, 2, 4}, 'D'), ({2, 4}, 'E'), ({2, 3, 5}, 'F')])
+
+  def test_get(self):
+    self.assertEqual(self.t.get({1, 3}), 'A')
+    self.assertEqual(self.t.get({1, 2}), None)
+    self.assertEqual(self.t.get({1, 2}, 'X'), 'X')
+    self.t.assign({1, 3}, 'a')
+    self.assertEqual(self.t.get({1, 3}), 'a')
+    self.assertEqual(len(self.t), 6)
+
+  def test_pop(self):
+    self.assertEqual(self.t.pop({1, 2, 4}), 'D')
+    self.assertEqual(self.t.pop({1, 2, 4}, None), None)
+    self.assertRaises(KeyError, self.t.pop, {1, 2, 4})
+    del self.t[{1, 3}]
+    self.assertEqual(self.t.get({1, 3, 5}), 'B')
+    self.assertEqual(len(self.t), 4)
+
+  def test_searches(self):
+    self.assertEqual(self.t.supersets({3}), [({1, 3}, 'A'), ({1, 3, 5}, 'B'), ({2, 3, 5}, 'F')])
+    self.assertEqual(self.t.supersets({3}, mode='values', limit=2), ['A', 'B'])
+    self.assertEqual(self.t.subsets({1, 2, 4}, mode='keys'), [{1, 2, 4}, {1, 4}, {2, 4}])
+    self.assertEqual(list(self.t.values()), ['D', 'A', 'B', 'C', 'F', 'E'])
+
+  def test_random(self):
+    rnd = random.Random(11)
+    items = [(set(rnd.sample(range(20), rnd.randint(0, 6))), i) for i in range(300)]
+    t = RadixSetTrieMap(items)
+    ref = SetTrieMap(items)
+    for key, _ in items[::4]:
+      self.assertEqual(t.pop(key, None), ref.pop(key, None))
+    self.assertEqual(t.aslist(), ref.aslist())
+    for _ in range(50):
+      probe = set(rnd.sample(range(20), rnd.randint(0, 8)))
+      self.assertEqual(t.supersets(probe), ref.supersets(probe))
+      self.assertEqual(t.subsets(probe), ref.subsets(probe))
+
+
+# - - - - - - -
+
+# If module is executed from command line, perform tests:
+if __name__ == "__main__":
+  unittest.main(verbosity=2)
@@ -7,8 +7,29 @@ Author: Márton Miháltz
 https://sites.google.com/site/mmihaltz/
 """
 
+import asyncio
+import concurrent.futures
+import os
+import sys
+import tempfile
 import unittest
-from settrie import SetTrie, SetTrieMap, SetTrieMultiMap
+from settrie import SetTrie, SetTrieMap, SetTrieMultiMap, Interner, QueryCache, QueryStats
+
+
+def collect(aiterator):
+  """Return the list of the items of asynchronous iterator aiterator, run
+  in a new event loop (without async syntax, so that this module compiles
+  on all versions)."""
+  loop = asyncio.new_event_loop()
+  items = []
+  try:
+    while True:
+      try:
+        items.append(loop.run_until_complete(aiterator.__anext__()))
+      except StopAsyncIteration:
+        return items
+  finally:
+    loop.close()
 
 
 class TestSetTrie(unittest.TestCase):
@@ -110,6 +131,347 @@ class TestSetTrie(unittest.TestCase):
     self.assertEqual(self.t.subsets({2, 3, 4, 5}), [{2, 3, 5}, {2, 4}])
     self.assertEqual(self.t.subsets({2, 3, 5, 6}), [{2, 3, 5}])
 
+  def test_widenode(self):
+    # enough children under the root to promote its child sequences to lists
+    t = SetTrie([{i, 1000} for i in range(50, 0, -1)])
+    self.assertIsInstance(t.root.children, list)
+    self.assertEqual(t.root.labels, list(range(1, 51)))
+    self.assertIsInstance(t.root.children[0].children, tuple)
+    self.assertTrue({17, 1000} in t)
+    self.assertFalse({17} in t)
+    self.assertEqual(t.supersets({1000})[:2], [{1, 1000}, {2, 1000}])
+    self.assertEqual(t.subsets({3, 4, 1000}), [{3, 1000}, {4, 1000}])
+
+  def test_remove(self):
+    self.t.remove({1, 3})
+    self.assertFalse({1, 3} in self.t)
+    self.assertTrue({1, 3, 5} in self.t)
+    self.t.remove({1, 3, 5})
+    self.t.discard({2, 3, 5})
+    self.t.discard({2, 3, 5})
+    self.t.discard({7})
+    self.assertRaises(KeyError, self.t.remove, {1, 3})
+    self.assertRaises(KeyError, self.t.remove, {1})
+    self.assertEqual(self.t.aslist(), [{1, 2, 4}, {1, 4}, {2, 4}])
+    # branches that do not lead to a set any more are pruned
+    from io import StringIO
+    outp = StringIO()
+    self.t.printtree(stream=outp)
+    self.assertEqual(outp.getvalue(), "None\n  1\n    2\n      4#\n    4#\n  2\n    4#\n")
+    for s in self.t.aslist():
+      self.t.remove(s)
+    self.assertEqual(self.t.root.children, ())
+
+  def test_remove_widenode(self):
+    t = SetTrie([{i} for i in range(40)])
+    for i in range(30):
+      t.remove({i})
+    self.assertIsInstance(t.root.children, tuple)
+    self.assertEqual(t.root.labels, tuple(range(30, 40)))
+    self.assertEqual(t.subsets(set(range(35))), [{i} for i in range(30, 35)])
+
+  def test_len(self):
+    self.assertEqual(len(self.t), 6)
+    self.t.add({1, 3})
+    self.t.add({7})
+    self.assertEqual(len(self.t), 7)
+    self.t.remove({1, 3})
+    self.t.discard({1, 3})
+    self.assertEqual(len(self.t), 6)
+    self.assertEqual(self.t.root.children[0].count, 3)
+    self.assertEqual(len(SetTrie()), 0)
+    self.assertFalse(SetTrie())
+    self.assertFalse(SetTrie().hassuperset(set()))
+    self.assertTrue(SetTrie([set()]).hassuperset(set()))
+
+  def test_counts(self):
+    for q in ({3, 5}, {1, 4}, {1}, {2}, {6}, set(), {1, 2, 4, 5}):
+      self.assertEqual(self.t.countsupersets(q), len(self.t.supersets(q)))
+    for q in ({1, 2, 4, 11}, {1, 2}, {1, 2, 3, 4, 5}, {0, 1, 3, 5}, set()):
+      self.assertEqual(self.t.countsubsets(q), len(self.t.subsets(q)))
+
+  def test_summaries(self):
+    node = self.t.root.getchild(1)
+    self.assertEqual((node.height, node.maxdata, node.signature), (2, 5, 0b111100))
+    self.t.add({1, 3, 5, 70})
+    self.assertEqual((node.height, node.maxdata, node.signature), (3, 70, 0b1111100))
+    self.assertEqual(self.t.supersets({4, 70}), [])
+    self.assertEqual(self.t.supersets({1, 70}), [{1, 3, 5, 70}])
+    self.t.remove({1, 3, 5, 70})
+    self.assertEqual((node.height, node.maxdata, node.signature), (2, 5, 0b111100))
+    self.t.remove({1, 2, 4})
+    self.t.remove({1, 3, 5})
+    self.assertEqual((node.height, node.maxdata, node.signature), (1, 4, 0b11000))
+    self.assertEqual(self.t.supersets({1, 5}), [])
+    self.assertEqual(self.t.supersets({3, 5}), [{2, 3, 5}])
+    self.assertEqual(self.t.countsupersets({1, 4}), 1)
+    self.assertFalse(self.t.hassuperset({1, 3, 4}))
+    leaf = self.t.root.getchild(2).getchild(4)
+    self.assertEqual((leaf.height, leaf.maxdata, leaf.signature), (0, None, 0))
+    t = SetTrie([{'a', 'b', 'c'}, {'b', 'd'}])
+    self.assertEqual(t.root.getchild('a').signature, -1)
+    self.assertEqual(t.root.getchild('b').maxdata, 'd')
+    self.assertEqual(t.supersets({'b', 'c'}), [{'a', 'b', 'c'}])
+
+  def test_limit(self):
+    self.assertEqual(self.t.supersets({1}, limit=2), [{1, 2, 4}, {1, 3}])
+    self.assertEqual(self.t.supersets({1}, limit=0), [])
+    self.assertEqual(self.t.supersets({1}, limit=100), self.t.supersets({1}))
+    self.assertEqual(self.t.subsets({1, 2, 3, 4, 5}, limit=3), [{1, 2, 4}, {1, 3}, {1, 3, 5}])
+    self.assertEqual(list(self.t.itersubsets({2, 3, 4, 5}, limit=1)), [{2, 3, 5}])
+    self.assertEqual(list(self.t.iter(limit=2)), [{1, 2, 4}, {1, 3}])
+
+  def test_batch(self):
+    probes = [{3, 5}, {1, 4}, {6}, set(), {1, 4}, {2}, {2, 4, 5}, [4, 2, 1]]
+    self.assertEqual(self.t.batchsupersets(probes), [self.t.supersets(p) for p in probes])
+    self.assertEqual(self.t.batchhassuperset(probes), [self.t.hassuperset(p) for p in probes])
+    self.assertEqual(self.t.batchsupersets([]), [])
+    self.assertEqual(SetTrie().batchhassuperset([set(), {1}]), [False, False])
+
+  def test_deepsets(self):
+    # deeper than the default recursion limit
+    big = set(range(5000))
+    t = SetTrie([big, set(range(0, 5000, 2)), {1, 4999}])
+    self.assertTrue(big in t)
+    self.assertTrue(t.hassuperset({2, 4998}))
+    self.assertFalse(t.hassuperset({1, 5000}))
+    self.assertEqual(t.supersets({4999}), [big, {1, 4999}])
+    self.assertTrue(t.hassubset(big))
+    self.assertEqual(t.subsets(big | {6000}), [big, set(range(0, 5000, 2)), {1, 4999}])
+    self.assertEqual(len(t.aslist()), 3)
+
+  def test_fromsorted(self):
+    keys = sorted(tuple(sorted(s)) for s in [{1, 3}, {1, 3, 5}, {1, 4}, {1, 2, 4}, {2, 4}, {2, 3, 5}])
+    t = SetTrie.fromsorted(keys)
+    self.assertCountEqual(t.aslist(), self.t.aslist())
+    t.add({1, 2})
+    self.assertEqual(t.subsets({1, 2, 4}), [{1, 2}, {1, 2, 4}, {1, 4}, {2, 4}])
+    self.assertRaises(ValueError, SetTrie.fromsorted, [(1, 3), (1, 2)])
+    self.assertRaises(ValueError, SetTrie.fromsorted, [(1, 3), (2, 1)])
+    self.assertRaises(ValueError, SetTrie.fromsorted, [(1, 1)])
+    t = SetTrie([[1, 1, 2], (3, 3)])
+    self.assertEqual(t.aslist(), [{1, 2}, {3}])
+    self.assertTrue(t.contains({1, 2}) and t.contains({3}))
+    t.add([2, 4, 2])
+    self.assertEqual(t.supersets({4}), [{2, 4}])
+    t = SetTrie([['b', 'a', 'b']], intern=True)
+    self.assertEqual((t.aslist(), t.interner.elements), ([{'a', 'b'}], ['b', 'a']))
+    self.assertEqual(SetTrie([{1}, {1}, set()]).aslist(), [set(), {1}])
+
+  def test_slots(self):
+    self.assertFalse(hasattr(self.t.root, '__dict__'))
+    self.assertFalse(hasattr(SetTrieMap().root, '__dict__'))
+
+  def test_intern(self):
+    t = SetTrie([['b', 'c'], ['a', 'b']], intern=True)
+    self.assertEqual(t.interner.elements, ['b', 'c', 'a'])
+    self.assertEqual(t.root.labels, (0,))
+    t.add(['d', 'a'])
+    # sets are ordered by the ids of their elements
+    self.assertEqual(t.aslist(), [{'b', 'c'}, {'a', 'b'}, {'a', 'd'}])
+    self.assertEqual(t.supersets({'a'}), [{'a', 'b'}, {'a', 'd'}])
+    self.assertEqual(t.subsets({'a', 'b', 'c', 'x'}), [{'b', 'c'}, {'a', 'b'}])
+    self.assertTrue(t.hassubset({'a', 'b', 'x'}))
+    # unknown elements are not interned by queries
+    self.assertFalse({'a', 'x'} in t)
+    self.assertFalse(t.hassuperset({'x'}))
+    self.assertEqual(t.countsupersets({'a', 'x'}), 0)
+    self.assertEqual(t.batchhassuperset([{'x'}, {'c'}, set()]), [False, True, True])
+    t.discard({'x'})
+    t.remove({'a', 'b'})
+    self.assertEqual(len(t.interner.elements), 4)
+    self.assertEqual(t.aslist(), [{'b', 'c'}, {'a', 'd'}])
+    # an Interner can be shared, elements need not be orderable
+    u = SetTrie([[(1, 'x'), None], [None]], intern=t.interner)
+    self.assertIs(u.interner, t.interner)
+    self.assertEqual(u.supersets({None}), [{(1, 'x'), None}, {None}])
+    self.assertFalse(hasattr(SetTrie().interner, 'ids'))
+
+  def test_fromsample(self):
+    sets = [{1, 2, 9}, {2, 9}, {3, 9}, {2, 3, 9}]
+    self.assertEqual(Interner.fromsample(sets).elements, [9, 2, 3, 1])
+    self.assertEqual(Interner.fromsample(sets, 'rare').elements, [1, 3, 2, 9])
+    self.assertRaises(ValueError, Interner.fromsample, sets, 'sorted')
+    t = SetTrie(sets, intern=Interner.fromsample(sets))
+    # the most frequent elements are shared by the prefixes: 6 nodes instead of 10
+    self.assertEqual(t.stats()['nodes'], 6)
+    self.assertEqual(SetTrie(sets).stats()['nodes'], 10)
+    self.assertEqual(t.aslist(), [{2, 9}, {2, 3, 9}, {1, 2, 9}, {3, 9}])
+    self.assertEqual(t.supersets({2}), [{2, 9}, {2, 3, 9}, {1, 2, 9}])
+    self.assertEqual(t.subsets({3, 9, 7}), [{3, 9}])
+    t.add({7, 9})
+    self.assertEqual(t.interner.elements, [9, 2, 3, 1, 7])
+
+  def test_saveload(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, 'trie.bin')
+      self.t.add(range(100, 120))
+      self.t.add(set())
+      self.t.save(path)
+      t = SetTrie.load(path)
+      self.assertEqual(t.aslist(), self.t.aslist())
+      self.assertEqual(len(t), 8)
+      self.assertEqual(t.supersets({2, 4}), [{1, 2, 4}, {2, 4}])
+      self.assertEqual(t.root.getchild(100).height, 19)
+      self.assertEqual(t.root.getchild(1).maxdata, 5)
+      t.add({1, 3, 4})
+      t.remove({1, 3})
+      self.assertEqual(t.subsets({1, 3, 4, 5}), [set(), {1, 3, 4}, {1, 3, 5}, {1, 4}])
+      # wide nodes are lists
+      t = SetTrie([{i} for i in range(30)])
+      t.save(path)
+      t = SetTrie.load(path)
+      self.assertIs(type(t.root.labels), list)
+      t.remove({7})
+      self.assertEqual(len(t), 29)
+      t = SetTrie([['b', 'c'], ['a', 'b']], intern=True)
+      t.save(path)
+      t = SetTrie.load(path)
+      self.assertEqual(t.interner.elements, ['b', 'c', 'a'])
+      self.assertEqual(t.supersets({'a'}), [{'a', 'b'}])
+      SetTrie().save(path)
+      self.assertEqual(SetTrie.load(path).aslist(), [])
+      self.assertRaises(ValueError, SetTrieMap.load, path)
+
+  def test_cache(self):
+    t = SetTrie(self.t, cache=2)
+    self.assertEqual(t.supersets({3}), [{1, 3}, {1, 3, 5}, {2, 3, 5}])
+    result = t.supersets({3})
+    result.append(None)
+    self.assertEqual(t.supersets({3}), [{1, 3}, {1, 3, 5}, {2, 3, 5}])
+    self.assertEqual((t.cache.hits, t.cache.misses), (2, 1))
+    self.assertEqual(t.supersets({3}, limit=1), [{1, 3}])
+    self.assertTrue(t.hassuperset({3}))
+    self.assertEqual(t.supersets({3}), [{1, 3}, {1, 3, 5}, {2, 3, 5}])
+    self.assertEqual(t.cache.misses, 4)
+    t.add({1, 3})
+    self.assertEqual(t.cache.generation, 0)
+    t.add({3, 4})
+    t.discard({7})
+    self.assertEqual(t.cache.generation, 1)
+    self.assertEqual(t.countsupersets({3}), 4)
+    self.assertEqual(t.subsets({3, 4}), [{3, 4}])
+    self.assertTrue(t.hassubset({3, 4}))
+    t.remove({3, 4})
+    self.assertEqual(t.subsets({3, 4}), [])
+    self.assertFalse(t.hassubset({3, 4}))
+    self.assertEqual(t.countsubsets({1, 2, 4}), 3)
+    self.assertEqual(len(t.cache.entries), 2)
+    t.cache.clear()
+    self.assertEqual((t.cache.hits, t.cache.misses, len(t.cache.entries)), (0, 0, 0))
+    self.assertIsNone(self.t.cache)
+    cache = QueryCache(1)
+    self.assertEqual(cache.query('a', len, 'xyz'), 3)
+    self.assertEqual(cache.query('a', len, 'xy'), 3)
+    cache.query('b', len, 'xy')
+    self.assertEqual(cache.query('a', len, 'xy'), 2)
+
+  def test_concurrent(self):
+    t = SetTrie(self.t, concurrent=True)
+    root = t.root
+    t.add({1, 3, 6})
+    t.add({1, 3})
+    t.remove({2, 4})
+    t.discard({2, 4})
+    self.assertRaises(KeyError, t.remove, {2, 4})
+    self.assertEqual(t.aslist(), [{1, 2, 4}, {1, 3}, {1, 3, 5}, {1, 3, 6}, {1, 4}, {2, 3, 5}])
+    self.assertEqual(t.supersets({3, 6}), [{1, 3, 6}])
+    # the nodes reachable from an earlier root are never changed
+    self.assertIsNot(t.root, root)
+    self.assertEqual(root.count, 6)
+    self.assertEqual(root.getchild(1).getchild(3).labels, (5,))
+    self.assertEqual(root.getchild(2).labels, (3, 4))
+    self.assertIs(t.root.getchild(2).getchild(3), root.getchild(2).getchild(3))
+    self.assertRaises(ValueError, SetTrie, cache=10, concurrent=True)
+
+  def test_snapshot(self):
+    v1 = self.t.snapshot()
+    self.t.add({1, 3, 6})
+    self.t.remove({1, 3})
+    v2 = self.t.snapshot()
+    v2.discard({2, 4})
+    self.assertEqual(v1.aslist(), [{1, 2, 4}, {1, 3}, {1, 3, 5}, {1, 4}, {2, 3, 5}, {2, 4}])
+    self.assertEqual(self.t.aslist(), [{1, 2, 4}, {1, 3, 5}, {1, 3, 6}, {1, 4}, {2, 3, 5}, {2, 4}])
+    self.assertEqual(v2.aslist(), [{1, 2, 4}, {1, 3, 5}, {1, 3, 6}, {1, 4}, {2, 3, 5}])
+    self.assertEqual((len(v1), len(self.t), len(v2)), (6, 6, 5))
+    self.assertIs(v1.root.getchild(2).getchild(3), v2.root.getchild(2).getchild(3))
+    self.assertTrue(v1.concurrent and self.t.concurrent)
+    self.t.unshare()
+    self.assertFalse(self.t.concurrent)
+    self.assertIsNot(self.t.root.getchild(2).getchild(3), v2.root.getchild(2).getchild(3))
+    self.t.add({2, 4, 6})
+    self.t.remove({1, 4})
+    self.assertEqual(v2.aslist(), [{1, 2, 4}, {1, 3, 5}, {1, 3, 6}, {1, 4}, {2, 3, 5}])
+    self.assertEqual(self.t.aslist(), [{1, 2, 4}, {1, 3, 5}, {1, 3, 6}, {2, 3, 5}, {2, 4}, {2, 4, 6}])
+    t = SetTrie([['a', 'b']], intern=True)
+    v = t.snapshot()
+    v.add(['c'])
+    self.assertIs(v.interner, t.interner)
+    self.assertEqual((t.aslist(), v.aslist()), ([{'a', 'b'}], [{'a', 'b'}, {'c'}]))
+    self.assertRaises(ValueError, SetTrie(cache=10).snapshot)
+
+  @unittest.skipIf(sys.version_info < (3, 5), 'needs async def')
+  def test_async(self):
+    self.assertEqual(collect(self.t.aitersupersets({3}, chunk=1)), self.t.supersets({3}))
+    self.assertEqual(collect(self.t.aitersubsets({1, 2, 4}, limit=2)), [{1, 2, 4}, {1, 4}])
+    self.assertEqual(collect(self.t.aiter(chunk=2)), self.t.aslist())
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+      self.assertEqual(collect(self.t.aitersupersets({4}, chunk=2, executor=executor)), self.t.supersets({4}))
+      self.assertEqual(collect(self.t.aiter(chunk=3, executor=executor)), self.t.aslist())
+      self.assertEqual(collect(self.t.aitersubsets({5}, executor=executor)), [])
+
+  def test_trace(self):
+    log = []
+    t = SetTrie(self.t, trace=QueryStats(lambda query, counts: log.append((query, counts))))
+    self.assertEqual(t.supersets({3}), self.t.supersets({3}))
+    self.assertEqual(log, [('supersets', {'visited': 7, 'scanned': 9, 'pruned': 3, 'results': 3})])
+    self.assertTrue(t.hassuperset({3, 5}))
+    self.assertEqual(log[-1], ('hassuperset', {'visited': 3, 'scanned': 5, 'pruned': 2, 'results': 1}))
+    self.assertFalse(t.hassubset({3, 4}))
+    self.assertEqual(log[-1], ('hassubset', {'visited': 1, 'scanned': 2, 'pruned': 2, 'results': 0}))
+    self.assertEqual(t.subsets({1, 3, 4}), [{1, 3}, {1, 4}])
+    self.assertEqual(log[-1], ('subsets', {'visited': 4, 'scanned': 5, 'pruned': 3, 'results': 2}))
+    self.assertEqual(list(t.itersupersets({4}, limit=1)), [{1, 2, 4}])
+    self.assertEqual(log[-1][1]['results'], 1)
+    self.assertEqual((t.trace.queries, t.trace.results), (5, 7))
+    self.assertEqual(t.trace.visited, sum(counts['visited'] for _, counts in log))
+    t.trace.reset()
+    self.assertEqual(t.trace.queries, 0)
+    self.assertIs(t.snapshot().trace, t.trace)
+    self.assertIsNone(self.t.trace)
+
+  def test_stats(self):
+    stats = self.t.stats()
+    self.assertEqual(stats['nodes'], 11)
+    self.assertEqual(stats['terminals'], 6)
+    self.assertEqual(stats['depths'], [1, 2, 5, 3])
+    self.assertEqual(stats['fanouts'], {0: 5, 1: 3, 2: 2, 3: 1})
+    self.assertEqual(stats['labels'], [{}, {1: 1, 2: 1}, {2: 1, 3: 2, 4: 2}, {4: 1, 5: 2}])
+    sizes = stats['bytes']
+    self.assertEqual(sizes['total'], sum(sizes[key] for key in ('nodes', 'children', 'values', 'interner')))
+    self.assertEqual(sizes['values'], 0)
+    self.assertGreater(sizes['children'], 0)
+    self.assertEqual(SetTrie().stats()['depths'], [1])
+    t = SetTrie([['a', 'b'], ['b']], intern=True)
+    self.assertEqual(t.stats()['labels'], [{}, {'a': 1, 'b': 1}, {'b': 1}])
+    self.assertGreater(t.stats()['bytes']['interner'], 0)
+
+  def test_subsetchildren(self):
+    # the root is list-backed (40 children), the child 0 is a tuple node
+    sets = [{i} for i in range(40)] + [{0, 3}, {0, 7}, {0, 11}, {0, 3, 9}]
+    t = SetTrie(sets)
+    self.assertIs(type(t.root.children), list)
+    self.assertIs(type(t.root.getchild(0).children), tuple)
+    probes = [[5], [0, 7], [39, 45], [0, 3, 9, 11],  # short probes
+              list(range(0, 60, 2)), list(range(60)), list(range(1, 60, 3))]  # long probes
+    for setarr in probes:
+      for node in (t.root, t.root.getchild(0)):
+        for idx in range(len(setarr) + 1):
+          expected = [(child, setarr.index(label, idx) + 1)
+                      for label, child in zip(node.labels, node.children) if label in setarr[idx:]]
+          self.assertEqual(SetTrie._subsetchildren(node, setarr, idx), expected)
+      self.assertEqual(t.subsets(set(setarr)), sorted((s for s in sets if s <= set(setarr)), key=sorted))
+
 
 class TestSetTrieMap(unittest.TestCase):
   """
@@ -229,6 +591,69 @@ class TestSetTrieMap(unittest.TestCase):
     
     
 
+  def test_remove(self):
+    self.assertEqual(self.t.pop({1, 3}), 'A')
+    self.assertEqual(self.t.pop({1, 3}, 'default'), 'default')
+    self.assertRaises(KeyError, self.t.pop, {1, 3})
+    del self.t[{2, 4}]
+    self.t.remove({1, 2, 4})
+    self.t.discard({1, 2, 4})
+    self.assertRaises(KeyError, self.t.remove, {1, 2, 4})
+    self.assertEqual(self.t.aslist(), [({1, 3, 5}, 'B'), ({1, 4}, 'C'), ({2, 3, 5}, 'F')])
+    self.assertEqual(self.t.get({1, 3}), None)
+    self.t.assign({1, 3}, 'AA')
+    self.assertEqual(self.t.get({1, 3}), 'AA')
+
+  def test_fromsorted(self):
+    t = SetTrieMap.fromsorted([((1, 2), 'X'), ((1, 2), 'Y'), ((1, 2, 3), 'Z'), ((2,), 'W')])
+    self.assertEqual(t.aslist(), [({1, 2}, 'Y'), ({1, 2, 3}, 'Z'), ({2}, 'W')])
+    self.assertEqual(SetTrieMap([({2, 1}, 'X'), ({3}, 'Q'), ({1, 2}, 'Y')]).get({1, 2}), 'Y')
+    self.assertRaises(ValueError, SetTrieMap.fromsorted, [((1, 3), 'X'), ((2, 1), 'Y')])
+    self.assertEqual(SetTrieMap([([1, 2, 1], 'X')]).get({1, 2}), 'X')
+
+  def test_len(self):
+    self.assertEqual(len(self.t), 6)
+    self.t.assign({1, 3}, 'AAA')
+    self.assertEqual(len(self.t), 6)
+    del self.t[{1, 3}]
+    self.assertEqual(len(self.t), 5)
+    self.assertEqual(self.t.countsupersets({1}), 3)
+    self.assertEqual(self.t.countsubsets({1, 2, 4}), 3)
+
+  def test_limit(self):
+    self.assertEqual(self.t.supersets({1}, mode='values', limit=3), ['D', 'A', 'B'])
+    self.assertEqual(self.t.subsets({1, 2, 4}, limit=1), [({1, 2, 4}, 'D')])
+    self.assertEqual(list(self.t.iter(mode='keys', limit=2)), [{1, 2, 4}, {1, 3}])
+
+  def test_batch(self):
+    probes = [{3, 5}, {1}, {1, 2, 5}, set(), {3, 5}]
+    for mode in (None, 'keys', 'values'):
+      self.assertEqual(self.t.batchsupersets(probes, mode), [self.t.supersets(p, mode) for p in probes])
+    self.assertEqual(self.t.batchhassuperset(probes), [True, True, False, True, True])
+
+  def test_intern(self):
+    t = SetTrieMap(self.t.items(), intern=Interner([5, 4, 3, 2, 1]))
+    self.assertEqual(t.root.labels, (0, 1, 2))
+    self.assertEqual(t.get({1, 3}), 'A')
+    self.assertEqual(t.get({1, 6}, 'X'), 'X')
+    t.assign({6}, 'G')
+    self.assertEqual(t.interner.elements, [5, 4, 3, 2, 1, 6])
+    self.assertEqual(t.supersets({3}), [({2, 3, 5}, 'F'), ({1, 3, 5}, 'B'), ({1, 3}, 'A')])
+    self.assertEqual(t.subsets({2, 4, 6}, 'keys'), [{2, 4}, {6}])
+    self.assertEqual(t.pop({2, 4}), 'E')
+    self.assertEqual(sorted(t.values()), ['A', 'B', 'C', 'D', 'F', 'G'])
+
+  def test_saveload(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, 'trie.bin')
+      self.t.assign({6}, {'x': [1, 2]})
+      self.t.save(path)
+      t = SetTrieMap.load(path)
+      self.assertEqual(t.aslist(), self.t.aslist())
+      self.assertEqual(t.get({6}), {'x': [1, 2]})
+      self.assertEqual(t.supersets({3}, 'values'), ['A', 'B', 'F'])
+      self.assertRaises(ValueError, SetTrie.load, path)
+
   def test_iters(self):
     self.assertEqual(self.t.aslist(), 
       [({1, 2, 4}, 'D'), ({1, 3}, 'A'), ({1, 3, 5}, 'B'), ({1, 4}, 'C'), ({2, 3, 5}, 'F'), ({2, 4}, 'E')] )
@@ -236,6 +661,69 @@ class TestSetTrieMap(unittest.TestCase):
     self.assertEqual(list(self.t.values()), ['D', 'A', 'B', 'C', 'F', 'E'] )
     self.assertEqual(list(self.t.__iter__()), list(self.t.keys()))
 
+  def test_cache(self):
+    t = SetTrieMap(self.t.items(), cache=10)
+    self.assertEqual(t.supersets({3}, 'values'), ['A', 'B', 'F'])
+    self.assertEqual(t.supersets({3}, 'keys'), [{1, 3}, {1, 3, 5}, {2, 3, 5}])
+    self.assertEqual(t.subsets({1, 3, 7}), [({1, 3}, 'A')])
+    self.assertEqual(t.cache.misses, 3)
+    t.assign({1, 3}, 'AA')
+    self.assertEqual(t.supersets({3}, 'values'), ['AA', 'B', 'F'])
+    self.assertEqual(t.countsubsets({1, 3, 7}), 1)
+    t.pop({1, 3})
+    self.assertEqual(t.subsets({1, 3, 7}), [])
+    self.assertFalse(t.hassubset({1, 3, 7}))
+    self.assertEqual(t.countsupersets({3}), 2)
+    self.assertTrue(t.hassuperset({3}))
+    self.assertEqual(t.cache.hits, 0)
+    self.assertEqual(t.supersets({3}, 'values'), ['B', 'F'])
+    self.assertEqual(t.supersets({3}, 'values'), ['B', 'F'])
+    self.assertEqual(t.cache.hits, 1)
+
+  def test_concurrent(self):
+    t = SetTrieMap(self.t.items(), concurrent=True)
+    root = t.root
+    t.assign({1, 3}, 'AA')
+    self.assertEqual(t.pop({2, 4}), 'E')
+    self.assertEqual(t.get({1, 3}), 'AA')
+    self.assertEqual(root.getchild(1).getchild(3).value, 'A')
+    self.assertEqual(root.getchild(2).getchild(4).value, 'E')
+    self.assertEqual(len(t), 5)
+    self.assertEqual(root.count, 6)
+
+  def test_snapshot(self):
+    v1 = self.t.snapshot()
+    self.t.assign({1, 3}, 'AA')
+    del self.t[{2, 4}]
+    self.assertEqual(v1.get({1, 3}), 'A')
+    self.assertEqual(v1.get({2, 4}), 'E')
+    self.assertEqual(self.t.get({1, 3}), 'AA')
+    self.assertEqual(len(v1) - len(self.t), 1)
+    self.assertIsInstance(v1, SetTrieMap)
+    self.t.unshare()
+    self.t.assign({1, 3}, 'AAA')
+    self.assertEqual((v1.get({1, 3}), self.t.get({1, 3}), self.t.concurrent), ('A', 'AAA', False))
+
+  @unittest.skipIf(sys.version_info < (3, 5), 'needs async def')
+  def test_async(self):
+    for mode in (None, 'keys', 'values'):
+      self.assertEqual(collect(self.t.aitersupersets({3}, mode, chunk=1)), self.t.supersets({3}, mode))
+      self.assertEqual(collect(self.t.aitersubsets({1, 2, 4}, mode, 2)), self.t.subsets({1, 2, 4}, mode, 2))
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+      self.assertEqual(collect(self.t.aiter('values', chunk=4, executor=executor)), list(self.t.values()))
+
+  def test_trace(self):
+    t = SetTrieMap(self.t.items(), trace=QueryStats(), cache=10)
+    self.assertEqual(t.supersets({3}, 'values'), self.t.supersets({3}, 'values'))
+    self.assertEqual(t.subsets({1, 2, 4}), self.t.subsets({1, 2, 4}))
+    self.assertEqual(t.supersets({3}, 'values'), self.t.supersets({3}, 'values'))
+    self.assertEqual((t.trace.queries, t.trace.results), (2, 6))
+
+  def test_stats(self):
+    stats = self.t.stats()
+    self.assertEqual((stats['nodes'], stats['terminals']), (11, 6))
+    self.assertGreater(stats['bytes']['values'], 0)
+
 
 class TestSetTrieMultiMap(unittest.TestCase):
   """
@@ -259,6 +747,127 @@ class TestSetTrieMultiMap(unittest.TestCase):
     self.assertEqual(x.assign({1, 3}, 'A'), 3)
     self.assertEqual(x.assign({2, 4, 5}, 'Y'), 1)
 
+  def test_fromsorted(self):
+    t = SetTrieMultiMap.fromsorted([((1, 2), 'X'), ((1, 2), 'Y'), ((2,), 'W')])
+    self.assertEqual(t.get({1, 2}), ['X', 'Y'])
+    self.assertEqual(t.assign({1, 2}, 'Z'), 3)
+    self.assertRaises(ValueError, SetTrieMultiMap.fromsorted, [((3, 2), 'X')])
+    self.assertEqual(SetTrieMultiMap([([1, 2, 1], 'X'), ({1, 2}, 'Y')]).get({1, 2}), ['X', 'Y'])
+
+  def test_remove(self):
+    self.assertEqual(self.t.pop({1, 3}), ['A', 'AA'])
+    self.assertFalse({1, 3} in self.t)
+    del self.t[{2, 3, 5}]
+    self.t.discard({2, 3, 5})
+    self.assertRaises(KeyError, self.t.remove, {2, 3, 5})
+    self.assertEqual(self.t.supersets({3}), [({1, 3, 5}, 'B')])
+
+  def test_removevalue(self):
+    self.assertEqual(self.t.removevalue({2, 3, 5}, 'FF'), 2)
+    self.assertEqual(self.t.get({2, 3, 5}), ['F', 'FFF'])
+    self.assertRaises(ValueError, self.t.removevalue, {2, 3, 5}, 'FF')
+    self.assertRaises(KeyError, self.t.removevalue, {2, 3}, 'F')
+    self.assertEqual(self.t.removevalue({1, 3, 5}, 'B'), 0)
+    self.assertFalse({1, 3, 5} in self.t)
+    self.assertTrue({1, 3} in self.t)
+
+  def test_len(self):
+    self.assertEqual(len(self.t), 6)
+    self.assertEqual(len(self.t.aslist()), 11)
+    self.t.assign({1, 3}, 'AAA')
+    self.assertEqual(len(self.t), 6)
+    self.assertEqual(self.t.countsupersets({3, 5}), 2)
+    self.assertEqual(self.t.countsubsets({1, 2, 4}), 3)
+
+  def test_limit(self):
+    self.assertEqual(self.t.supersets({1}, limit=3), [({1, 2, 4}, 'D'), ({1, 2, 4}, 'DD'), ({1, 3}, 'A')])
+    self.assertEqual(self.t.supersets({1}, mode='keys', limit=2), [{1, 2, 4}, {1, 3}])
+    self.assertEqual(self.t.subsets({2, 3, 5}, mode='values', limit=2), ['F', 'FF'])
+    self.assertEqual(list(self.t.iter(limit=1)), [({1, 2, 4}, 'D')])
+
+  def test_batch(self):
+    probes = [{3, 5}, {1}, {1, 2, 5}, {4}]
+    for mode in (None, 'keys', 'values'):
+      self.assertEqual(self.t.batchsupersets(probes, mode), [self.t.supersets(p, mode) for p in probes])
+    self.assertEqual(self.t.batchhassuperset(probes), [True, True, False, True])
+
+  def test_intern(self):
+    t = SetTrieMultiMap(self.t.items(), intern=True)
+    self.assertCountEqual(t.aslist(), self.t.aslist())
+    self.assertEqual(t.get({2, 3, 5}), ['F', 'FF', 'FFF'])
+    self.assertEqual(t.count({2, 7}), 0)
+    self.assertEqual(list(t.iterget({7})), [])
+    self.assertEqual(t.assign({7}, 'G'), 1)
+    self.assertEqual(t.removevalue({1, 4}, 'C'), 1)
+    self.assertEqual(t.subsets({1, 4, 7}), [({1, 4}, 'CC'), ({7}, 'G')])
+    self.assertRaises(KeyError, t.removevalue, {1, 8}, 'C')
+
+  def test_saveload(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, 'trie.bin')
+      self.t.save(path)
+      t = SetTrieMultiMap.load(path)
+      self.assertEqual(t.aslist(), self.t.aslist())
+      self.assertEqual(t.assign({2, 3, 5}, 'F4'), 4)
+      self.assertEqual(t.removevalue({1, 3}, 'A'), 1)
+
+  def test_cache(self):
+    t = SetTrieMultiMap(self.t.items(), cache=10)
+    self.assertEqual(t.supersets({3, 5}, 'values'), ['B', 'F', 'FF', 'FFF'])
+    t.assign({3, 5}, 'G')
+    self.assertEqual(t.supersets({3, 5}, 'values'), ['B', 'F', 'FF', 'FFF', 'G'])
+    t.removevalue({2, 3, 5}, 'FF')
+    self.assertEqual(t.supersets({3, 5}, 'values'), ['B', 'F', 'FFF', 'G'])
+    self.assertEqual(t.countsubsets({3, 5}), 1)
+    t.remove({3, 5})
+    self.assertEqual(t.countsubsets({3, 5}), 0)
+    self.assertEqual((t.cache.hits, t.cache.misses), (0, 5))
+
+  def test_concurrent(self):
+    t = SetTrieMultiMap(self.t.items(), concurrent=True)
+    root = t.root
+    self.assertEqual(t.assign({1, 3}, 'AAA'), 3)
+    self.assertEqual(t.removevalue({2, 3, 5}, 'FF'), 2)
+    self.assertEqual(t.removevalue({2, 4}, 'E'), 0)
+    self.assertEqual(t.pop({1, 4}), ['C', 'CC'])
+    self.assertEqual(t.supersets({3}, 'values'), ['A', 'AA', 'AAA', 'B', 'F', 'FFF'])
+    self.assertEqual(root.getchild(1).getchild(3).value, ['A', 'AA'])
+    self.assertEqual(root.getchild(2).getchild(3).getchild(5).value, ['F', 'FF', 'FFF'])
+    self.assertEqual(root.getchild(2).getchild(4).value, ['E'])
+    self.assertEqual(len(t), 4)
+
+  def test_snapshot(self):
+    v1 = self.t.snapshot()
+    self.t.assign({1, 3}, 'AAA')
+    self.t.removevalue({1, 4}, 'C')
+    self.assertEqual(v1.get({1, 3}), ['A', 'AA'])
+    self.assertEqual(v1.get({1, 4}), ['C', 'CC'])
+    self.assertEqual(self.t.get({1, 3}), ['A', 'AA', 'AAA'])
+    self.assertEqual(self.t.get({1, 4}), ['CC'])
+    self.t.unshare()
+    self.t.assign({1, 4}, 'C')
+    self.assertEqual((v1.get({1, 4}), self.t.get({1, 4})), (['C', 'CC'], ['CC', 'C']))
+    self.assertFalse(self.t.concurrent)
+
+  @unittest.skipIf(sys.version_info < (3, 5), 'needs async def')
+  def test_async(self):
+    for mode in (None, 'keys', 'values'):
+      self.assertEqual(collect(self.t.aitersupersets({3}, mode, chunk=2)), self.t.supersets({3}, mode))
+      self.assertEqual(collect(self.t.aitersubsets({1, 2, 4}, mode, 3)), self.t.subsets({1, 2, 4}, mode, 3))
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+      self.assertEqual(collect(self.t.aiter(chunk=4, executor=executor)), list(self.t.iter()))
+
+  def test_trace(self):
+    t = SetTrieMultiMap(self.t.items(), trace=QueryStats())
+    self.assertEqual(t.supersets({3}), self.t.supersets({3}))
+    self.assertTrue(t.hassubset({2, 3, 5}))
+    self.assertEqual((t.trace.queries, t.trace.results), (2, 4))
+
+  def test_stats(self):
+    stats = self.t.stats()
+    self.assertEqual((stats['nodes'], stats['terminals']), (11, 6))
+    self.assertGreater(stats['bytes']['values'], SetTrieMap(self.t.items()).stats()['bytes']['values'])
+
   def test_count(self):
     self.assertEqual(self.t.count({1, 3}), 2)
     self.assertEqual(self.t.count({1, 3, 5}), 1)
@@ -266,6 +875,13 @@ class TestSetTrieMultiMap(unittest.TestCase):
     self.assertEqual(self.t.count({111, 222}), 0)
     self.assertEqual(self.t.count({2, 3, 5}), 3)
 
+  def test_contains(self):
+    self.assertTrue({1, 3} in self.t)
+    self.assertFalse({1} in self.t)
+    self.assertTrue(self.t.contains({2, 3, 5}))
+    self.assertFalse(self.t.contains({2, 3, 5, 7}))
+    self.assertFalse(self.t.contains({0}))
+
   def test_iterget(self):
     self.assertEqual(list(self.t.iterget({1, 3})), ['A', 'AA'])
     self.assertEqual(list(self.t.iterget({1, 3, 4})), [])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# coding: utf8
+"""
+Unit tests for module settrie.sharded.
+"""
+
+import bisect
+import random
+import unittest
+from settrie import SetTrieMap
+from settrie.sharded import ShardedSetTrieMap
+
+
+class TestShardedSetTrieMap(unittest.TestCase):
+  """
+  UnitTest for ShardedSetTrieMap class
+  """
+
+  def setUp(self):
+    self.items = [({1, 3}, 'A'), ({1, 3, 5}, 'B'), ({1, 4}, 'C'),
+                  ({1, 2, 4}, 'D'), ({2, 4}, 'E'), ({2, 3, 5}, 'F')]
+    self.m = SetTrieMap(self.items)
+    self.t = ShardedSetTrieMap(self.items, shards=3)
+
+  def tearDown(self):
+    self.t.close()
+
+  def test_get(self):
+    self.assertEqual(self.t.get({1, 3}), 'A')
+    self.assertEqual(self.t.get({1}, 'X'), 'X')
+    self.assertTrue({2, 4} in self.t)
+    self.assertFalse(self.t.contains({2, 7}))
+    self.assertEqual(len(self.t), 6)
+
+  def test_update(self):
+    self.t.assign({3, 4}, 'G')
+    self.t.assign(set(), 'H')
+    self.t.assign({1, 3}, 'I')
+    self.assertEqual(self.t.get({1, 3}), 'I')
+    self.assertEqual(self.t.pop({1, 4}), 'C')
+    self.assertEqual(self.t.pop({1, 4}, 'X'), 'X')
+    self.assertRaises(KeyError, self.t.remove, {1, 4})
+    self.t.discard({1, 4})
+    del self.t[{2, 4}]
+    self.assertEqual(self.t.aslist(), [(set(), 'H'), ({1, 2, 4}, 'D'), ({1, 3}, 'I'),
+                                       ({1, 3, 5}, 'B'), ({2, 3, 5}, 'F'), ({3, 4}, 'G')])
+
+  def test_supersets(self):
+    for mode in (None, 'keys', 'values'):
+      self.assertEqual(self.t.supersets({3}, mode), self.m.supersets({3}, mode))
+      self.assertEqual(self.t.subsets({1, 2, 4}, mode, 2), self.m.subsets({1, 2, 4}, mode, 2))
+      self.assertEqual(list(self.t.iter(mode)), list(self.m.iter(mode)))
+    self.assertTrue(self.t.hassuperset({3, 5}))
+    self.assertFalse(self.t.hassuperset({3, 4}))
+    self.assertTrue(self.t.hassubset({1, 4, 7}))
+    self.assertFalse(self.t.hassubset({3, 4}))
+    self.assertEqual(self.t.countsupersets({4}), 3)
+    self.assertEqual(self.t.countsubsets({1, 2, 3, 4}), 4)
+
+  def test_partition(self):
+    rnd = random.Random(1)
+    items = [(rnd.sample(range(50), rnd.randint(0, 5)), i) for i in range(500)]
+    m = SetTrieMap(items)
+    with ShardedSetTrieMap(items, 4, lambda e: bisect.bisect([10, 20, 30], e)) as t:
+      self.assertEqual(t.aslist(), m.aslist())
+      self.assertEqual(t.supersets({25}), m.supersets({25}))
+      self.assertEqual(t.subsets(range(0, 50, 3), 'keys'), m.subsets(range(0, 50, 3), 'keys'))
+      self.assertEqual(len(t), len(m))
+
+
+# - - - - - - -
+
+# If module is executed from command line, perform tests:
+if __name__ == "__main__":
+  unittest.main(verbosity=2)